@@ -0,0 +1,427 @@
+# benchmarks/run.py
+# ──────────────────────────────────────────────────────────────
+# Benchmark de extremo a extremo sobre un corpus congelado.
+#
+# El corpus (benchmarks/corpus) contiene:
+#   http/        respuestas HTTP grabadas (HTML y PDF) + manifest.json
+#                con su Content-Type, universidad y programa
+#   gpt_raw/     respuestas del LLM grabadas (formato de _save_raw_gpt)
+#
+# Cada etapa se ejecuta en un proceso hijo aislado (pico de RSS propio)
+# dentro de un directorio de trabajo temporal, sin red ni API:
+#
+#   fetch_page · clean_html · extract_courses · split_text_into_chunks ·
+#   ml_filter.predict · analyze_df_return_files · /analyze_url
+#
+# Uso (desde Backend/):
+#   python -m benchmarks.run                     # ejecuta y guarda JSON
+#   python -m benchmarks.run --compare           # compara con baseline.json
+#   python -m benchmarks.run --save-baseline     # fija el baseline actual
+#   python -m benchmarks.run --record            # regraba corpus/gpt_raw
+#   python -m benchmarks.run --stages extract_courses ml_filter
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import pathlib
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+CORPUS = BENCH_DIR / "corpus"
+RESULTS_DIR = BENCH_DIR / "results"
+BASELINE = BENCH_DIR / "baseline.json"
+
+STAGES = (
+    "fetch_page",
+    "clean_html",
+    "extract_courses",
+    "split_text_into_chunks",
+    "ml_filter",
+    "analyze_df_return_files",
+    "analyze_url",
+)
+
+# (preparación opcional fuera del cronómetro, operación medida)
+Op = tuple[Callable[[], None] | None, Callable[[], object]]
+
+
+def load_manifest() -> list[dict]:
+    return json.loads((CORPUS / "manifest.json").read_text(encoding="utf-8"))
+
+
+# ─────────────────────────── Servidor HTTP grabado ───────────────────
+@contextmanager
+def corpus_server() -> Iterator[str]:
+    """Sirve corpus/http con los Content-Type grabados; devuelve la URL base."""
+    types = {pathlib.Path(m["file"]).name: m["content_type"] for m in load_manifest()}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802 (API de http.server)
+            name = self.path.lstrip("/").split("?")[0]
+            path = CORPUS / "http" / name
+            if name not in types or not path.is_file():
+                self.send_error(404)
+                return
+            body = path.read_bytes()
+            self.send_response(200)
+            self.send_header("Content-Type", types[name])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    th = threading.Thread(target=srv.serve_forever, daemon=True)
+    th.start()
+    try:
+        yield f"http://127.0.0.1:{srv.server_address[1]}"
+    finally:
+        srv.shutdown()
+
+
+def _url(base: str, item: dict) -> str:
+    return f"{base}/{pathlib.Path(item['file']).name}"
+
+
+# ─────────────────────────── Directorio de trabajo ───────────────────
+def prepare_workdir(root: pathlib.Path) -> None:
+    """Estructura data/ mínima: modelo ML, ficheros crudos y gpt_raw grabado."""
+    (root / "data" / "raw" / "html").mkdir(parents=True, exist_ok=True)
+    (root / "data" / "raw" / "pdf").mkdir(parents=True, exist_ok=True)
+    (root / "data" / "output").mkdir(parents=True, exist_ok=True)
+    shutil.copy(BACKEND_DIR / "data" / "lineclf.joblib", root / "data" / "lineclf.joblib")
+    if (CORPUS / "gpt_raw").is_dir():
+        shutil.copytree(CORPUS / "gpt_raw", root / "data" / "output" / "gpt_raw", dirs_exist_ok=True)
+
+
+def _documents(work: pathlib.Path) -> list[tuple[dict, pathlib.Path]]:
+    """Copia el corpus a data/raw (HTML ya limpio, como tras fetch_page)."""
+    from src.cleaner import clean_html
+
+    out = []
+    for item in load_manifest():
+        src = CORPUS / item["file"]
+        sub = "pdf" if src.suffix == ".pdf" else "html"
+        dst = work / "data" / "raw" / sub / src.name
+        shutil.copy(src, dst)
+        clean_html(dst)
+        out.append((item, dst))
+    return out
+
+
+# ─────────────────────────── Etapas ──────────────────────────────────
+def stage_fetch_page(work: pathlib.Path, stack: ExitStack) -> list[Op]:
+    from src.downloader import fetch_page
+
+    base = stack.enter_context(corpus_server())
+    return [
+        (None, lambda it=it: fetch_page(_url(base, it), it["university"], it["program"], force=True))
+        for it in load_manifest()
+    ]
+
+
+def stage_clean_html(work: pathlib.Path, stack: ExitStack) -> list[Op]:
+    from src.cleaner import clean_html
+
+    ops: list[Op] = []
+    for item in load_manifest():
+        src = CORPUS / item["file"]
+        if src.suffix != ".html":
+            continue
+        dst = work / "clean" / src.name
+        dst.parent.mkdir(exist_ok=True)
+        ops.append((lambda s=src, d=dst: shutil.copy(s, d), lambda d=dst: clean_html(d)))
+    return ops
+
+
+def stage_extract_courses(work: pathlib.Path, stack: ExitStack) -> list[Op]:
+    from src.extractor import extract_courses
+
+    return [
+        (None, lambda p=path, it=item: extract_courses(str(p), it["file"]))
+        for item, path in _documents(work)
+    ]
+
+
+def _texts(work: pathlib.Path) -> list[str]:
+    from src.engine import load_text
+
+    return [
+        load_text(path, "pdf" if path.suffix == ".pdf" else "html")
+        for _, path in _documents(work)
+    ]
+
+
+def stage_split_text_into_chunks(work: pathlib.Path, stack: ExitStack) -> list[Op]:
+    from src.analyzer import split_text_into_chunks
+
+    return [
+        (None, lambda t=text: split_text_into_chunks(t, max_chars=2_000))
+        for text in _texts(work)
+    ]
+
+
+def stage_ml_filter(work: pathlib.Path, stack: ExitStack) -> list[Op]:
+    from src.ml_filter import predict
+
+    ops: list[Op] = []
+    for text in _texts(work):
+        lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+        ops.append((None, lambda ls=lines: predict(ls)))
+    return ops
+
+
+def stage_analyze_df_return_files(work: pathlib.Path, stack: ExitStack) -> list[Op]:
+    import pandas as pd
+    from src.extractor import extract_courses
+    from src.graph.analyze_text_data_return_files import analyze_df_return_files
+
+    names = [c["name"] for item, path in _documents(work)
+             for c in extract_courses(str(path), item["file"])]
+    return [(None, lambda: analyze_df_return_files(pd.DataFrame({"name": names})))]
+
+
+def stage_analyze_url(work: pathlib.Path, stack: ExitStack) -> list[Op]:
+    from fastapi.testclient import TestClient
+    from src.llm import ReplayBackend, StubBackend, set_backend
+    from src.main import app
+
+    # respuestas grabadas; un prompt no grabado cae en el stub (sin esperas)
+    set_backend(ReplayBackend(work / "data" / "output" / "gpt_raw", fallback=StubBackend()))
+    base = stack.enter_context(corpus_server())
+    client = stack.enter_context(TestClient(app))
+
+    def call(item: dict) -> None:
+        rsp = client.post("/analyze_url", json={
+            "url": _url(base, item), "university": item["university"],
+            "program": item["program"], "force": True,
+        })
+        if rsp.status_code not in (200, 422):
+            raise RuntimeError(f"/analyze_url {rsp.status_code}: {rsp.text[:200]}")
+
+    return [(None, lambda it=it: call(it)) for it in load_manifest()]
+
+
+# ─────────────────────────── Medición ────────────────────────────────
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except Exception:
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def _percentile(values: list[float], q: float) -> float:
+    s = sorted(values)
+    k = (len(s) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def _child(stage: str, repeat: int, warmup: int, work: str, conn) -> None:
+    """Proceso hijo: prepara la etapa, la mide y devuelve las métricas."""
+    import logging
+
+    os.chdir(work)
+    sys.path.insert(0, str(BACKEND_DIR))
+    logging.disable(logging.CRITICAL)
+    try:
+        with ExitStack() as stack:
+            ops = globals()[f"stage_{stage}"](pathlib.Path(work), stack)
+            for _ in range(warmup):
+                for prep, fn in ops:
+                    prep and prep()
+                    fn()
+            lat: list[float] = []
+            t_all = 0.0
+            for _ in range(repeat):
+                for prep, fn in ops:
+                    prep and prep()
+                    t0 = time.perf_counter()
+                    fn()
+                    dt = time.perf_counter() - t0
+                    lat.append(dt)
+                    t_all += dt
+        conn.send({
+            "ops": len(lat),
+            "throughput_ops_s": round(len(lat) / t_all, 3) if t_all else None,
+            "p50_ms": round(_percentile(lat, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(lat, 0.95) * 1000, 3),
+            "mean_ms": round(statistics.fmean(lat) * 1000, 3),
+            "peak_rss_mb": _peak_rss_mb(),
+        })
+    except Exception as exc:
+        conn.send({"error": f"{type(exc).__name__}: {exc}"})
+    finally:
+        conn.close()
+
+
+def run_stage(stage: str, repeat: int, warmup: int) -> dict:
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix=f"bench_{stage}_") as work:
+        prepare_workdir(pathlib.Path(work))
+        parent, child = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_child, args=(stage, repeat, warmup, work, child))
+        proc.start()
+        child.close()
+        try:
+            result = parent.recv()
+        except EOFError:
+            result = {"error": f"child exited with code {proc.exitcode}"}
+        proc.join()
+    return result
+
+
+# ─────────────────────────── Grabación del corpus LLM ────────────────
+def _record_child(work: str) -> None:
+    import logging
+
+    os.chdir(work)
+    sys.path.insert(0, str(BACKEND_DIR))
+    logging.disable(logging.CRITICAL)
+    from src import analyzer
+    from src.downloader import fetch_page
+    from src.engine import run_document
+    from src.llm import StubBackend, set_backend
+
+    set_backend(StubBackend())
+    with corpus_server() as base:
+        for item in load_manifest():
+            info = fetch_page(_url(base, item), item["university"], item["program"], force=True)
+            run_document(pathlib.Path(info["path"]), _url(base, item),
+                         item["university"], item["program"], kind=info.get("kind", "html"))
+    out = CORPUS / "gpt_raw"
+    shutil.rmtree(out, ignore_errors=True)
+    shutil.copytree(analyzer.RAW_GPT, out)
+    print(f"gpt_raw grabado: {len(list(out.glob('*_answer.txt')))} respuestas en {out}")
+
+
+def record() -> None:
+    """
+    Regraba corpus/gpt_raw con el backend stub: los prompts son los que
+    produce el pipeline actual sobre el corpus, de modo que /analyze_url
+    los reproduce después con ReplayBackend.
+    """
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="bench_record_") as work:
+        prepare_workdir(pathlib.Path(work))
+        shutil.rmtree(pathlib.Path(work) / "data" / "output" / "gpt_raw", ignore_errors=True)
+        proc = ctx.Process(target=_record_child, args=(work,))
+        proc.start()
+        proc.join()
+
+
+# ─────────────────────────── Comparación ─────────────────────────────
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Lista de regresiones: p50/p95 o RSS por encima, throughput por debajo."""
+    out: list[str] = []
+    for stage, cur in results["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base or "error" in base or "error" in cur:
+            continue
+        for key in ("p50_ms", "p95_ms", "peak_rss_mb"):
+            if base.get(key) and cur.get(key) and cur[key] > base[key] * (1 + tolerance):
+                out.append(f"{stage}.{key}: {base[key]} → {cur[key]}")
+        b, c = base.get("throughput_ops_s"), cur.get("throughput_ops_s")
+        if b and c and c < b * (1 - tolerance):
+            out.append(f"{stage}.throughput_ops_s: {b} → {c}")
+    return out
+
+
+def save_baseline(results: dict) -> None:
+    """
+    Actualiza baseline.json solo con las etapas medidas sin error; las demás
+    conservan su valor anterior (p. ej. `--stages analyze_url` en otra máquina).
+    """
+    baseline = json.loads(BASELINE.read_text(encoding="utf-8")) if BASELINE.exists() else {}
+    stages = baseline.get("stages", {})
+    stages.update({k: v for k, v in results["stages"].items() if "error" not in v})
+    baseline.update({k: v for k, v in results.items() if k != "stages"}, stages=stages)
+    BASELINE.write_text(json.dumps(baseline, indent=2), encoding="utf-8")
+    print(f"Baseline actualizado: {BASELINE} ({', '.join(stages) or 'sin etapas'})")
+
+
+def print_table(results: dict) -> None:
+    print(f"\n{'stage':<26}{'ops':>6}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'RSS MB':>9}")
+    for stage, r in results["stages"].items():
+        if "error" in r:
+            print(f"{stage:<26}  ERROR {r['error']}")
+            continue
+        rss = f"{r['peak_rss_mb']:.0f}" if r.get("peak_rss_mb") else "-"
+        print(f"{stage:<26}{r['ops']:>6}{r['throughput_ops_s']:>10}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{rss:>9}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(prog="benchmarks.run")
+    p.add_argument("--stages", nargs="*", choices=STAGES, default=list(STAGES))
+    p.add_argument("--repeat", type=int, default=10, help="repeticiones medidas por etapa")
+    p.add_argument("--warmup", type=int, default=1, help="repeticiones de calentamiento")
+    p.add_argument("--compare", action="store_true", help="compara con baseline.json")
+    p.add_argument("--tolerance", type=float, default=0.25, help="margen de regresión (0.25 = 25 %%)")
+    p.add_argument("--save-baseline", action="store_true", help="guarda el resultado como baseline")
+    p.add_argument("--record", action="store_true", help="regraba corpus/gpt_raw y termina")
+    args = p.parse_args(argv)
+
+    if args.record:
+        record()
+        return 0
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "stages": {},
+    }
+    for stage in args.stages:
+        print(f"· {stage} …", flush=True)
+        results["stages"][stage] = run_stage(stage, args.repeat, args.warmup)
+
+    print_table(results)
+    RESULTS_DIR.mkdir(exist_ok=True)
+    out = RESULTS_DIR / f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"\nResultados: {out}")
+
+    if args.save_baseline:
+        save_baseline(results)
+
+    if args.compare:
+        if not BASELINE.exists():
+            print("No hay baseline.json; ejecuta con --save-baseline primero.")
+            return 1
+        baseline = json.loads(BASELINE.read_text(encoding="utf-8"))
+        missing = [st for st in results["stages"] if st not in baseline.get("stages", {})]
+        if missing:
+            print(f"\nSin baseline para: {', '.join(missing)} (no se comparan)")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESIONES:")
+            for r in regressions:
+                print("  ✗", r)
+            return 1
+        print("\nSin regresiones respecto al baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
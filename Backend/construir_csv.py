@@ -1,106 +1,199 @@
 #!/usr/bin/env python3
 """
-Extrae las hojas 'Hoja 1' y 'Ruben' de Universidades.xlsx y genera
-Universidades3.csv agrupando todos los enlaces por Universidad + Carrera.
+Lee las hojas configuradas de Universidades.xlsx en modo streaming y genera
+Universidades3.csv con los enlaces de cada Universidad + Carrera.
+
+El libro se abre en modo solo lectura (openpyxl read_only), que no expone
+los hipervínculos; por eso se resuelven aparte leyendo el XML de cada hoja
+(<hyperlinks>) y sus relaciones (xl/worksheets/_rels/sheetN.xml.rels).
+
+`iter_registros()` es un generador de (universidad, carrera, [urls]) que
+también alimenta directamente al downloader:
+
+    python -m src.prueba download --xlsx Universidades.xlsx
 
 Uso:
-    python construir_csv.py /ruta/Universidades.xlsx [Universidades3.csv]
+    python construir_csv.py /ruta/Universidades.xlsx [Universidades3.csv] [--hojas "Hoja 1,Ruben"]
 """
+from __future__ import annotations
 
 import sys
 import re
 import csv
-import pandas as pd
-import openpyxl
-
-
-def construir_csv_desde_xlsx(xlsx_path: str, csv_path: str = "Universidades3.csv") -> pd.DataFrame:
-    wb = openpyxl.load_workbook(xlsx_path, data_only=True)
-    hojas = ["Colombia"]
-
-    # {(universidad, carrera): set(enlaces)}
-    bolsa: dict[tuple[str, str], set[str]] = {}
-
-    for hoja in hojas:
-        ws = wb[hoja]
-        universidad = None
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator
 
-        for fila in ws.iter_rows():
-            celda_a = fila[0]
-            celda_b = fila[1] if len(fila) > 1 else None
+import openpyxl
 
-            v_a = celda_a.value.strip() if isinstance(celda_a.value, str) else celda_a.value
-            v_b = (
-                celda_b.value.strip()
-                if (celda_b and isinstance(celda_b.value, str))
-                else celda_b.value
-                if celda_b
-                else None
+from src.utils import split_urls
+
+# Hojas con el formato "fila de universidad + filas de carrera/enlace"
+HOJAS = ("Hoja 1", "Colombia", "Ruben", "Colombia 2")
+
+_NS = {
+    "m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+_R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+
+def _rels(zf: zipfile.ZipFile, rels_path: str) -> dict[str, tuple[str, str | None]]:
+    """{rId: (Target, TargetMode)} de un fichero .rels (vacío si no existe)."""
+    try:
+        root = ET.fromstring(zf.read(rels_path))
+    except KeyError:
+        return {}
+    return {
+        r.get("Id"): (r.get("Target"), r.get("TargetMode"))
+        for r in root.iterfind("rel:Relationship", _NS)
+    }
+
+
+def _hipervinculos(xlsx_path: str, hojas: Iterable[str]) -> dict[str, dict[str, str]]:
+    """
+    {hoja: {"B2": url}} leyendo solo el bloque <hyperlinks> de cada hoja
+    (iterparse: las filas se descartan según se leen).
+    """
+    out: dict[str, dict[str, str]] = {}
+    with zipfile.ZipFile(xlsx_path) as zf:
+        wb_rels = _rels(zf, "xl/_rels/workbook.xml.rels")
+        workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+        for sheet in workbook.iterfind("m:sheets/m:sheet", _NS):
+            nombre = sheet.get("name")
+            if nombre not in hojas:
+                continue
+            target = wb_rels.get(sheet.get(_R_ID), ("", None))[0]
+            part = posixpath.normpath(
+                target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
             )
-
-            # --- Caso: fila que define nueva universidad (col A con texto y col B vacía) ---
-            if v_a and not v_b:
-                universidad = v_a
+            rels = _rels(zf, posixpath.join(posixpath.dirname(part), "_rels",
+                                            posixpath.basename(part) + ".rels"))
+            links: dict[str, str] = {}
+            with zf.open(part) as fh:
+                for _ev, el in ET.iterparse(fh):
+                    tag = el.tag.rsplit("}", 1)[-1]
+                    if tag == "hyperlink":
+                        url = rels.get(el.get(_R_ID), (None, None))[0]
+                        if url:
+                            # una referencia puede ser un rango ("B2:B4")
+                            for ref in _celdas(el.get("ref", "")):
+                                links[ref] = url
+                    elif tag == "row":
+                        el.clear()
+            out[nombre] = links
+    return out
+
+
+def _celdas(ref: str) -> Iterator[str]:
+    m = re.fullmatch(r"([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?", ref)
+    if not m:
+        return
+    col, fila = m.group(1), int(m.group(2))
+    if m.group(3) is None or m.group(3) != col:
+        yield f"{col}{fila}"
+        return
+    for r in range(fila, int(m.group(4)) + 1):
+        yield f"{col}{r}"
+
+
+def _texto(valor):
+    return valor.strip() if isinstance(valor, str) else valor
+
+
+def iter_registros(
+    xlsx_path: str,
+    hojas: Iterable[str] = HOJAS,
+) -> Iterator[tuple[str, str, list[str]]]:
+    """
+    Genera (universidad, carrera, [urls]) recorriendo las hojas fila a fila.
+    Las URLs repetidas de una misma carrera se emiten una sola vez.
+    """
+    hojas = tuple(hojas)
+    links = _hipervinculos(xlsx_path, hojas)
+    wb = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+    vistos: set[tuple[str, str, str]] = set()
+    try:
+        for hoja in hojas:
+            if hoja not in wb.sheetnames:
+                print(f"Aviso: la hoja '{hoja}' no existe en {xlsx_path}", file=sys.stderr)
                 continue
-
-            # --- Caso: fila válida de carrera (siempre que haya algo en v_a) ---
-            if v_a:
+            ws = wb[hoja]
+            enlaces_hoja = links.get(hoja, {})
+            universidad = None
+
+            for n_fila, fila in enumerate(ws.iter_rows(min_row=1, max_col=2), start=1):
+                v_a = _texto(fila[0].value) if fila else None
+                v_b = _texto(fila[1].value) if len(fila) > 1 else None
+                link_a = enlaces_hoja.get(f"A{n_fila}")
+                link_b = enlaces_hoja.get(f"B{n_fila}")
+
+                # --- Caso: fila que define nueva universidad (col A con texto y col B vacía) ---
+                if v_a and not v_b:
+                    universidad = v_a
+                    continue
+
+                # --- Caso: fila válida de carrera (siempre que haya algo en v_a) ---
+                if not v_a:
+                    continue
                 carrera = re.sub(r"\s+", " ", str(v_a).strip())
 
-                # 1) Si v_b es string y contiene coma interna, tomo todo el texto:
+                # 1) Si v_b es string y contiene coma interna, tomo todo el texto
                 if isinstance(v_b, str) and "," in v_b:
-                    enlace = v_b.strip()
-
-                # 2) Si no, busco hyperlink en A
-                elif celda_a.hyperlink:
-                    enlace = celda_a.hyperlink.target.strip()
-
-                # 3) Si no, busco hyperlink en B
-                elif celda_b and celda_b.hyperlink:
-                    enlace = celda_b.hyperlink.target.strip()
-
-                # 4) Si no, y v_b empieza con "http", tomo ese texto
+                    enlace = v_b
+                # 2) Si no, hyperlink en A, luego en B
+                elif link_a:
+                    enlace = link_a
+                elif link_b:
+                    enlace = link_b
+                # 3) Si no, y v_b empieza con "http", tomo ese texto
                 elif isinstance(v_b, str) and v_b.startswith("http"):
-                    enlace = v_b.strip()
-
+                    enlace = v_b
                 else:
                     enlace = ""
 
-                key = (universidad, carrera)
-                bolsa.setdefault(key, set())
-                if enlace:
-                    # Si venían varias URLs en un solo string, ya las guardo todas tal cual:
-                    bolsa[key].add(enlace)
-
-    # --- Convertir el diccionario “bolsa” a lista de filas para DataFrame ---
-    filas = []
-    for (uni, carrera), enlaces_set in bolsa.items():
-        # Cada "enlaces" vendrá como un único string (o varios strings)
-        # Por ejemplo: {"https://.../ds/ , https://.../csys/ , ...", "https://otra.com"}.
-        # Queremos concatenar todos los elementos del set ordenados, separados por ", "
-        # De modo que si hay más de un string (p. ej. varios batches), queden unidos.
-        enlaces_ordenados = " , ".join(sorted(enlaces_set))
-        filas.append((uni, carrera, enlaces_ordenados))
-
-    df = pd.DataFrame(filas, columns=["Universidad", "Carrera", "Enlace"])
-
-    # --- Exportar a CSV con QUOTE_MINIMAL: sólo se envuelven en comillas los campos que llevan comas ---
-    df.to_csv(
-        csv_path,
-        index=False,
-        encoding="utf-8-sig",
-        quoting=csv.QUOTE_MINIMAL
-    )
-    return df
+                urls = []
+                for url in split_urls(enlace.strip()):
+                    if (universidad, carrera, url) not in vistos:
+                        vistos.add((universidad, carrera, url))
+                        urls.append(url)
+                if urls:
+                    yield universidad, carrera, urls
+    finally:
+        wb.close()
+
+
+def construir_csv_desde_xlsx(
+    xlsx_path: str,
+    csv_path: str = "Universidades3.csv",
+    hojas: Iterable[str] = HOJAS,
+) -> int:
+    """Vuelca `iter_registros` a CSV sin cargar el libro entero. Devuelve nº de filas."""
+    n = 0
+    with open(csv_path, "w", newline="", encoding="utf-8-sig") as fh:
+        # QUOTE_MINIMAL: sólo se envuelven en comillas los campos que llevan comas
+        w = csv.writer(fh, quoting=csv.QUOTE_MINIMAL)
+        w.writerow(["Universidad", "Carrera", "Enlace"])
+        for uni, carrera, urls in iter_registros(xlsx_path, hojas):
+            w.writerow([uni, carrera, " , ".join(urls)])
+            n += 1
+    return n
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Uso: python construir_csv.py /ruta/Universidades.xlsx [Universidades3.csv]")
+    args = sys.argv[1:]
+    hojas = HOJAS
+    if "--hojas" in args:
+        i = args.index("--hojas")
+        hojas = tuple(h.strip() for h in args[i + 1].split(",") if h.strip())
+        del args[i:i + 2]
+    if not args:
+        print("Uso: python construir_csv.py /ruta/Universidades.xlsx [Universidades3.csv] [--hojas \"Hoja 1,Ruben\"]")
         sys.exit(1)
 
-    xlsx_in = sys.argv[1]
-    csv_out = sys.argv[2] if len(sys.argv) > 2 else "Universidades3.csv"
+    xlsx_in = args[0]
+    csv_out = args[1] if len(args) > 1 else "Universidades3.csv"
 
-    construir_csv_desde_xlsx(xlsx_in, csv_out)
-    print(f"CSV generado en: {csv_out}")
+    n = construir_csv_desde_xlsx(xlsx_in, csv_out, hojas)
+    print(f"CSV generado en: {csv_out} ({n} filas)")
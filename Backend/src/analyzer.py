@@ -1,22 +1,19 @@
 from __future__ import annotations
 import os
-import json
 import pathlib
 import logging
 import time
-import openai
 from bs4 import BeautifulSoup
-from .utils import slugify
-from dotenv import load_dotenv
-
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from .utils import atomic_write_text, slugify
+from .llm import MODEL, get_backend
+from .sink import CourseSink
+from .catalog import current_document, file_hash, get_catalog
+from . import metrics
 
 # ─────────────────────────── Configuración ────────────────────────────
 LOG      = logging.getLogger("analyzer")
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
 
-MODEL    = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")  # o "gpt-4o-mini"
 LOG_JSON = pathlib.Path("data/output/download_log.json")
 OUT_CSV  = pathlib.Path("data/output/courses_clean.csv")
 
@@ -87,17 +84,21 @@ def _norm_credits(c):
     except ValueError:
         return ""
 
-# ─────────── Llamada a OpenAI (idéntica) ──────────────────────────────
+# ─────────── Llamada al LLM (backend según LLM_BACKEND, ver llm.py) ────
 def _call_gpt(messages: list[dict]) -> str:
+    backend = get_backend()
+    prompt_chars = sum(len(m["content"]) for m in messages)
     for i in range(3):
         try:
-            rsp = openai.chat.completions.create(
-                model=MODEL,
-                messages=messages,
-                temperature=0.0,
-            )
-            return rsp.choices[0].message.content
+            with metrics.timed("llm", backend=backend.name):
+                answer = backend.complete(messages)
+            # estimación ≈ 4 caracteres/token; OpenAIBackend registra además el uso real
+            metrics.inc("llm_tokens_total", prompt_chars // 4, direction="prompt", source="estimate")
+            metrics.inc("llm_tokens_total", len(answer) // 4, direction="completion", source="estimate")
+            return answer
         except Exception as e:
+            if i < 2:
+                metrics.inc("llm_retries_total", backend=backend.name)
             LOG.warning("GPT error (%s), intento %d/3", e, i + 1)
             time.sleep(2 ** i)
     raise RuntimeError("GPT failed 3 times")
@@ -112,8 +113,9 @@ def _strip_fences(text: str) -> str:
 
 def _save_raw_gpt(univ, prog, idx, prompt, answer):
     base = f"{slugify(univ)}_{slugify(prog)}_{idx:03}"
-    (RAW_GPT / f"{base}_prompt.txt").write_text(prompt,  encoding="utf-8")
-    (RAW_GPT / f"{base}_answer.txt").write_text(answer, encoding="utf-8")
+    atomic_write_text(RAW_GPT / f"{base}_prompt.txt", prompt)
+    atomic_write_text(RAW_GPT / f"{base}_answer.txt", answer)
+    get_catalog().record_chunk(univ, prog, idx, prompt, answer)
 
     
 # ─────────── Parseo del bloque CSV devuelto por el LLM ───────────────
@@ -136,22 +138,139 @@ def _csv_rows(text: str) -> list[dict]:
             rows.append(dict(zip(headers, vals)))
     return rows
 
-# ─────────── Función principal ───────────────────────────────────────
-def analyze():
-    if not LOG_JSON.exists():
-        raise SystemExit("First run: main.py download")
+def _course_rows(courses: list[dict]) -> list[dict]:
+    """Adapta los `Course` del extractor al esquema name,credits,mode."""
+    return [
+        {"name": c.get("name", ""), "credits": c.get("credits", ""), "mode": c.get("mode", "")}
+        for c in courses
+    ]
+
+def _write_rows(
+    sink, univ: str, prog: str, all_rows_for_file: list[dict], index=None, document_id=None,
+) -> None:
+    """
+    Envía al CSV de salida (y al índice de búsqueda) las filas de un documento;
+    con `document_id` las registra además en el catálogo.
+    """
+    if all_rows_for_file:
+        rows = [
+            {
+                "name":    r.get("name", ""),
+                "credits": _norm_credits(r.get("credits", "")),
+                "mode":    r.get("mode", ""),
+            }
+            for r in all_rows_for_file
+        ]
+        sink.write_rows(univ, prog, rows)
+        if index is not None:
+            index.add(univ, prog, rows, source=OUT_CSV)
+        if document_id is not None:
+            get_catalog().add_courses(document_id, univ, prog, rows)
+        LOG.info(" → Guardadas %d filas de %s | %s", len(all_rows_for_file), univ, prog)
+    else:
+        LOG.warning("No se extrajo ninguna fila para %s | %s", univ, prog)
+
+def model_tag() -> str:
+    """Identifica backend + modelo: un cambio de modelo invalida los análisis previos."""
+    backend = get_backend()
+    return f"{backend.name}/{getattr(backend, 'model', MODEL)}"
+
 
-    meta = json.loads(LOG_JSON.read_text(encoding="utf-8"))
+def _load_meta() -> list[dict]:
+    """Descargas a analizar: del catálogo, o del download_log.json heredado."""
+    cat = get_catalog()
+    meta = cat.download_log()
+    if not meta and LOG_JSON.exists():
+        cat.import_download_log(LOG_JSON)
+        meta = cat.download_log()
+    return meta
 
-    # Si el CSV ya existe, hacemos un backup con timestamp para no sobreescribirlo
+
+def previous_analysis(cat, entry: dict, model: str) -> dict | None:
+    """Análisis previo del mismo contenido con el mismo modelo, si existe."""
+    if entry.get("error"):
+        return None
+    return cat.analyzed(
+        entry.get("url", ""), model,
+        entry.get("content_hash") or file_hash(pathlib.Path(entry["path"])),
+        university=entry["university"], program=entry["program"],
+    )
+
+
+def backup_output() -> None:
+    """Si el CSV ya existe, hacemos un backup con timestamp para no sobreescribirlo."""
     if OUT_CSV.exists():
         bk_name = OUT_CSV.with_name(f"courses_clean_backup_{int(time.time())}.csv")
         OUT_CSV.replace(bk_name)
         LOG.info("Se renombró el CSV previo a: %s", bk_name)
 
-    # Abrimos el CSV en modo escritura y colocamos cabecera
-    with OUT_CSV.open("w", encoding="utf-8", newline="") as f_out:
-        f_out.write("university,program,name,credits,mode\n")
+
+def open_outputs():
+    """
+    Prepara una ejecución completa: backup del CSV previo y el índice de
+    búsqueda sin las filas de ese CSV. Devuelve el índice.
+    """
+    backup_output()
+
+    # El índice de búsqueda se alimenta a la vez que el CSV (ver course_index.py)
+    from .course_index import CourseIndex
+    index = CourseIndex.load()
+    index.drop_source(OUT_CSV)
+    return index
+
+
+# ─────────── Función principal ───────────────────────────────────────
+def analyze(batch: bool = False, client=None, poll: float = 60.0, reuse: bool = True):
+    """
+    Recorre las descargas del catálogo y genera courses_clean.csv.
+
+    Con `batch=True` las llamadas a GPT no se hacen una a una: se empaquetan
+    en un job de la Batch API (ver `batch.py`) a través de `client`.
+    Con `reuse` los documentos ya analizados con el mismo contenido y
+    modelo se toman del catálogo sin volver a procesarlos.
+    """
+    meta = _load_meta()
+    if not meta:
+        raise SystemExit("First run: main.py download")
+
+    cat = get_catalog()
+    model = model_tag()
+
+    index = open_outputs()
+
+    # Un único handle para todo el proceso; la cabecera la escribe el sink
+    with CourseSink(OUT_CSV) as sink:
+        pending = []
+        for entry in meta:
+            prev = previous_analysis(cat, entry, model) if reuse else None
+            if prev is None:
+                pending.append(entry)
+                continue
+            LOG.info("Reutilizando análisis %s (%s) de %s | %s",
+                     prev["id"], prev["tier"], entry["university"], entry["program"])
+            _write_rows(sink, entry["university"], entry["program"],
+                        cat.document_courses(prev["id"]), index)
+
+        if batch:
+            from .batch import run_batch
+            for univ, prog, result, doc_id in run_batch(pending, client=client, poll=poll,
+                                                        model=model):
+                _write_rows(sink, univ, prog, _course_rows(result["courses"]), index, doc_id)
+        else:
+            _analyze_documents(pending, sink, index, model)
+
+    index.mark_synced(OUT_CSV)
+    index.save()
+
+    LOG.info("Proceso finalizado. CSV disponible en: %s", OUT_CSV)
+
+
+def _analyze_documents(meta: list[dict], sink, index=None, model: str = MODEL) -> None:
+    """Camino síncrono: motor híbrido documento a documento."""
+    from .engine import EngineStats, run_document
+
+    stats = EngineStats()
+    cat = get_catalog()
 
     # Recorremos cada archivo (sin agrupar) y procesamos de forma incremental
     for entry in meta:
@@ -165,59 +284,32 @@ def analyze():
         kind = entry.get("kind", "html").lower()
 
         LOG.info("Procesando archivo: %s | %s → %s", univ, prog, path)
+
+        # 1. Motor híbrido: extractor determinista y, si no basta, GPT sobre
+        #    las ventanas relevantes (pausita entre chunks para no saturar la API)
+        doc_id = cat.record_document(entry, model)
+        token = current_document.set(doc_id)
         try:
-            raw_text = _pdf_to_text(path) if kind == "pdf" else _html_to_text(path)
+            result = run_document(
+                path, entry.get("url", ""), univ, prog, kind=kind, pause=0.5
+            )
         except Exception as e:
-            LOG.error("No se pudo leer %s: %s", path, e)
+            LOG.error("No se pudo procesar %s: %s", path, e)
             continue
+        finally:
+            current_document.reset(token)
+        cat.finish_document(doc_id, result["tier"], result["confidence"])
+        stats.record(result)
+        LOG.info(
+            " → Nivel %s (confianza %.2f) en %.2fs",
+            result["tier"], result["confidence"], sum(result["timings"].values()),
+        )
 
-        # 1. Dividimos el texto en chunks que no excedan max_chars
-        chunks = split_text_into_chunks(raw_text, max_chars=10_000)
-        all_rows_for_file: list[dict] = []
+        # 2. Una vez procesado el documento, enviamos las filas al CSV
+        _write_rows(sink, univ, prog, _course_rows(result["courses"]), index, doc_id)
 
-        # 2. Para cada chunk, llamamos a GPT y acumulamos las filas
-        for idx, chunk in enumerate(chunks):
-            LOG.info(" → Enviando chunk %d/%d (caracteres=%d)", idx + 1, len(chunks), len(chunk))
-            prompt = _build_prompt(univ, prog, chunk)
+    stats.log_summary(LOG)
 
-            try:
-                rsp = _call_gpt(prompt)
-            except Exception as e:
-                LOG.error("GPT falló para %s | %s (chunk %d): %s", univ, prog, idx + 1, e)
-                # Si un chunk falla, pasamos al siguiente chunk (no abortamos todo el archivo)
-                continue
-            
-            _save_raw_gpt(univ, prog, idx + 1, prompt[1]["content"], rsp)
-            
-            # 3. Parseamos el CSV devuelto por GPT
-            csv_text = _strip_fences(rsp)
-            rows     = _csv_rows(csv_text)
-            if not rows:
-                LOG.warning("GPT devolvió 0 filas. Primeros 200 chars del chunk ↓\n%s", chunk[:200])
-                LOG.warning("Respuesta GPT ↓\n%s", csv_text[:200])
-            else:
-                all_rows_for_file.extend(rows)
-
-            # Pausita corta para no saturar la API
-            time.sleep(0.5)
-
-        # 4. Una vez procesados todos los chunks, escribimos las filas al CSV
-        if all_rows_for_file:
-            with OUT_CSV.open("a", newline="", encoding="utf-8") as f_out:
-                for r in all_rows_for_file:
-                    # Cada r debe tener 'name','credits','mode'
-                    name    = r.get("name", "").replace(",", " ")
-                    credits = _norm_credits(r.get("credits",""))
-                    mode    = r.get("mode", "")
-                    line = f"{univ.replace(',', ' ')}," \
-                           f"{prog.replace(',', ' ')}," \
-                           f"{name},{credits},{mode}\n"
-                    f_out.write(line)
-            LOG.info(" → Guardadas %d filas de %s | %s", len(all_rows_for_file), univ, prog)
-        else:
-            LOG.warning("No se extrajo ninguna fila para %s | %s", univ, prog)
-
-    LOG.info("Proceso finalizado. CSV disponible en: %s", OUT_CSV)
 
 if __name__ == "__main__":
     analyze()
\ No newline at end of file
@@ -0,0 +1,111 @@
+# artifacts.py
+# ──────────────────────────────────────────────────────────────
+# Almacén de artefactos renderizados (gráficas) direccionado por
+# contenido: el id es el sha256 de los bytes + extensión, así que
+#
+#   • el mismo PNG se guarda una sola vez aunque lo pidan N análisis,
+#   • el id sirve de ETag y la respuesta es inmutable (caché larga en
+#     el navegador / CDN),
+#   • /analyze_url puede devolver una URL en vez de base64 en el JSON.
+#
+# Los ficheros viven en data/output/artifacts/<aa>/<id>. Cuando el
+# almacén supera ARTIFACT_MAX_MB se borran los menos usados (atime/mtime).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pathlib
+import re
+import threading
+from typing import TypedDict
+
+from . import metrics
+from .utils import atomic_write_bytes
+
+LOG = logging.getLogger("artifacts")
+
+ARTIFACT_DIR = pathlib.Path("data/output/artifacts")
+ARTIFACT_MAX_MB = float(os.getenv("ARTIFACT_MAX_MB", "512"))
+PRUNE_EVERY = 200                      # escrituras entre comprobaciones de tamaño
+
+MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+    "webp": "image/webp",
+    "json": "application/json",
+}
+_ID_RE = re.compile(r"^([0-9a-f]{32})\.(\w+)$")
+
+_writes = 0
+_lock = threading.Lock()
+
+
+class ArtifactRef(TypedDict):
+    id: str
+    url: str
+    media_type: str
+    bytes: int
+
+
+def path_for(aid: str, root: pathlib.Path = ARTIFACT_DIR) -> pathlib.Path | None:
+    """Ruta del artefacto o None si el id no es válido."""
+    m = _ID_RE.match(aid)
+    if m is None or m.group(2) not in MEDIA_TYPES:
+        return None
+    return root / aid[:2] / aid
+
+
+def etag(aid: str) -> str:
+    return f'"{aid.partition(".")[0]}"'
+
+
+def put(data: bytes, ext: str, root: pathlib.Path = ARTIFACT_DIR) -> ArtifactRef:
+    """Guarda `data` (si no estaba ya) y devuelve su referencia."""
+    global _writes
+    if ext not in MEDIA_TYPES:
+        raise ValueError(f"extensión de artefacto no soportada: {ext}")
+    aid = f"{hashlib.sha256(data).hexdigest()[:32]}.{ext}"
+    path = path_for(aid, root)
+    if path.exists():
+        metrics.inc("artifacts_total", result="hit")
+        os.utime(path)                 # "usado": lo protege de la poda
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(path, data)
+        metrics.inc("artifacts_total", result="stored")
+        with _lock:
+            _writes += 1
+            due = _writes % PRUNE_EVERY == 0
+        if due:
+            prune(root)
+    return ArtifactRef(id=aid, url=f"/artifacts/{aid}", media_type=MEDIA_TYPES[ext], bytes=len(data))
+
+
+def prune(root: pathlib.Path = ARTIFACT_DIR, max_mb: float = ARTIFACT_MAX_MB) -> int:
+    """Borra los artefactos menos recientes hasta quedar bajo `max_mb`. Devuelve cuántos."""
+    files = []
+    for p in root.glob("*/*"):
+        if p.name.startswith(".") or p.name.endswith(".part"):
+            continue                   # temporal de `put` a medio escribir
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        files.append((max(st.st_atime, st.st_mtime), st.st_size, p))
+    total = sum(size for _, size, _ in files)
+    limit = max_mb * 1024 * 1024
+    removed = 0
+    for _, size, p in sorted(files):
+        if total <= limit:
+            break
+        try:
+            p.unlink()
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        LOG.info("Artefactos: %d borrados (%.1f MB en uso)", removed, total / 1024 / 1024)
+    return removed
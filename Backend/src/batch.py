@@ -0,0 +1,330 @@
+# batch.py
+# ──────────────────────────────────────────────────────────────
+# Modo Batch-API para las ejecuciones offline grandes de `analyze()`.
+#
+#   1. El nivel determinista (engine.extractor_tier) se ejecuta en local.
+#   2. Los documentos de baja confianza generan un prompt por chunk que
+#      se serializa en un fichero JSONL (formato /v1/chat/completions).
+#   3. El JSONL se envía a través de un cliente intercambiable:
+#        · OpenAIBatchClient → Batch API real (24 h, ~50 % más barato)
+#        · LocalBatchClient  → sustituto local en un hilo, para pruebas
+#   4. Se sondea hasta completar y cada respuesta se devuelve a su
+#      (universidad, programa, chunk) gracias al manifiesto del job.
+#   5. Cada documento se da de alta en el catálogo antes de guardar sus
+#      chunks; si su job no termina en `completed` queda sin nivel (tier
+#      NULL), así que la siguiente ejecución lo vuelve a enviar.
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import json
+import logging
+import pathlib
+import threading
+import time
+import uuid
+from typing import Callable, Iterable, Iterator, TypedDict
+
+from .analyzer import (
+    MODEL, _build_prompt, _csv_rows, _save_raw_gpt, _strip_fences,
+    split_text_into_chunks,
+)
+from .catalog import current_document, get_catalog
+from .engine import (
+    CONFIDENCE_THRESHOLD, EngineResult, EngineStats,
+    extractor_tier, merge_tiers, relevant_text,
+)
+from .extractor import Course
+from .llm import StubBackend
+
+LOG = logging.getLogger("batch")
+
+BATCH_DIR = pathlib.Path("data/output/batches")
+ENDPOINT = "/v1/chat/completions"
+MAX_REQUESTS_PER_JOB = 50_000          # límite de la Batch API por fichero
+TERMINAL = {"completed", "failed", "expired", "cancelled"}
+
+Responder = Callable[[list[dict]], str]
+
+
+class ChunkRef(TypedDict):
+    doc: int
+    chunk: int
+    university: str
+    program: str
+
+
+# ─────────────────────────── Clientes ────────────────────────────────
+class BatchClient:
+    """Interfaz mínima: enviar un JSONL, consultar estado, leer resultados."""
+
+    def submit(self, jsonl_path: pathlib.Path) -> str:
+        raise NotImplementedError
+
+    def status(self, batch_id: str) -> str:
+        raise NotImplementedError
+
+    def results(self, batch_id: str) -> Iterator[dict]:
+        """Líneas de salida en el formato de la Batch API."""
+        raise NotImplementedError
+
+
+class OpenAIBatchClient(BatchClient):
+    """Cliente real sobre `openai.files` / `openai.batches`."""
+
+    def __init__(self, completion_window: str = "24h") -> None:
+        import openai
+
+        self._openai = openai
+        self.completion_window = completion_window
+
+    def submit(self, jsonl_path: pathlib.Path) -> str:
+        with open(jsonl_path, "rb") as fh:
+            f = self._openai.files.create(file=fh, purpose="batch")
+        b = self._openai.batches.create(
+            input_file_id=f.id,
+            endpoint=ENDPOINT,
+            completion_window=self.completion_window,
+            metadata={"job": jsonl_path.stem},
+        )
+        return b.id
+
+    def status(self, batch_id: str) -> str:
+        return self._openai.batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> Iterator[dict]:
+        b = self._openai.batches.retrieve(batch_id)
+        for file_id in (b.output_file_id, b.error_file_id):
+            if not file_id:
+                continue
+            for ln in self._openai.files.content(file_id).text.splitlines():
+                if ln.strip():
+                    yield json.loads(ln)
+
+
+class LocalBatchClient(BatchClient):
+    """
+    Sustituto local de la Batch API: guarda los jobs en `root`, los procesa
+    en un hilo de fondo con `responder` (por defecto el StubBackend de
+    llm.py, o p. ej. `ReplayBackend().complete`) y escribe la salida en el mismo
+    formato JSONL que OpenAI. Sirve para probar todo el flujo sin red.
+    """
+
+    def __init__(
+        self,
+        root: pathlib.Path = BATCH_DIR / "local",
+        responder: Responder | None = None,
+        latency: float = 0.0,
+    ) -> None:
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.responder = responder or StubBackend().complete
+        self.latency = latency
+        self._state: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, jsonl_path: pathlib.Path) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        (self.root / f"{batch_id}_input.jsonl").write_bytes(jsonl_path.read_bytes())
+        self._set(batch_id, "validating")
+        threading.Thread(target=self._run, args=(batch_id,), daemon=True).start()
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        with self._lock:
+            return self._state.get(batch_id, "failed")
+
+    def results(self, batch_id: str) -> Iterator[dict]:
+        out = self.root / f"{batch_id}_output.jsonl"
+        if not out.exists():
+            return
+        for ln in out.read_text(encoding="utf-8").splitlines():
+            if ln.strip():
+                yield json.loads(ln)
+
+    # ----------------------------------------------------------------
+    def _set(self, batch_id: str, state: str) -> None:
+        with self._lock:
+            self._state[batch_id] = state
+
+    def _run(self, batch_id: str) -> None:
+        self._set(batch_id, "in_progress")
+        src = self.root / f"{batch_id}_input.jsonl"
+        tmp = self.root / f"{batch_id}_output.jsonl.tmp"
+        try:
+            with tmp.open("w", encoding="utf-8") as fh:
+                for ln in src.read_text(encoding="utf-8").splitlines():
+                    if not ln.strip():
+                        continue
+                    req = json.loads(ln)
+                    if self.latency:
+                        time.sleep(self.latency)
+                    fh.write(json.dumps(self._answer(req), ensure_ascii=False) + "\n")
+            tmp.replace(self.root / f"{batch_id}_output.jsonl")
+            self._set(batch_id, "completed")
+        except Exception as exc:
+            LOG.error("Local batch %s failed: %s", batch_id, exc)
+            self._set(batch_id, "failed")
+
+    def _answer(self, req: dict) -> dict:
+        line = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": req["custom_id"]}
+        try:
+            content = self.responder(req["body"]["messages"])
+        except Exception as exc:
+            return {**line, "response": None, "error": {"message": str(exc)}}
+        body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+        return {**line, "response": {"status_code": 200, "body": body}, "error": None}
+
+
+# ─────────────────────────── Jobs ────────────────────────────────────
+def write_job(
+    requests: Iterable[tuple[str, list[dict]]],
+    job_path: pathlib.Path,
+    model: str = MODEL,
+) -> int:
+    """Serializa (custom_id, messages) en el JSONL de entrada. Devuelve nº líneas."""
+    job_path.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    with job_path.open("w", encoding="utf-8") as fh:
+        for custom_id, messages in requests:
+            fh.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": ENDPOINT,
+                "body": {"model": model, "messages": messages, "temperature": 0.0},
+            }, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+
+def wait(client: BatchClient, batch_id: str, poll: float = 60.0, timeout: float | None = None) -> str:
+    """Sondea `client` hasta un estado terminal (o `timeout` segundos)."""
+    t0 = time.monotonic()
+    while True:
+        state = client.status(batch_id)
+        if state in TERMINAL:
+            return state
+        if timeout is not None and time.monotonic() - t0 > timeout:
+            raise TimeoutError(f"batch {batch_id} still {state} after {timeout:.0f}s")
+        LOG.info("batch %s → %s", batch_id, state)
+        time.sleep(poll)
+
+
+def answer_text(line: dict) -> str | None:
+    """Contenido del mensaje de una línea de salida, o None si falló."""
+    rsp = line.get("response") or {}
+    if line.get("error") or rsp.get("status_code") != 200:
+        return None
+    try:
+        return rsp["body"]["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+# ─────────────────────────── Flujo completo ──────────────────────────
+def run_batch(
+    meta: list[dict],
+    *,
+    client: BatchClient | None = None,
+    poll: float = 60.0,
+    timeout: float | None = None,
+    threshold: float = CONFIDENCE_THRESHOLD,
+    model: str = MODEL,
+) -> Iterator[tuple[str, str, EngineResult, int]]:
+    """
+    Versión por lotes de `analyze()`: devuelve (universidad, programa,
+    EngineResult, id del documento en el catálogo) por cada entrada válida
+    de `meta`, en el mismo orden. Los documentos cuyo job no terminó en
+    `completed` se devuelven con lo que haya, pero sin nivel en el catálogo.
+    """
+    client = client or OpenAIBatchClient()
+    stats = EngineStats()
+    cat = get_catalog()
+
+    docs: list[dict] = []
+    manifest: dict[str, ChunkRef] = {}
+    pending: list[tuple[str, list[dict]]] = []
+
+    # 1. Nivel determinista + preparación de prompts
+    for entry in meta:
+        if entry.get("error"):
+            continue
+        univ, prog = entry["university"], entry["program"]
+        path = pathlib.Path(entry["path"])
+        url = entry.get("url", "")
+        courses, confidence, secs = extractor_tier(path, url)
+        doc = {"university": univ, "program": prog, "url": url, "courses": courses,
+               "confidence": confidence, "timings": {"extractor": secs}, "report": None,
+               "answers": {}, "id": cat.record_document(entry, model), "complete": True}
+        docs.append(doc)
+        if confidence >= threshold:
+            continue
+        try:
+            text, doc["report"], doc["timings"]["relevance"] = relevant_text(
+                path, entry.get("kind", "html").lower()
+            )
+        except Exception as exc:
+            LOG.error("No se pudo leer %s: %s", path, exc)
+            continue
+        for idx, chunk in enumerate(split_text_into_chunks(text, max_chars=10_000)):
+            custom_id = f"{len(docs) - 1:06d}-{idx:03d}"
+            manifest[custom_id] = ChunkRef(doc=len(docs) - 1, chunk=idx,
+                                           university=univ, program=prog)
+            pending.append((custom_id, _build_prompt(univ, prog, chunk)))
+
+    # 2. Envío por jobs de hasta MAX_REQUESTS_PER_JOB líneas
+    prompts = dict(pending)
+    job_stamp = time.strftime("%Y%m%d_%H%M%S")
+    for j in range(0, len(pending), MAX_REQUESTS_PER_JOB):
+        part = pending[j:j + MAX_REQUESTS_PER_JOB]
+        job_path = BATCH_DIR / f"job_{job_stamp}_{j // MAX_REQUESTS_PER_JOB:03d}.jsonl"
+        write_job(part, job_path)
+        job_path.with_suffix(".manifest.json").write_text(
+            json.dumps({cid: manifest[cid] for cid, _ in part}, ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        t0 = time.perf_counter()
+        batch_id = client.submit(job_path)
+        LOG.info("Job %s enviado como %s (%d peticiones)", job_path.name, batch_id, len(part))
+        state = wait(client, batch_id, poll=poll, timeout=timeout)
+        LOG.info("Job %s terminó: %s en %.1fs", batch_id, state, time.perf_counter() - t0)
+        if state != "completed":
+            LOG.warning("Job %s terminó en %s: sus documentos quedan sin analizar", batch_id, state)
+            for cid, _ in part:
+                docs[manifest[cid]["doc"]]["complete"] = False
+
+        # 3. Respuestas → (universidad, programa, chunk)
+        for line in client.results(batch_id):
+            ref = manifest.get(line.get("custom_id", ""))
+            text = answer_text(line)
+            if ref is None or text is None:
+                LOG.warning("Respuesta fallida o desconocida: %s", line.get("custom_id"))
+                continue
+            token = current_document.set(docs[ref["doc"]]["id"])
+            try:
+                _save_raw_gpt(ref["university"], ref["program"], ref["chunk"] + 1,
+                              prompts[line["custom_id"]][1]["content"], text)
+            finally:
+                current_document.reset(token)
+            docs[ref["doc"]]["answers"][ref["chunk"]] = text
+
+    # 4. Ensamblado por documento, respetando el orden de los chunks
+    for doc in docs:
+        if doc["report"] is None and doc["confidence"] >= threshold:
+            result = EngineResult(courses=doc["courses"], tier="extractor",
+                                  confidence=doc["confidence"], timings=doc["timings"],
+                                  relevance=None)
+        else:
+            llm_courses = [
+                Course(name=r.get("name", ""), credits=r.get("credits", ""),
+                       mode=r.get("mode", ""), source_url=doc["url"])
+                for idx in sorted(doc["answers"])
+                for r in _csv_rows(_strip_fences(doc["answers"][idx]))
+            ]
+            result = merge_tiers(doc["courses"], llm_courses, doc["confidence"],
+                                 doc["timings"], doc["report"])
+        if doc["complete"]:
+            cat.finish_document(doc["id"], result["tier"], result["confidence"])
+        stats.record(result)
+        yield doc["university"], doc["program"], result, doc["id"]
+
+    stats.log_summary(LOG)
@@ -0,0 +1,350 @@
+# catalog.py
+# ──────────────────────────────────────────────────────────────
+# Catálogo SQLite embebido (data/output/catalog.sqlite) con todo el estado
+# del pipeline, consultable y actualizable de forma incremental:
+#
+#   sources    (universidad, programa, url)         ← data/Salida.csv
+#   fetches    cada descarga: ruta, tipo, estado, hash del contenido
+#   documents  cada análisis: (fuente, hash, modelo) → nivel, confianza
+#   chunks     prompts/respuestas del LLM (hash del prompt = ReplayBackend)
+#   courses    filas extraídas de cada documento
+#
+# WAL + synchronous=NORMAL: lectores (API) y escritor (CLI) concurrentes.
+# Las altas masivas van en una sola transacción (`with cat.batch():`) y
+# los cursos con executemany.
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import json
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+LOG = logging.getLogger("catalog")
+
+DB_PATH = pathlib.Path("data/output/catalog.sqlite")
+LEGACY_LOG = pathlib.Path("data/output/download_log.json")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id          INTEGER PRIMARY KEY,
+    university  TEXT NOT NULL,
+    program     TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    UNIQUE (url, university, program)
+);
+CREATE INDEX IF NOT EXISTS ix_sources_univ_prog ON sources (university, program);
+
+CREATE TABLE IF NOT EXISTS fetches (
+    id           INTEGER PRIMARY KEY,
+    source_id    INTEGER NOT NULL REFERENCES sources (id),
+    fetched_at   REAL NOT NULL,
+    path         TEXT,
+    kind         TEXT,
+    status       INTEGER,
+    elapsed      REAL,
+    bytes        INTEGER,
+    content_hash TEXT,
+    error        TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_fetches_source ON fetches (source_id, fetched_at);
+CREATE INDEX IF NOT EXISTS ix_fetches_hash ON fetches (content_hash);
+
+CREATE TABLE IF NOT EXISTS documents (
+    id           INTEGER PRIMARY KEY,
+    source_id    INTEGER NOT NULL REFERENCES sources (id),
+    content_hash TEXT NOT NULL,
+    model        TEXT NOT NULL,
+    path         TEXT,
+    kind         TEXT,
+    tier         TEXT,
+    confidence   REAL,
+    analyzed_at  REAL NOT NULL,
+    UNIQUE (source_id, content_hash, model)
+);
+CREATE INDEX IF NOT EXISTS ix_documents_hash ON documents (content_hash);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    id           INTEGER PRIMARY KEY,
+    document_id  INTEGER REFERENCES documents (id) ON DELETE CASCADE,
+    university   TEXT NOT NULL,
+    program      TEXT NOT NULL,
+    idx          INTEGER NOT NULL,
+    prompt_hash  TEXT NOT NULL,
+    prompt       TEXT NOT NULL,
+    answer       TEXT NOT NULL,
+    created_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_chunks_document ON chunks (document_id);
+CREATE INDEX IF NOT EXISTS ix_chunks_prompt ON chunks (prompt_hash);
+CREATE INDEX IF NOT EXISTS ix_chunks_univ_prog ON chunks (university, program);
+
+CREATE TABLE IF NOT EXISTS courses (
+    id           INTEGER PRIMARY KEY,
+    document_id  INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+    university   TEXT NOT NULL,
+    program      TEXT NOT NULL,
+    name         TEXT NOT NULL,
+    credits      TEXT,
+    mode         TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_courses_univ_prog ON courses (university, program);
+CREATE INDEX IF NOT EXISTS ix_courses_document ON courses (document_id);
+"""
+
+# documento en análisis: `record_chunk()` lo usa para enlazar los prompts
+current_document: contextvars.ContextVar[int | None] = contextvars.ContextVar(
+    "catalog_document", default=None
+)
+
+
+def file_hash(path: pathlib.Path) -> str | None:
+    """sha256 del fichero (None si no existe)."""
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 16), b""):
+                h.update(block)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def prompt_hash(content: str) -> str:
+    """Mismo hash que usa ReplayBackend para indexar grabaciones."""
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class Catalog:
+    """
+    Acceso al catálogo. Una conexión por hilo (el threadpool de FastAPI
+    reparte peticiones entre hilos); las escrituras se serializan con un lock.
+
+        cat = get_catalog()
+        with cat.batch():
+            for info in infos:
+                cat.record_fetch(info)
+    """
+
+    def __init__(self, path: pathlib.Path = DB_PATH) -> None:
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        with self._conn() as con:
+            con.executescript(SCHEMA)
+
+    # ─────────── conexión / transacciones ───────────
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("PRAGMA foreign_keys=ON")
+            self._local.con = con
+            self._local.depth = 0
+        return con
+
+    @contextmanager
+    def batch(self) -> Iterator[sqlite3.Connection]:
+        """Agrupa todas las escrituras del bloque en una transacción."""
+        con = self._conn()
+        with self._write_lock:
+            if self._local.depth == 0:
+                con.execute("BEGIN IMMEDIATE")
+            self._local.depth += 1
+            try:
+                yield con
+            except BaseException:
+                self._local.depth -= 1
+                if self._local.depth == 0:
+                    con.execute("ROLLBACK")
+                raise
+            else:
+                self._local.depth -= 1
+                if self._local.depth == 0:
+                    con.execute("COMMIT")
+
+    def close(self) -> None:
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+    # ─────────── escritura ───────────
+    def upsert_source(self, university: str, program: str, url: str) -> int:
+        with self.batch() as con:
+            con.execute(
+                "INSERT OR IGNORE INTO sources (university, program, url, created_at)"
+                " VALUES (?, ?, ?, ?)",
+                (university, program, url, time.time()),
+            )
+            return con.execute(
+                "SELECT id FROM sources WHERE url = ? AND university = ? AND program = ?",
+                (url, university, program),
+            ).fetchone()[0]
+
+    def record_fetch(self, info: dict) -> int:
+        """Registra el resultado de `fetch_page` (DownloadInfo)."""
+        path = info.get("path")
+        size = content = None
+        if path and not info.get("error"):
+            p = pathlib.Path(path)
+            size = p.stat().st_size if p.exists() else None
+            content = file_hash(p)
+        with self.batch() as con:
+            sid = self.upsert_source(info.get("university", "N/A"),
+                                     info.get("program", "N/A"), info.get("url", ""))
+            cur = con.execute(
+                "INSERT INTO fetches (source_id, fetched_at, path, kind, status, elapsed,"
+                " bytes, content_hash, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (sid, time.time(), path, info.get("kind"), info.get("status"),
+                 info.get("elapsed"), size, content, info.get("error")),
+            )
+            return cur.lastrowid
+
+    def record_document(
+        self,
+        entry: dict,
+        model: str,
+        *,
+        tier: str | None = None,
+        confidence: float | None = None,
+    ) -> int:
+        """
+        Alta (o reemplazo) del análisis de `entry` (una fila de download_log)
+        con `model`. Borra los cursos/chunks de un análisis previo idéntico.
+        """
+        content = entry.get("content_hash") or file_hash(pathlib.Path(entry["path"])) or ""
+        with self.batch() as con:
+            sid = self.upsert_source(entry["university"], entry["program"], entry.get("url", ""))
+            con.execute(
+                "DELETE FROM documents WHERE source_id = ? AND content_hash = ? AND model = ?",
+                (sid, content, model),
+            )
+            cur = con.execute(
+                "INSERT INTO documents (source_id, content_hash, model, path, kind, tier,"
+                " confidence, analyzed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (sid, content, model, entry.get("path"), entry.get("kind"),
+                 tier, confidence, time.time()),
+            )
+            return cur.lastrowid
+
+    def finish_document(self, document_id: int, tier: str, confidence: float) -> None:
+        with self.batch() as con:
+            con.execute("UPDATE documents SET tier = ?, confidence = ? WHERE id = ?",
+                        (tier, confidence, document_id))
+
+    def add_courses(self, document_id: int, university: str, program: str,
+                    rows: Iterable[dict]) -> int:
+        params = [
+            (document_id, university, program, r.get("name", ""),
+             str(r.get("credits") or ""), r.get("mode", "") or "")
+            for r in rows
+        ]
+        with self.batch() as con:
+            con.executemany(
+                "INSERT INTO courses (document_id, university, program, name, credits, mode)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                params,
+            )
+        return len(params)
+
+    def record_chunk(self, university: str, program: str, idx: int,
+                     prompt: str, answer: str) -> None:
+        with self.batch() as con:
+            con.execute(
+                "INSERT INTO chunks (document_id, university, program, idx, prompt_hash,"
+                " prompt, answer, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (current_document.get(), university, program, idx,
+                 prompt_hash(prompt), prompt, answer, time.time()),
+            )
+
+    # ─────────── consultas ───────────
+    def analyzed(self, url: str, model: str, content_hash: str | None = None,
+                 *, university: str | None = None, program: str | None = None) -> dict | None:
+        """
+        Último análisis de `url` con `model` (y, si se indica, del mismo
+        contenido). Usa los índices únicos: O(log n).
+        """
+        sql = ("SELECT d.*, s.university, s.program, s.url FROM documents d"
+               " JOIN sources s ON s.id = d.source_id"
+               " WHERE s.url = ? AND d.model = ? AND d.tier IS NOT NULL")
+        args: list = [url, model]
+        if content_hash is not None:
+            sql += " AND d.content_hash = ?"
+            args.append(content_hash)
+        if university is not None:
+            sql += " AND s.university = ? AND s.program = ?"
+            args += [university, program]
+        row = self._conn().execute(sql + " ORDER BY d.analyzed_at DESC LIMIT 1", args).fetchone()
+        return dict(row) if row else None
+
+    def document_courses(self, document_id: int) -> list[dict]:
+        return [dict(r) for r in self._conn().execute(
+            "SELECT name, credits, mode FROM courses WHERE document_id = ? ORDER BY id",
+            (document_id,),
+        )]
+
+    def courses(self, university: str | None = None, program: str | None = None) -> list[dict]:
+        """Cursos del último análisis de cada fuente, filtrables por universidad/programa."""
+        sql = ("SELECT c.university, c.program, c.name, c.credits, c.mode FROM courses c"
+               " WHERE c.document_id IN (SELECT MAX(id) FROM documents"
+               " WHERE tier IS NOT NULL GROUP BY source_id)")
+        args: list = []
+        if university is not None:
+            sql += " AND c.university = ?"
+            args.append(university)
+        if program is not None:
+            sql += " AND c.program = ?"
+            args.append(program)
+        return [dict(r) for r in self._conn().execute(sql + " ORDER BY c.id", args)]
+
+    def download_log(self) -> list[dict]:
+        """
+        Última descarga de cada fuente, con las mismas claves que las
+        entradas de download_log.json (más `content_hash`).
+        """
+        rows = self._conn().execute(
+            "SELECT s.university, s.program, s.url, f.status, f.elapsed, f.path, f.kind,"
+            " f.error, f.content_hash FROM fetches f JOIN sources s ON s.id = f.source_id"
+            " WHERE f.id IN (SELECT MAX(id) FROM fetches GROUP BY source_id)"
+            " ORDER BY s.id"
+        )
+        return [{k: v for k, v in dict(r).items() if v is not None} for r in rows]
+
+    def import_download_log(self, path: pathlib.Path = LEGACY_LOG) -> int:
+        """Migra un download_log.json existente al catálogo."""
+        meta = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+        with self.batch():
+            for info in meta:
+                self.record_fetch(info)
+        LOG.info("Importadas %d descargas de %s", len(meta), path)
+        return len(meta)
+
+    def stats(self) -> dict[str, int]:
+        con = self._conn()
+        return {t: con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                for t in ("sources", "fetches", "documents", "chunks", "courses")}
+
+
+# ─────────────────────────── Instancia compartida ────────────────────
+_shared: Catalog | None = None
+_shared_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Catalog()
+        return _shared
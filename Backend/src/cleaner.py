@@ -18,6 +18,9 @@ import logging
 import pathlib
 from bs4 import BeautifulSoup, Comment  # type: ignore
 
+from .metrics import timed
+from .utils import atomic_write_text
+
 # ─────────────────────────────────  CONFIG  ──────────────────────────────
 # Etiquetas que se eliminan por completo
 STRIP_TAGS = {
@@ -51,6 +54,7 @@ def _clean_attributes(tag) -> None:
             del tag.attrs[attr]
 
 
+@timed("clean")
 def clean_html(file_path: pathlib.Path) -> None:
     """Limpia un archivo HTML conservando su estructura."""
     if file_path.suffix.lower() != ".html":
@@ -80,6 +84,7 @@ def clean_html(file_path: pathlib.Path) -> None:
     # 5) Quitar espacios y saltos de línea redundantes
     pretty_html = soup.prettify(formatter="minimal")
 
-    # 6) Añadir DOCTYPE y guardar
+    # 6) Añadir DOCTYPE y guardar (temporal + rename: un lector concurrente
+    #    nunca ve el fichero a medio escribir)
     minimal = f"<!DOCTYPE html>\n{pretty_html}"
-    file_path.write_text(minimal, "utf-8")
+    atomic_write_text(file_path, minimal)
@@ -0,0 +1,225 @@
+# course_batch.py
+# ──────────────────────────────────────────────────────────────
+# Lote de cursos en columnas, para cuando hay muchos `Course` juntos
+# (unión de bloques del extractor, envío entre procesos del pipeline,
+# agregados de /analyze_batch).
+#
+# Un `list[Course]` repite en cada fila la misma `source_url` y
+# cadenas vacías de code/credits/semester. Aquí:
+#
+#   name      ndarray[object]      (casi siempre distinto: sin codificar)
+#   credits   ndarray[float32]     (NaN = sin créditos) para agregados
+#   code, credits_raw, semester, mode, source_url, university, program
+#             códigos int32 + diccionario de valores (cada cadena una vez);
+#             credits_raw es el texto original ("7,5", "3-4", "6 ECTS"),
+#             que es lo que devuelve `to_courses()`: el lote no cambia la
+#             salida del extractor
+#   keys      ndarray[uint64]      hash estable de (nombre en minúsculas,
+#                                  código o nombre[:15]): la clave de unión
+#
+# Unir y deduplicar lotes trabaja sobre `keys` (np.unique) en vez de
+# tuplas de cadenas. `to_pandas()` da columnas categóricas a partir de los
+# mismos códigos y `to_arrow()` DictionaryArrays (pyarrow es opcional).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+from typing import TYPE_CHECKING, Iterable, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .extractor import Course
+
+DICT_COLUMNS = ("code", "credits_raw", "semester", "mode", "source_url", "university", "program")
+# columna de diccionario → campo del Course del que sale (si se llama distinto)
+_FIELD_OF = {"credits_raw": "credits"}
+COURSE_FIELDS = ("name", "code", "credits", "semester", "mode", "source_url")
+
+_NUM_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def course_key(name: str, code: str = "") -> int:
+    """Hash de 64 bits (estable entre procesos) de la clave de unión del extractor."""
+    raw = f"{name.lower()}\x1f{code or name[:15]}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+
+
+def parse_credits(value) -> float:
+    """'3', '7,5', '6 ECTS' → número; vacío o sin cifras → NaN."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value or "").strip().replace(",", ".")
+    if not text:
+        return math.nan
+    try:
+        return float(text)
+    except ValueError:
+        m = _NUM_RE.search(text)
+        return float(m.group(0)) if m else math.nan
+
+
+class _Encoder:
+    """Diccionario de valores → código, en orden de aparición."""
+
+    def __init__(self) -> None:
+        self.values: list[str] = []
+        self._index: dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        i = self._index.get(value)
+        if i is None:
+            i = self._index[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+class CourseBatch:
+    """
+    Cursos en columnas paralelas.
+
+        batch = CourseBatch.from_courses(courses, university="UNAL", program="Sistemas")
+        merged = CourseBatch.concat([a, b]).dedup(min_name=4)
+        merged.to_courses(), merged.to_pandas()
+    """
+
+    def __init__(
+        self,
+        name: np.ndarray,
+        credits: np.ndarray,
+        codes: dict[str, np.ndarray],
+        dicts: dict[str, list[str]],
+        keys: np.ndarray,
+    ) -> None:
+        self.name = name
+        self.credits = credits
+        self.codes = codes
+        self.dicts = dicts
+        self.keys = keys
+
+    # ─────────── construcción ───────────
+    @classmethod
+    def empty(cls) -> "CourseBatch":
+        return cls.from_courses([])
+
+    @classmethod
+    def from_courses(
+        cls, courses: Iterable[Course | dict], *, university: str = "", program: str = ""
+    ) -> "CourseBatch":
+        """Codifica una lista de `Course` (o filas name/credits/mode)."""
+        encoders = {col: _Encoder() for col in DICT_COLUMNS}
+        const = {"university": university, "program": program}
+        names: list[str] = []
+        credits: list[float] = []
+        codes: dict[str, list[int]] = {col: [] for col in DICT_COLUMNS}
+        keys: list[int] = []
+        for c in courses:
+            name = str(c.get("name") or "")
+            code = str(c.get("code") or "")
+            names.append(name)
+            credits.append(parse_credits(c.get("credits")))
+            keys.append(course_key(name, code))
+            for col in DICT_COLUMNS:
+                value = const[col] if col in const else str(c.get(_FIELD_OF.get(col, col)) or "")
+                codes[col].append(encoders[col].code(value))
+        name_arr = np.empty(len(names), dtype=object)
+        name_arr[:] = names
+        return cls(
+            name=name_arr,
+            credits=np.asarray(credits, dtype=np.float32),
+            codes={col: np.asarray(v, dtype=np.int32) for col, v in codes.items()},
+            dicts={col: encoders[col].values for col in DICT_COLUMNS},
+            keys=np.asarray(keys, dtype=np.uint64),
+        )
+
+    @classmethod
+    def concat(cls, batches: Sequence["CourseBatch"]) -> "CourseBatch":
+        """Une lotes re-mapeando sus diccionarios a uno común (sin tocar las cadenas)."""
+        batches = [b for b in batches if len(b)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+        codes: dict[str, np.ndarray] = {}
+        dicts: dict[str, list[str]] = {}
+        for col in DICT_COLUMNS:
+            enc = _Encoder()
+            parts = []
+            for b in batches:
+                remap = np.fromiter((enc.code(v) for v in b.dicts[col]), dtype=np.int32,
+                                    count=len(b.dicts[col]))
+                parts.append(remap[b.codes[col]])
+            codes[col] = np.concatenate(parts)
+            dicts[col] = enc.values
+        return cls(
+            name=np.concatenate([b.name for b in batches]),
+            credits=np.concatenate([b.credits for b in batches]),
+            codes=codes,
+            dicts=dicts,
+            keys=np.concatenate([b.keys for b in batches]),
+        )
+
+    # ─────────── selección ───────────
+    def __len__(self) -> int:
+        return len(self.name)
+
+    def take(self, idx: np.ndarray) -> "CourseBatch":
+        """Filas `idx` (índices o máscara booleana); los diccionarios se comparten."""
+        return CourseBatch(
+            name=self.name[idx],
+            credits=self.credits[idx],
+            codes={col: c[idx] for col, c in self.codes.items()},
+            dicts=self.dicts,
+            keys=self.keys[idx],
+        )
+
+    filter = take
+
+    def dedup(self, *, min_name: int = 0) -> "CourseBatch":
+        """Primera fila de cada clave; las de nombre más corto que `min_name` se descartan."""
+        rows = np.arange(len(self))
+        if min_name:
+            rows = rows[np.fromiter(map(len, self.name), dtype=np.int64, count=len(self)) >= min_name]
+        _, first = np.unique(self.keys[rows], return_index=True)
+        return self.take(rows[np.sort(first)])
+
+    def column(self, col: str) -> list[str]:
+        """Valores decodificados de una columna de diccionario."""
+        values = self.dicts[col]
+        return [values[i] for i in self.codes[col]]
+
+    # ─────────── salidas ───────────
+    def to_courses(self) -> list[Course]:
+        """`Course` con los créditos tal como llegaron (credits_raw)."""
+        cols = {col: self.column(col) for col in ("code", "credits_raw", "semester", "mode", "source_url")}
+        return [
+            {"name": name, "code": cols["code"][i], "credits": cols["credits_raw"][i],
+             "semester": cols["semester"][i], "mode": cols["mode"][i],
+             "source_url": cols["source_url"][i]}
+            for i, name in enumerate(self.name)
+        ]
+
+    def to_pandas(self):
+        """DataFrame con categóricas construidas desde los códigos (sin re-codificar)."""
+        import pandas as pd
+
+        data = {"name": self.name, "credits": self.credits}
+        for col in DICT_COLUMNS:
+            data[col] = pd.Categorical.from_codes(self.codes[col], categories=self.dicts[col])
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self):
+        """Tabla Arrow con DictionaryArrays (requiere pyarrow)."""
+        import pyarrow as pa
+
+        cols = {
+            "name": pa.array(self.name, type=pa.string()),
+            "credits": pa.array(self.credits, from_pandas=True),     # NaN → null
+        }
+        for col in DICT_COLUMNS:
+            cols[col] = pa.DictionaryArray.from_arrays(
+                pa.array(self.codes[col]), pa.array(self.dicts[col], type=pa.string())
+            )
+        return pa.table(cols)
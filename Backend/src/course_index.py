@@ -0,0 +1,382 @@
+# course_index.py
+# ──────────────────────────────────────────────────────────────
+# Índice invertido persistente sobre los nombres de curso.
+#
+#   • Términos = `preprocess()` de graph/analyze_text_data_return_files
+#     (el mismo normalizado que usan las gráficas).
+#   • Fuentes: los CSV de Anexos/ (región fija) y el CSV del pipeline,
+#     que `analyze()` va alimentando con `add()` a medida que escribe.
+#   • Las fuentes se sincronizan por tamaño: si un CSV solo ha crecido se
+#     indexa únicamente la cola nueva; si se reescribió, se re-indexa.
+#   • Consultas por término, prefijo (`rein*`) y filtros de región /
+#     universidad: intersección de listas de postings en memoria.
+#
+# Persistencia: data/output/course_index.json (escritura atómica).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import bisect
+import csv
+import io
+import json
+import logging
+import pathlib
+import threading
+import time
+from typing import Iterable, TypedDict
+
+from src.graph.analyze_text_data_return_files import preprocess
+
+LOG = logging.getLogger("course_index")
+
+INDEX_PATH = pathlib.Path("data/output/course_index.json")
+PIPELINE_CSV = pathlib.Path("data/output/courses_clean.csv")
+DEFAULT_REGION = "World"
+
+# CSV indexados por defecto → región de sus filas (None = se infiere por
+# universidad a partir de las demás fuentes, o DEFAULT_REGION)
+SOURCES: dict[pathlib.Path, str | None] = {
+    pathlib.Path("../Anexos/courses_clean_colombia.csv"): "Colombia",
+    pathlib.Path("../Anexos/courses_clean.csv"): "World",
+    PIPELINE_CSV: None,
+}
+
+REFRESH_EVERY = 5.0   # segundos mínimos entre comprobaciones de las fuentes
+
+# doc = [source, region, university, program, name, credits, mode]
+_SRC, _REGION, _UNIV, _PROG, _NAME, _CREDITS, _MODE = range(7)
+
+
+class Hit(TypedDict):
+    id: int
+    region: str
+    university: str
+    program: str
+    name: str
+    credits: str
+    mode: str
+
+
+class ProgramHit(TypedDict):
+    region: str
+    university: str
+    program: str
+    matches: int
+
+
+class SearchResult(TypedDict):
+    query: str
+    terms: list[str]
+    total: int
+    took_ms: float
+    hits: list[Hit]
+    programs: list[ProgramHit]
+
+
+def terms_of(text: str) -> list[str]:
+    """Términos indexables de un texto (orden y duplicados preservados)."""
+    return preprocess(text).split()
+
+
+def _key(s: str) -> str:
+    return " ".join(s.split()).casefold()
+
+
+def _stamp(st) -> dict:
+    return {"size": st.st_size, "mtime": st.st_mtime, "ino": st.st_ino}
+
+
+def _intersect(lists: list[list[int]]) -> list[int]:
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    acc = set(lists[0])
+    for other in lists[1:]:
+        acc.intersection_update(other)
+        if not acc:
+            break
+    return sorted(acc)
+
+
+class CourseIndex:
+    """
+    Índice invertido en memoria con persistencia JSON.
+
+        idx = CourseIndex.load()
+        idx.sync()                                   # fuentes en disco
+        idx.search("reinforcement learning", region="World")
+    """
+
+    def __init__(self, path: pathlib.Path = INDEX_PATH) -> None:
+        self.path = pathlib.Path(path)
+        self.docs: list[list[str]] = []
+        self.postings: dict[str, list[int]] = {}
+        self.by_region: dict[str, list[int]] = {}
+        self.by_univ: dict[str, list[int]] = {}
+        self.univ_region: dict[str, str] = {}
+        self.sources: dict[str, dict] = {}        # ruta → {"size", "mtime", "ino"}
+        self._vocab: list[str] | None = None
+        self._lock = threading.RLock()
+        self._checked = 0.0
+        self._refreshing = threading.Lock()
+        self.dirty = False
+
+    # ─────────── persistencia ───────────
+    @classmethod
+    def load(cls, path: pathlib.Path = INDEX_PATH) -> "CourseIndex":
+        idx = cls(path)
+        if idx.path.exists():
+            data = json.loads(idx.path.read_text(encoding="utf-8"))
+            idx.sources = data.get("sources", {})
+            for doc in data.get("docs", []):
+                idx._append(doc)
+            idx.dirty = False
+        return idx
+
+    def save(self) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(
+                json.dumps({"sources": self.sources, "docs": self.docs}, ensure_ascii=False),
+                encoding="utf-8",
+            )
+            tmp.replace(self.path)
+            self.dirty = False
+        LOG.info("Índice guardado en %s (%d cursos, %d términos)",
+                 self.path, len(self.docs), len(self.postings))
+
+    # ─────────── altas ───────────
+    def _append(self, doc: list[str]) -> int:
+        doc_id = len(self.docs)
+        self.docs.append(doc)
+        for term in dict.fromkeys(terms_of(doc[_NAME])):
+            plist = self.postings.get(term)
+            if plist is None:
+                self.postings[term] = [doc_id]
+                self._vocab = None
+            else:
+                plist.append(doc_id)
+        self.by_region.setdefault(_key(doc[_REGION]), []).append(doc_id)
+        self.by_univ.setdefault(_key(doc[_UNIV]), []).append(doc_id)
+        self.univ_region.setdefault(_key(doc[_UNIV]), doc[_REGION])
+        self.dirty = True
+        return doc_id
+
+    def add(
+        self,
+        university: str,
+        program: str,
+        rows: Iterable[dict],
+        *,
+        source: str | pathlib.Path = PIPELINE_CSV,
+        region: str | None = None,
+    ) -> int:
+        """Indexa las filas (name, credits, mode) de un programa. Devuelve cuántas."""
+        region = region or self.univ_region.get(_key(university), DEFAULT_REGION)
+        n = 0
+        with self._lock:
+            for r in rows:
+                name = str(r.get("name") or "").strip()
+                if not name:
+                    continue
+                self._append([
+                    str(source), region, university, program, name,
+                    str(r.get("credits") or ""), str(r.get("mode") or ""),
+                ])
+                n += 1
+        return n
+
+    def drop_source(self, source: str | pathlib.Path) -> None:
+        """Elimina las filas de una fuente (p. ej. antes de reescribir su CSV)."""
+        source = str(source)
+        with self._lock:
+            keep = [d for d in self.docs if d[_SRC] != source]
+            self.sources.pop(source, None)
+            if len(keep) == len(self.docs):
+                return
+            self.docs, self.postings, self.by_region, self.by_univ = [], {}, {}, {}
+            self.univ_region, self._vocab = {}, None
+            for doc in keep:
+                self._append(doc)
+
+    def mark_synced(self, csv_path: pathlib.Path) -> None:
+        """Registra que `csv_path` ya está indexado completo (tras `add()`)."""
+        st = pathlib.Path(csv_path).stat()
+        with self._lock:
+            self.sources[str(csv_path)] = _stamp(st)
+            self.dirty = True
+
+    # ─────────── sincronización con CSV ───────────
+    def sync_csv(self, csv_path: pathlib.Path, region: str | None = None) -> int:
+        """
+        Pone al día una fuente CSV. Si es el mismo fichero y solo ha crecido
+        se leen los bytes nuevos; si se reemplazó o encogió, se re-indexa.
+        """
+        csv_path = pathlib.Path(csv_path)
+        source = str(csv_path)
+        if not csv_path.exists():
+            self.drop_source(source)
+            return 0
+        st = csv_path.stat()
+        with self._lock:
+            prev = self.sources.get(source)
+            if prev == _stamp(st):
+                return 0
+            same_file = prev is not None and prev.get("ino") == st.st_ino
+            offset = prev["size"] if same_file and 0 < prev["size"] < st.st_size else 0
+            if offset == 0:
+                self.drop_source(source)
+            with open(csv_path, "rb") as fh:
+                header = next(csv.reader([fh.readline().decode("utf-8-sig")]), [])
+                if offset:
+                    fh.seek(offset)
+                tail = fh.read().decode("utf-8")
+            n = 0
+            for row in csv.DictReader(io.StringIO(tail, newline=""), fieldnames=header):
+                n += self.add(row.get("university", ""), row.get("program", ""), [row],
+                              source=source, region=row.get("region") or region)
+            self.sources[source] = _stamp(st)
+            self.dirty = True
+        LOG.info("Fuente %s: +%d cursos%s", source, n, " (incremental)" if offset else "")
+        return n
+
+    def sync(self, sources: dict[pathlib.Path, str | None] | None = None) -> int:
+        """Sincroniza todas las fuentes configuradas (por defecto SOURCES)."""
+        n = sum(self.sync_csv(p, region) for p, region in (sources or SOURCES).items())
+        self._checked = time.monotonic()
+        return n
+
+    def stale(self, sources: dict[pathlib.Path, str | None] | None = None) -> bool:
+        """True si alguna fuente cambió (tamaño, mtime o inodo) desde su último sync."""
+        for p in sources or SOURCES:
+            try:
+                st = pathlib.Path(p).stat()
+            except OSError:
+                if str(p) in self.sources:
+                    return True
+                continue
+            if self.sources.get(str(p)) != _stamp(st):
+                return True
+        return False
+
+    def refresh(self, *, background: bool = False) -> None:
+        """
+        Como mucho cada REFRESH_EVERY segundos mira las fuentes (un `stat`
+        por fichero) y, solo si alguna cambió, hace `sync()` y guarda. Con
+        `background` ese trabajo va a un hilo y la llamada vuelve enseguida.
+        """
+        if time.monotonic() - self._checked < REFRESH_EVERY:
+            return
+        self._checked = time.monotonic()
+        if not (self.dirty or self.stale()):
+            return
+        if not self._refreshing.acquire(blocking=False):
+            return                     # ya hay un refresco en curso
+        if background:
+            threading.Thread(target=self._refresh, name="index-refresh", daemon=True).start()
+        else:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        try:
+            if self.sync() or self.dirty:
+                self.save()
+        except Exception:
+            LOG.exception("No se pudo refrescar el índice")
+        finally:
+            self._refreshing.release()
+
+    # ─────────── consultas ───────────
+    def vocab(self) -> list[str]:
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+        return self._vocab
+
+    def _prefix_postings(self, prefix: str) -> list[int]:
+        vocab = self.vocab()
+        i = bisect.bisect_left(vocab, prefix)
+        ids: set[int] = set()
+        while i < len(vocab) and vocab[i].startswith(prefix):
+            ids.update(self.postings[vocab[i]])
+            i += 1
+        return sorted(ids)
+
+    def search(
+        self,
+        q: str = "",
+        *,
+        prefix: bool = False,
+        region: str | None = None,
+        university: str | None = None,
+        limit: int = 50,
+    ) -> SearchResult:
+        """
+        Cursos cuyo nombre contiene todos los términos de `q`. Con `prefix`
+        (o si `q` termina en `*`) el último término se busca como prefijo.
+        `programs` agrega los aciertos por (universidad, programa).
+        """
+        t0 = time.perf_counter()
+        prefix = prefix or q.rstrip().endswith("*")
+        terms = terms_of(q)
+        if q.strip() and not terms:
+            # solo stopwords ("the"): sin términos no hay nada que buscar
+            return SearchResult(query=q, terms=[], total=0, took_ms=0.0, hits=[], programs=[])
+        with self._lock:
+            lists: list[list[int]] = []
+            for i, term in enumerate(terms):
+                last = i == len(terms) - 1
+                lists.append(self._prefix_postings(term) if prefix and last
+                             else self.postings.get(term, []))
+            if region:
+                lists.append(self.by_region.get(_key(region), []))
+            if university:
+                lists.append(self.by_univ.get(_key(university), []))
+            if lists:
+                ids = _intersect(lists)
+            else:
+                ids = list(range(len(self.docs)))
+
+            programs: dict[tuple[str, str], ProgramHit] = {}
+            for doc_id in ids:
+                d = self.docs[doc_id]
+                p = programs.get((d[_UNIV], d[_PROG]))
+                if p is None:
+                    p = programs[(d[_UNIV], d[_PROG])] = ProgramHit(
+                        region=d[_REGION], university=d[_UNIV], program=d[_PROG], matches=0
+                    )
+                p["matches"] += 1
+            hits = [
+                Hit(id=i, region=d[_REGION], university=d[_UNIV], program=d[_PROG],
+                    name=d[_NAME], credits=d[_CREDITS], mode=d[_MODE])
+                for i in ids[:limit]
+                for d in (self.docs[i],)
+            ]
+        return SearchResult(
+            query=q,
+            terms=terms,
+            total=len(ids),
+            took_ms=round((time.perf_counter() - t0) * 1000, 3),
+            hits=hits,
+            programs=sorted(programs.values(), key=lambda p: -p["matches"]),
+        )
+
+
+# ─────────────────────────── Instancia compartida ────────────────────
+_shared: CourseIndex | None = None
+_shared_lock = threading.Lock()
+
+
+def get_index() -> CourseIndex:
+    """
+    Índice del proceso (API): se carga una vez y se refresca en segundo plano
+    cuando cambia alguna fuente; la petición no espera al re-indexado (salvo
+    la primera vez, si el índice aún no tiene ninguna fuente).
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = CourseIndex.load()
+        idx = _shared
+    idx.refresh(background=bool(idx.sources))
+    return idx
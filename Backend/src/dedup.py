@@ -0,0 +1,213 @@
+# dedup.py
+# ──────────────────────────────────────────────────────────────
+# Agrupación de nombres de curso casi duplicados:
+#
+#   "Machine Learning I" · "Machine learning 1" · "Intro. to Machine Learning"
+#        → misma clave canónica
+#
+#   1. normalize_name(): minúsculas sin tildes, abreviaturas expandidas,
+#      números romanos → dígitos y sin marcas de curso introductorio.
+#   2. Shingles de caracteres (k=SHINGLE_K) → firma MinHash (numpy).
+#   3. LSH por bandas: solo se comparan los nombres que comparten algún
+#      cubo, y cada candidato se verifica con la Jaccard exacta de sus
+#      shingles y con los mismos números ("ML 2" ≠ "ML 3").
+#   4. Union-find sobre los pares aceptados (verificados contra el
+#      representante de cada clúster) → clúster cuyo id es el hash de la
+#      menor clave normalizada del clúster: no depende del orden de
+#      llegada y solo cambia si entra una variante con clave menor.
+#
+# Coste ~lineal en el nº de nombres distintos (los idénticos tras
+# normalizar se colapsan antes de calcular firmas). Cada nombre se compara
+# como mucho con MAX_BUCKET_CHECKS entradas de cada cubo, así que en cubos
+# muy poblados (nombres muy genéricos y frecuentes) se pueden escapar
+# algunas parejas casi duplicadas; el resultado es aproximado a propósito.
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import hashlib
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from typing import Iterable, TypedDict
+
+import numpy as np
+
+SHINGLE_K = 3
+NUM_PERM = 128
+BANDS = 16                  # 16 bandas × 8 filas → umbral LSH ≈ 0.71
+JACCARD_THRESHOLD = 0.75
+MAX_BUCKET_CHECKS = 32      # comparaciones máximas por cubo (acota el peor caso; puede perder pares)
+_PRIME = np.uint64(4294967311)  # primo > 2**32
+_MAX_HASH = np.uint64(2**32 - 1)
+_SEED = 1
+
+_ROMAN = {"i": "1", "ii": "2", "iii": "3", "iv": "4", "v": "5",
+          "vi": "6", "vii": "7", "viii": "8", "ix": "9", "x": "10"}
+_ABBREV = {
+    "intro": "introduction", "adv": "advanced", "mgmt": "management",
+    "mgt": "management", "engr": "engineering",
+    "prog": "programming", "sys": "systems",
+    "ml": "machine learning", "ai": "artificial intelligence",
+    "nlp": "natural language processing", "db": "databases",
+}
+# palabras que no distinguen un curso de otro
+_STOP = {"to", "of", "the", "and", "in", "for", "a", "an", "on", "with",
+         "de", "del", "la", "el", "los", "las", "en", "y", "e", "para", "a"}
+# marcas de "primer curso de …": "ML 1" ≈ "Intro to ML" ≈ "ML"
+_INTRO = {"introduction", "introductory", "fundamentals", "basics", "1"}
+
+
+class Cluster(TypedDict):
+    id: str
+    canonical: str
+    size: int
+    names: list[str]
+
+
+def normalize_name(name: str) -> tuple[str, frozenset[str]]:
+    """
+    Clave normalizada de un nombre y el conjunto de números que contiene.
+    Si no queda nada ("Introduction", "Fundamentals") la clave es el nombre
+    en minúsculas, para que esos cursos no se fundan todos en uno.
+    """
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode()
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+    out: list[str] = []
+    for tok in text.split():
+        tok = _ROMAN.get(tok, tok)
+        tok = _ABBREV.get(tok, tok)
+        out.extend(w for w in tok.split() if w not in _STOP and w not in _INTRO)
+    if not out:
+        out = text.split()
+    numbers = frozenset(w for w in out if w.isdigit())
+    return " ".join(out), numbers
+
+
+def shingles(key: str, k: int = SHINGLE_K) -> set[int]:
+    """Shingles de caracteres como enteros de 32 bits (crc32: estables entre procesos)."""
+    padded = f" {key} "
+    if len(padded) <= k:
+        return {zlib.crc32(padded.encode())}
+    return {zlib.crc32(padded[i:i + k].encode()) for i in range(len(padded) - k + 1)}
+
+
+def jaccard(a: set[int], b: set[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _permutations(num_perm: int = NUM_PERM, seed: int = _SEED) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**31, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2**31, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+_A, _B = _permutations()
+
+
+def minhash(sh: set[int]) -> np.ndarray:
+    """Firma MinHash (NUM_PERM enteros) de un conjunto de shingles."""
+    h = np.fromiter(sh, dtype=np.uint64, count=len(sh))[:, None]
+    return (((h * _A) + _B) % _PRIME & _MAX_HASH).min(axis=0)
+
+
+class _UnionFind:
+    def __init__(self, n: int) -> None:
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def canonical_id(key: str) -> str:
+    return "c" + hashlib.blake2b(key.encode(), digest_size=5).hexdigest()
+
+
+def cluster_names(
+    names: Iterable[str],
+    *,
+    threshold: float = JACCARD_THRESHOLD,
+    bands: int = BANDS,
+) -> tuple[dict[str, str], list[Cluster]]:
+    """
+    Agrupa nombres casi duplicados.
+
+    Devuelve `(mapping, clusters)`: `mapping[nombre] → id canónico` para cada
+    nombre de entrada y la lista de clústeres, cuyo nombre canónico es la
+    variante más frecuente (a igualdad, la más corta).
+    """
+    counts = Counter(n for n in names if isinstance(n, str) and n.strip())
+
+    # 1. colapsar nombres idénticos tras normalizar
+    key_of: dict[str, str] = {}
+    numbers_of: dict[str, frozenset[str]] = {}
+    for name in counts:
+        key, nums = normalize_name(name)
+        key_of[name] = key
+        numbers_of.setdefault(key, nums)
+    keys = sorted(set(key_of.values()))
+    pos = {k: i for i, k in enumerate(keys)}
+    sh = [shingles(k) for k in keys]
+
+    # 2-3. MinHash + LSH por bandas, verificando cada candidato
+    uf = _UnionFind(len(keys))
+    rows = NUM_PERM // bands
+    buckets: dict[tuple[int, bytes], list[int]] = {}
+    for i, s in enumerate(sh):
+        sig = minhash(s)
+        for band in range(bands):
+            bucket = buckets.setdefault((band, sig[band * rows:(band + 1) * rows].tobytes()), [])
+            for j in bucket[:MAX_BUCKET_CHECKS]:
+                # se compara con el representante de cada clúster (no con
+                # cualquier miembro) para evitar cadenas A≈B≈C con A≉C
+                ri, rj = uf.find(i), uf.find(j)
+                if ri != rj \
+                        and numbers_of[keys[ri]] == numbers_of[keys[rj]] \
+                        and jaccard(sh[ri], sh[rj]) >= threshold:
+                    uf.union(ri, rj)
+            bucket.append(i)
+
+    # 4. clústeres y nombre canónico
+    members: dict[int, list[str]] = {}
+    for name in counts:
+        members.setdefault(uf.find(pos[key_of[name]]), []).append(name)
+    mapping: dict[str, str] = {}
+    clusters: list[Cluster] = []
+    for group in members.values():
+        group.sort(key=lambda n: (-counts[n], len(n), n))
+        # id a partir de la menor clave del clúster, no de la raíz del
+        # union-find (que depende del orden de las uniones)
+        cid = canonical_id(min(key_of[n] for n in group))
+        clusters.append(Cluster(id=cid, canonical=group[0],
+                                size=sum(counts[n] for n in group), names=group))
+        for n in group:
+            mapping[n] = cid
+    clusters.sort(key=lambda c: -c["size"])
+    return mapping, clusters
+
+
+def dedup_courses(courses: list[dict], *, threshold: float = JACCARD_THRESHOLD) -> list[dict]:
+    """Quita de una lista de cursos los casi duplicados (se queda el primero)."""
+    if len(courses) < 2:
+        return courses
+    mapping, _ = cluster_names((c.get("name", "") for c in courses), threshold=threshold)
+    seen: set[str] = set()
+    out = []
+    for c in courses:
+        cid = mapping.get(c.get("name", ""))
+        if cid is None or cid not in seen:
+            if cid is not None:
+                seen.add(cid)
+            out.append(c)
+    return out
@@ -1,20 +1,50 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import hashlib
+import os
 import pathlib
 import random
 import time
 import logging
-import mimetypes
 import tempfile
-from typing import TypedDict, Literal
+from typing import AsyncIterator, Iterable, TypedDict, Literal
+from urllib.parse import urlsplit
 
+import httpx
 import requests
+import urllib3
 from requests.adapters import HTTPAdapter, Retry
 
-from .utils import slugify
+from .utils import normalize_url, slugify
+from .hosts import HostState, classify, get_tracker, host_of
 from .cleaner import clean_html
+from . import metrics
 
 RAW_DIR = pathlib.Path("data/raw")
+# Tamaño máximo del cuerpo por tipo (bytes); las respuestas mayores se
+# abortan sin dejar nada en disco. Configurable por entorno o por llamada.
+MAX_BYTES = {
+    "html": int(float(os.getenv("DOWNLOAD_MAX_HTML_MB", "10")) * 2**20),
+    "pdf": int(float(os.getenv("DOWNLOAD_MAX_PDF_MB", "50")) * 2**20),
+}
+# Bloques de lectura: empiezan pequeños (para decidir pronto con el primer
+# bloque) y se duplican hasta CHUNK_MAX en descargas largas.
+CHUNK_MIN = 64 * 1024
+CHUNK_MAX = 1024 * 1024
+# Bytes que se acumulan antes de decidir el tipo: httpx puede entregar un
+# primer bloque de unos pocos bytes ("%P", un BOM, espacios…)
+SNIFF_BYTES = 1024
+
+# Firmas de formatos binarios que nunca contienen un plan de estudios legible
+_BINARY_MAGIC = (
+    b"PK\x03\x04",          # zip / docx / xlsx
+    b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"RIFF",
+    b"\x1f\x8b",            # gzip sin Content-Encoding
+    b"\xd0\xcf\x11\xe0",      # doc / xls antiguos
+    b"7z\xbc\xaf", b"Rar!", b"\x00\x00\x00",
+)
 RAW_DIR_HTML = RAW_DIR / "html"
 RAW_DIR_PDF = RAW_DIR / "pdf"
 for p in (RAW_DIR_HTML, RAW_DIR_PDF):
@@ -28,6 +58,31 @@ USER_AGENTS = [
 ]
 
 
+class Skip(Exception):
+    """Respuesta descartada a propósito (demasiado grande o binaria)."""
+
+    def __init__(self, reason: str, detail: str) -> None:
+        super().__init__(detail)
+        self.reason = reason
+
+
+def sniff(head: bytes, content_type: str = "") -> str:
+    """
+    "pdf" | "html" a partir de los primeros bytes (la firma manda sobre la
+    cabecera, que a menudo miente: PDFs servidos como octet-stream, etc.).
+    Lanza Skip si el contenido es binario.
+    """
+    body = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if body.startswith(b"%PDF"):
+        return "pdf"
+    if body.startswith(_BINARY_MAGIC) or b"\x00" in head[:1024]:
+        raise Skip("binary", f"contenido binario no soportado ({content_type or 'sin tipo'})")
+    if "pdf" in content_type.lower():
+        # cabecera PDF pero sin firma: suele ser una página de error HTML
+        return "html" if body[:1] == b"<" else "pdf"
+    return "html"
+
+
 class DownloadInfo(TypedDict, total=False):
     university: str
     program: str
@@ -37,10 +92,26 @@ class DownloadInfo(TypedDict, total=False):
     path: str
     kind: Literal["html", "pdf"] | str
     error: str
+    cached: bool
+    bytes: int
+    skipped: str
+    host: HostState
+
+
+RETRIES = 4
+
+
+class _FailFastRetry(Retry):
+    """Retry de urllib3 que no reintenta errores de DNS (no se arreglan solos)."""
 
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if error is not None and classify(error) == "dns":
+            raise urllib3.exceptions.MaxRetryError(_pool, url, error) from error
+        return super().increment(method, url, response, error, _pool, _stacktrace)
 
-def _build_session(retries: int = 4, backoff: float = 1.5) -> requests.Session:
-    retry = Retry(
+
+def _build_session(retries: int = RETRIES, backoff: float = 1.5) -> requests.Session:
+    retry = _FailFastRetry(
         total=retries,
         connect=retries,
         read=retries,
@@ -57,6 +128,134 @@ def _build_session(retries: int = 4, backoff: float = 1.5) -> requests.Session:
     return s
 
 
+# ─────────────────────────── Piezas comunes ──────────────────────────
+def _basename(university: str, program: str, url: str) -> str:
+    """
+    Nombre del fichero crudo: universidad, carrera y un hash corto de la URL
+    normalizada (una carrera con varias URLs guarda un fichero por URL).
+    """
+    digest = hashlib.blake2b(normalize_url(url).encode("utf-8"), digest_size=5).hexdigest()
+    return f"{slugify(university)}_{slugify(program)}_{digest}"
+
+
+def _cached(info: DownloadInfo, basename: str) -> bool:
+    """Rellena `info` y devuelve True si ya hay copia local no vacía."""
+    # solo se guardan .html y .pdf; la query ("?v=2") no cuenta
+    try:
+        is_pdf = pathlib.PurePosixPath(urlsplit(info["url"]).path).suffix.lower() == ".pdf"
+    except ValueError:               # URL inválida: no puede haber copia
+        return False
+    out_path = RAW_DIR_PDF / f"{basename}.pdf" if is_pdf else RAW_DIR_HTML / f"{basename}.html"
+    if not (out_path.exists() and out_path.stat().st_size > 0):
+        return False
+    metrics.inc("download_cache_hits_total")
+    info.update(
+        status=200,
+        elapsed=0.0,
+        path=str(out_path),
+        kind="pdf" if out_path.suffix == ".pdf" else "html",
+        cached=True,
+    )
+    return True
+
+
+class _BodyWriter:
+    """
+    Escritura en streaming de un cuerpo: los primeros SNIFF_BYTES (o el
+    cuerpo entero, si es más corto) deciden el tipo (`sniff`), se aplica el
+    límite de tamaño y todo va a un temporal que solo se renombra al nombre
+    final en `commit()`.
+    """
+
+    def __init__(self, basename: str, content_type: str, declared: int,
+                 max_bytes: int | None) -> None:
+        self.basename = basename
+        self.content_type = content_type
+        self.declared = declared
+        self.max_bytes = max_bytes
+        self.kind: str | None = None
+        self.size = 0
+        self._head = b""
+        self._fh = None
+        self._tmp: pathlib.Path | None = None
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        if self.kind is None:
+            self._head += data
+            if len(self._head) < SNIFF_BYTES:
+                return
+            data, self._head = self._head, b""
+            self._open(data)
+        self.size += len(data)
+        if self.size > self.limit:
+            raise Skip("too_large", f"demasiado grande: >{self.limit} bytes")
+        self._fh.write(data)
+
+    def _open(self, head: bytes) -> None:
+        self.kind = sniff(head, self.content_type)
+        self.limit = self.max_bytes or MAX_BYTES[self.kind]
+        if self.declared > self.limit:
+            raise Skip("too_large", f"demasiado grande: {self.declared} bytes (máx. {self.limit})")
+        self.path = (RAW_DIR_PDF if self.kind == "pdf" else RAW_DIR_HTML) / f"{self.basename}.{self.kind}"
+        fd, name = tempfile.mkstemp(prefix=f".{self.basename}.", suffix=".part", dir=self.path.parent)
+        self._tmp = pathlib.Path(name)
+        self._fh = os.fdopen(fd, "wb")
+
+    def commit(self, info: DownloadInfo) -> pathlib.Path:
+        if self.kind is None:            # cuerpo corto (o vacío: HTML vacío, como antes)
+            head, self._head = self._head, b""
+            self._open(head)
+            if head:
+                self.size = 0
+                self.write(head)
+        self._fh.close()
+        self._tmp.replace(self.path)
+        self._tmp = None
+        info.update(kind=self.kind, path=str(self.path), bytes=self.size)
+        metrics.observe("download_bytes", self.size, buckets=metrics.SIZE_BUCKETS, kind=self.kind)
+        return self.path
+
+    def abort(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+        if self._tmp is not None:
+            self._tmp.unlink(missing_ok=True)
+            self._tmp = None
+
+
+def _finish(info: DownloadInfo, t0: float) -> DownloadInfo:
+    if info.get("error") and "host" not in info:
+        # el estado del host viaja en el log para la siguiente ejecución
+        snap = get_tracker().snapshot(info["url"])
+        if snap["state"] != "closed":
+            info["host"] = snap
+    info["elapsed"] = time.perf_counter() - t0
+    metrics.record_stage("download", info["elapsed"])
+    if info.get("error"):
+        metrics.inc("stage_errors_total", stage="download")
+    logging.info(
+        "download %s | %.2fs | %s",
+        info["url"],
+        info.get("elapsed", 0.0),
+        info.get("status"),
+    )
+    return info
+
+
+def _host_down(info: DownloadInfo, why: str, t0: float) -> DownloadInfo:
+    info.update(error=why, skipped="host_down", host=get_tracker().snapshot(info["url"]))
+    return _finish(info, t0)
+
+
+def _skipped(info: DownloadInfo, exc: Skip) -> None:
+    info["error"] = str(exc)
+    info["skipped"] = exc.reason
+    metrics.inc("download_skipped_total", reason=exc.reason)
+
+
+# ─────────────────────────── Versión síncrona (requests) ─────────────
 def fetch_page(
     url: str,
     university: str,
@@ -64,14 +263,24 @@ def fetch_page(
     *,
     timeout: tuple[int, int] = (10, 20),
     force: bool = False,
+    clean: bool = True,
+    max_bytes: int | None = None,
 ) -> DownloadInfo:
     """
     Descarga un recurso remoto (HTML o PDF), lo guarda en disco y devuelve
     metadatos de la operación.
 
     - Utiliza caché si el fichero ya existe (salvo force=True).
-    - Los HTML se limpian automáticamente al terminar la descarga.
-    - El nombre del archivo es: <universidad>_<programa>.<ext>
+    - Los HTML se limpian automáticamente al terminar la descarga (salvo
+      clean=False: el pipeline lo hace en su pool de procesos).
+    - El nombre del archivo es: <universidad>_<programa>_<hash de la URL>.html|.pdf
+    - Se descarga en streaming a un temporal que se renombra al terminar:
+      nunca queda un fichero a medias con el nombre final.
+    - El tipo se decide con los primeros bytes (`%PDF`…); los binarios y
+      las respuestas mayores que `max_bytes` (por defecto MAX_BYTES[tipo])
+      se descartan con `error` y `skipped` = "binary" | "too_large".
+    - Los hosts con el circuito abierto (hosts.py) se saltan sin petición
+      (`skipped` = "host_down") y los reintentos salen del presupuesto del host.
     """
 
     info: DownloadInfo = {
@@ -80,63 +289,246 @@ def fetch_page(
         "url": url,
     }
     t0 = time.perf_counter()
-
-    # ──────────────── Construcción del nombre de salida ────────────────
-    slug_univ = slugify(university)
-    slug_prog = slugify(program)
-    basename = f"{slug_univ}_{slug_prog}"
-
-    guessed_ext = pathlib.Path(url).suffix.lower() or ".html"
-    out_path = (
-        (RAW_DIR_PDF if guessed_ext == ".pdf" else RAW_DIR_HTML)
-        / f"{basename}{guessed_ext}"
-    )
-    # ───────────────────────────── Caché ───────────────────────────────
-    if out_path.exists() and out_path.stat().st_size > 0 and not force:
-        info.update(
-            status=200,
-            elapsed=0.0,
-            path=str(out_path),
-            kind="pdf" if out_path.suffix == ".pdf" else "html",
-        )
+    basename = _basename(university, program, url)
+    if not force and _cached(info, basename):
         return info
-    # ────────────────────────────────────────────────────────────────────
+    tracker = get_tracker()
+    if (why := tracker.before(url)) is not None:
+        return _host_down(info, why, t0)
 
+    retries = tracker.retries(url, RETRIES)
+    writer: _BodyWriter | None = None
     try:
-        with _build_session().get(url, timeout=timeout, stream=True) as r:
+        with _build_session(retries).get(url, timeout=timeout, stream=True) as r:
             info["status"] = r.status_code
+            if r.raw.retries is not None and r.raw.retries.history:
+                tracker.spend(url, len(r.raw.retries.history))
+            if r.status_code >= 500:
+                tracker.failure(url, "5xx", f"HTTP {r.status_code}")
+            else:
+                tracker.success(url)
             r.raise_for_status()
-
-            # Detectar tipo real por cabecera
-            ctype = r.headers.get("Content-Type", "")
-            ext = mimetypes.guess_extension(ctype.partition(";")[0].strip()) or guessed_ext
-            kind = "pdf" if "pdf" in (ctype or "").lower() or ext == ".pdf" else "html"
-            info["kind"] = kind
-
-            # Ajustar ruta si la extensión cambió
-            if ext != out_path.suffix:
-                out_path = (
-                    RAW_DIR_PDF if kind == "pdf" else RAW_DIR_HTML
-                ) / f"{basename}{ext}"
-
-            # Descargar a disco
-            with open(out_path, "wb") as fh:
-                for chunk in r.iter_content(chunk_size=8192):
-                    fh.write(chunk)
-            info["path"] = str(out_path)
+            writer = _BodyWriter(basename, r.headers.get("Content-Type", ""),
+                                 int(r.headers.get("Content-Length") or 0), max_bytes)
+            # bloques crecientes: el primero (pequeño) basta para decidir el tipo
+            chunk = CHUNK_MIN
+            while data := r.raw.read(chunk, decode_content=True):
+                writer.write(data)
+                chunk = min(chunk * 2, CHUNK_MAX)
+            out_path = writer.commit(info)
 
             # Limpieza si es HTML
-            if kind == "html":
+            if info["kind"] == "html" and clean:
                 clean_html(out_path)
 
+    except Skip as exc:
+        _skipped(info, exc)
+    except (requests.ConnectionError, requests.Timeout, urllib3.exceptions.HTTPError) as exc:
+        info["error"] = str(exc)
+        tracker.spend(url, retries)
+        tracker.failure(url, classify(exc), str(exc))
     except requests.RequestException as exc:
         info["error"] = str(exc)
     finally:
-        info["elapsed"] = time.perf_counter() - t0
-        logging.info(
-            "download %s | %.2fs | %s",
-            url,
-            info.get("elapsed", 0.0),
-            info.get("status"),
+        if writer is not None:
+            writer.abort()
+        # sin success()/failure() (p. ej. TooManyRedirects) la prueba queda libre
+        tracker.release(url)
+    return _finish(info, t0)
+
+
+# ─────────────────────────── Versión asyncio (httpx) ─────────────────
+# Un AsyncClient compartido por bucle de eventos: pool de conexiones
+# keep-alive y, si está instalado `h2`, HTTP/2 (varias descargas al mismo
+# host multiplexadas en una conexión). Los reintentos esperan con
+# asyncio.sleep, así que miles de descargas en vuelo no ocupan hilos.
+#
+# Las peticiones esperan turno en semáforos propios (por host y global)
+# antes de entrar al pool: httpcore recorre todas las conexiones por cada
+# petición encolada en cada evento, y con miles en cola el coste es
+# cuadrático. Así en el pool nunca hay más peticiones que conexiones, y
+# de paso ningún servidor recibe más de PER_HOST descargas a la vez.
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+ASYNC_MAX_CONNECTIONS = int(os.getenv("DOWNLOAD_MAX_CONNECTIONS", "128"))
+ASYNC_PER_HOST = int(os.getenv("DOWNLOAD_PER_HOST", "8"))
+ASYNC_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "500"))
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class _AsyncState:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.client = httpx.AsyncClient(
+            http2=HTTP2,
+            follow_redirects=True,
+            timeout=httpx.Timeout(20.0, connect=10.0),
+            # tantas keep-alive como conexiones: si no, el pool cierra y
+            # reabre sockets sin parar con muchas descargas en vuelo
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS,
+                                max_keepalive_connections=ASYNC_MAX_CONNECTIONS),
+            headers={"User-Agent": random.choice(USER_AGENTS)},
         )
+        self.slots = asyncio.Semaphore(ASYNC_MAX_CONNECTIONS)
+        self.hosts: dict[str, asyncio.Semaphore] = {}
+
+    @contextlib.asynccontextmanager
+    async def gate(self, url: str):
+        host = host_of(url)
+        sem = self.hosts.get(host)
+        if sem is None:
+            sem = self.hosts[host] = asyncio.Semaphore(ASYNC_PER_HOST)
+        async with sem, self.slots:
+            yield
+
+
+_async_state: _AsyncState | None = None
+
+
+def _state() -> _AsyncState:
+    global _async_state
+    loop = asyncio.get_running_loop()
+    if _async_state is None or _async_state.loop is not loop or _async_state.client.is_closed:
+        _async_state = _AsyncState(loop)
+    return _async_state
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Cliente compartido del bucle actual (se crea en el primer uso)."""
+    return _state().client
+
+
+async def aclose_async_client() -> None:
+    global _async_state
+    if _async_state is not None:
+        st, _async_state = _async_state, None
+        if st.loop is asyncio.get_running_loop():
+            await st.client.aclose()
+
+
+def _retry_after(resp: httpx.Response, attempt: int, backoff: float) -> float:
+    try:
+        return min(float(resp.headers["Retry-After"]), 120.0)
+    except (KeyError, ValueError):
+        return backoff * 2 ** attempt
+
+
+async def fetch_page_async(
+    url: str,
+    university: str,
+    program: str,
+    *,
+    force: bool = False,
+    clean: bool = True,
+    max_bytes: int | None = None,
+    retries: int = 4,
+    backoff: float = 1.5,
+    client: httpx.AsyncClient | None = None,
+) -> DownloadInfo:
+    """
+    Equivalente asíncrono de `fetch_page`: mismo DownloadInfo, misma caché
+    y mismos límites. La limpieza del HTML (CPU) se hace en un hilo para
+    no bloquear el bucle.
+    """
+    info: DownloadInfo = {
+        "university": university,
+        "program": program,
+        "url": url,
+    }
+    t0 = time.perf_counter()
+    basename = _basename(university, program, url)
+    if not force and _cached(info, basename):
         return info
+    tracker = get_tracker()
+    if (why := tracker.before(url)) is not None:
+        return _host_down(info, why, t0)
+
+    retries = tracker.retries(url, retries)
+    state = _state()
+    client = client or state.client
+    writer: _BodyWriter | None = None
+    try:
+        for attempt in range(retries + 1):
+            try:
+                async with state.gate(url), client.stream("GET", url) as r:
+                    info["status"] = r.status_code
+                    if r.status_code in RETRY_STATUS and attempt < retries and tracker.spend(url):
+                        delay = _retry_after(r, attempt, backoff)
+                    else:
+                        if r.status_code >= 500:
+                            tracker.failure(url, "5xx", f"HTTP {r.status_code}")
+                        else:
+                            tracker.success(url)
+                        r.raise_for_status()
+                        writer = _BodyWriter(basename, r.headers.get("Content-Type", ""),
+                                             int(r.headers.get("Content-Length") or 0), max_bytes)
+                        async for data in r.aiter_bytes():
+                            writer.write(data)
+                        out_path = writer.commit(info)
+                        break
+            except (httpx.TransportError, httpx.DecodingError) as exc:
+                kind = classify(exc)
+                if attempt >= retries or kind == "dns" or not tracker.spend(url):
+                    tracker.failure(url, kind, str(exc) or type(exc).__name__)
+                    raise
+                if writer is not None:
+                    writer.abort()
+                    writer = None
+                delay = backoff * 2 ** attempt
+            metrics.inc("download_retries_total")
+            await asyncio.sleep(delay)
+
+        if info["kind"] == "html" and clean:
+            await asyncio.to_thread(clean_html, out_path)
+
+    except Skip as exc:
+        _skipped(info, exc)
+    except (httpx.HTTPError, httpx.InvalidURL) as exc:
+        info["error"] = str(exc)
+    finally:
+        if writer is not None:
+            writer.abort()
+        # cancelada (cliente desconectado) o sin veredicto: libera la prueba
+        tracker.release(url)
+    return _finish(info, t0)
+
+
+async def _fetch_record(university: str, program: str, urls: list[str], **kwargs) -> list[DownloadInfo]:
+    # cada URL tiene su propio fichero (_basename): todas a la vez
+    return list(await asyncio.gather(
+        *(fetch_page_async(url, university, program, **kwargs) for url in urls)
+    ))
+
+
+async def fetch_many_async(
+    records: Iterable[tuple[str, str, list[str]]],
+    *,
+    concurrency: int = ASYNC_CONCURRENCY,
+    **kwargs,
+) -> AsyncIterator[list[DownloadInfo]]:
+    """
+    Descarga registros (universidad, carrera, [urls]) con hasta
+    `concurrency` registros en vuelo y va devolviendo los DownloadInfo de
+    cada uno según termina. Consume `records` de forma perezosa: nunca hay
+    más de `concurrency` tareas vivas.
+    """
+    it = iter(records)
+    pending: set[asyncio.Task] = set()
+    try:
+        while True:
+            for univ, prog, urls in it:
+                pending.add(asyncio.create_task(_fetch_record(univ, prog, urls, **kwargs)))
+                if len(pending) >= concurrency:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
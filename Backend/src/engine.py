@@ -0,0 +1,196 @@
+# engine.py
+# ──────────────────────────────────────────────────────────────
+# Motor de extracción híbrido por niveles (“tiers”):
+#
+#   1. extractor  → `extract_courses` determinista (tablas, listas, PDF)
+#   2. llm        → `_fallback_gpt` solo si la confianza del nivel 1
+#                   no llega a CONFIDENCE_THRESHOLD; el texto se pasa
+#                   antes por el filtro de relevancia.
+#
+# Las páginas de catálogo bien estructuradas terminan en el nivel 1
+# (milisegundos, sin coste de API).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import logging
+import pathlib
+import time
+from typing import Literal, TypedDict
+
+from .dedup import dedup_courses
+from .extractor import (
+    CONFIDENCE_THRESHOLD,
+    Course,
+    _fallback_gpt,
+    extract_courses,
+    score_confidence,
+)
+from .metrics import inc, timed
+from .relevance import RelevanceReport, select_windows
+
+LOG = logging.getLogger("engine")
+
+Tier = Literal["extractor", "llm", "none"]
+
+
+class EngineResult(TypedDict):
+    courses: list[Course]
+    tier: Tier
+    confidence: float
+    timings: dict[str, float]
+    relevance: RelevanceReport | None
+
+
+class Prepared(TypedDict):
+    """Parte de CPU de un documento (nivel 1 + filtro de relevancia)."""
+    courses: list[Course]
+    confidence: float
+    timings: dict[str, float]
+    text: str | None              # None → el nivel 1 basta, no hace falta GPT
+    report: RelevanceReport | None
+
+
+def load_text(path: pathlib.Path, kind: str = "html") -> str:
+    """Texto plano del documento descargado (pdfminer o BeautifulSoup)."""
+    from .analyzer import _html_to_text, _pdf_to_text
+
+    with timed("text_extraction", kind=kind):
+        return _pdf_to_text(path) if kind == "pdf" else _html_to_text(path)
+
+
+def extractor_tier(path: pathlib.Path, url: str) -> tuple[list[Course], float, float]:
+    """Nivel 1: (cursos, confianza, segundos). Nunca lanza excepción."""
+    t0 = time.perf_counter()
+    try:
+        courses = extract_courses(str(path), url)
+    except Exception as exc:
+        LOG.warning("Extractor falló para %s: %s", path, exc)
+        courses = []
+    confidence = score_confidence(courses)
+    return courses, confidence, time.perf_counter() - t0
+
+
+def relevant_text(path: pathlib.Path, kind: str = "html") -> tuple[str, RelevanceReport, float]:
+    """Texto que iría al LLM tras el filtro de relevancia, con su informe."""
+    t0 = time.perf_counter()
+    report = select_windows(load_text(path, kind))
+    return "\n".join(report["windows"]), report, time.perf_counter() - t0
+
+
+def merge_tiers(
+    courses: list[Course],
+    llm_courses: list[Course],
+    confidence: float,
+    timings: dict[str, float],
+    report: RelevanceReport | None,
+) -> EngineResult:
+    """
+    Si GPT no devuelve nada, mejor lo poco que encontró el extractor. Las
+    filas de GPT (varios chunks) se deduplican por nombre casi idéntico.
+    """
+    llm_courses = dedup_courses(llm_courses)
+    if not llm_courses and courses:
+        return EngineResult(
+            courses=courses, tier="extractor", confidence=confidence,
+            timings=timings, relevance=report,
+        )
+    return EngineResult(
+        courses=llm_courses,
+        tier="llm" if llm_courses else "none",
+        confidence=confidence,
+        timings=timings,
+        relevance=report,
+    )
+
+
+def prepare_document(
+    path: pathlib.Path,
+    url: str,
+    *,
+    kind: str = "html",
+    threshold: float = CONFIDENCE_THRESHOLD,
+) -> Prepared:
+    """Nivel 1 y, si no basta, el texto relevante para GPT. Solo CPU."""
+    courses, confidence, secs = extractor_tier(path, url)
+    timings: dict[str, float] = {"extractor": secs}
+    if confidence >= threshold:
+        return Prepared(courses=courses, confidence=confidence, timings=timings,
+                        text=None, report=None)
+    text, report, timings["relevance"] = relevant_text(path, kind)
+    return Prepared(courses=courses, confidence=confidence, timings=timings,
+                    text=text, report=report)
+
+
+def complete_document(
+    prep: Prepared,
+    url: str,
+    university: str = "N/A",
+    program: str = "N/A",
+    *,
+    pause: float = 0.0,
+) -> EngineResult:
+    """Nivel 2 (GPT) sobre un documento preparado, si hace falta."""
+    timings = dict(prep["timings"])
+    if prep["text"] is None:
+        return EngineResult(
+            courses=prep["courses"], tier="extractor", confidence=prep["confidence"],
+            timings=timings, relevance=None,
+        )
+
+    t0 = time.perf_counter()
+    llm_courses = (
+        _fallback_gpt(prep["text"], url, university, program, pause=pause)
+        if prep["text"] else []
+    )
+    timings["llm"] = time.perf_counter() - t0
+
+    return merge_tiers(prep["courses"], llm_courses, prep["confidence"], timings, prep["report"])
+
+
+def run_document(
+    path: pathlib.Path,
+    url: str,
+    university: str = "N/A",
+    program: str = "N/A",
+    *,
+    kind: str = "html",
+    threshold: float = CONFIDENCE_THRESHOLD,
+    pause: float = 0.0,
+) -> EngineResult:
+    """
+    Procesa un documento ya descargado y devuelve sus cursos junto con el
+    nivel que los produjo, la confianza del extractor y los tiempos.
+    """
+    prep = prepare_document(path, url, kind=kind, threshold=threshold)
+    return complete_document(prep, url, university, program, pause=pause)
+
+
+class EngineStats:
+    """Acumula conteos y tiempos por nivel a lo largo de una ejecución."""
+
+    def __init__(self) -> None:
+        self.counts: dict[str, int] = {"extractor": 0, "llm": 0, "none": 0}
+        self.seconds: dict[str, float] = {}
+        self.tokens_in = 0
+        self.tokens_saved = 0
+
+    def record(self, result: EngineResult) -> None:
+        inc("engine_documents_total", tier=result["tier"])
+        self.counts[result["tier"]] = self.counts.get(result["tier"], 0) + 1
+        for stage, secs in result["timings"].items():
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + secs
+        if result["relevance"]:
+            self.tokens_in += result["relevance"]["tokens_in"]
+            self.tokens_saved += result["relevance"]["tokens_saved"]
+
+    def log_summary(self, logger: logging.Logger = LOG) -> None:
+        total = sum(self.counts.values())
+        logger.info("Resumen por nivel (%d documentos):", total)
+        for tier, n in self.counts.items():
+            logger.info("   %-9s %5d documentos", tier, n)
+        for stage, secs in self.seconds.items():
+            logger.info("   t_%-7s %8.2fs", stage, secs)
+        logger.info(
+            "   tokens   %d estimados, %d ahorrados por relevancia",
+            self.tokens_in, self.tokens_saved,
+        )
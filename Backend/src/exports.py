@@ -0,0 +1,188 @@
+# exports.py
+# ──────────────────────────────────────────────────────────────
+# Genera los JSON que consume el Frontend (Frontend/src/api/) a partir
+# del corpus indexado (course_index.py), en lugar del notebook:
+#
+#   wordcloud_<region>.json         [{"text", "value"}]
+#   wordcloud_<region>.<fmt>        imagen de la nube (opcional, --clouds)
+#   credits_by_region.json          [{"region", "credits": [...]}]
+#   boxplot_stats_by_region.json    [{"region", "min", "q1", "median", …}]
+#   lda_topics_keywords.json        [{"topic", "keywords": [...]}]
+#   topic_distribution_by_region.json [{"region", "0": n, "1": n, …}]
+#
+# Los temas salen del modelo incremental de topics.py: cada exportación
+# solo entrena con los cursos que el modelo aún no había visto.
+#
+# Antes de agregar, cada nombre recibe el id canónico de su clúster de
+# casi duplicados (dedup.py) y cada curso cuenta una sola vez por
+# universidad: "Machine Learning I" y "Intro. to Machine Learning" en dos
+# programas de la misma universidad ya no suman dos veces.
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import json
+import logging
+import pathlib
+from collections import Counter
+from typing import TypedDict
+
+import numpy as np
+
+from . import topics
+from .course_index import CourseIndex
+from .dedup import cluster_names
+from .topics import TopicDoc
+
+LOG = logging.getLogger("exports")
+
+FRONTEND_API = pathlib.Path("../Frontend/src/api")
+CLUSTERS_JSON = pathlib.Path("data/output/course_clusters.json")
+
+
+class CourseRow(TypedDict):
+    region: str
+    university: str
+    program: str
+    name: str
+    credits: float | None
+    canonical_id: str
+    canonical: str
+
+
+def _credits(value: str) -> float | None:
+    try:
+        c = float(value)
+    except (TypeError, ValueError):
+        return None
+    return c if np.isfinite(c) else None
+
+
+def _num(x: float) -> int | float:
+    return int(x) if float(x).is_integer() else round(float(x), 2)
+
+
+def _write_json(path: pathlib.Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+# ─────────────────────────── Corpus ──────────────────────────────────
+def canonical_rows(index: CourseIndex | None = None, *, dedup: bool = True) -> list[CourseRow]:
+    """
+    Filas del corpus con su id canónico. Con `dedup` se queda una fila por
+    (región, universidad, id canónico).
+    """
+    if index is None:
+        index = CourseIndex.load()
+        index.sync()
+    docs = [d for d in index.docs if d[4].strip()]
+    mapping, clusters = cluster_names(d[4] for d in docs)
+    canonical = {c["id"]: c["canonical"] for c in clusters}
+    _write_json(CLUSTERS_JSON, [c for c in clusters if len(c["names"]) > 1])
+
+    rows: list[CourseRow] = []
+    seen: set[tuple[str, str, str]] = set()
+    for _src, region, univ, prog, name, credits, _mode in docs:
+        cid = mapping[name]
+        if dedup:
+            key = (region, univ.casefold(), cid)
+            if key in seen:
+                continue
+            seen.add(key)
+        rows.append(CourseRow(region=region, university=univ, program=prog, name=name,
+                              credits=_credits(credits), canonical_id=cid,
+                              canonical=canonical[cid]))
+    LOG.info("Corpus: %d filas → %d cursos (%d clústeres con variantes)",
+             len(docs), len(rows), sum(len(c["names"]) > 1 for c in clusters))
+    return rows
+
+
+def _regions(rows: list[CourseRow]) -> list[str]:
+    return list(dict.fromkeys(r["region"] for r in rows))
+
+
+# ─────────────────────────── Agregaciones ────────────────────────────
+def word_frequencies(rows: list[CourseRow]) -> list[dict]:
+    """Frecuencia de términos (preprocess) sobre el nombre canónico de cada curso."""
+    from src.graph.analyze_text_data_return_files import preprocess
+
+    freq: Counter[str] = Counter()
+    for r in rows:
+        freq.update(preprocess(r["canonical"]).split())
+    return [{"text": t, "value": v} for t, v in freq.most_common()]
+
+
+def credits_by_region(rows: list[CourseRow]) -> list[dict]:
+    return [
+        {"region": reg, "credits": sorted(
+            _num(r["credits"]) for r in rows if r["region"] == reg and r["credits"] is not None
+        )}
+        for reg in _regions(rows)
+    ]
+
+
+def boxplot_stats(values: list[float]) -> dict:
+    """Resumen de Tukey (bigotes a 1.5·IQR) como en el boxplot del notebook."""
+    if not values:
+        return {"min": 0, "q1": 0, "median": 0, "q3": 0, "max": 0, "outliers": []}
+    arr = np.asarray(values, dtype=float)
+    q1, med, q3 = np.percentile(arr, [25, 50, 75])
+    lo, hi = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    inside = arr[(arr >= lo) & (arr <= hi)]
+    return {
+        "min": _num(inside.min()), "q1": _num(q1), "median": _num(med),
+        "q3": _num(q3), "max": _num(inside.max()),
+        "outliers": sorted({_num(v) for v in arr[(arr < lo) | (arr > hi)]}),
+    }
+
+
+def boxplot_by_region(rows: list[CourseRow]) -> list[dict]:
+    return [
+        {"region": reg, **boxplot_stats(
+            [r["credits"] for r in rows if r["region"] == reg and r["credits"] is not None]
+        )}
+        for reg in _regions(rows)
+    ]
+
+
+# ─────────────────────────── Exportación ─────────────────────────────
+def export_frontend(
+    out_dir: pathlib.Path = FRONTEND_API,
+    *,
+    dedup: bool = True,
+    clouds: str | None = None,
+    rebuild_topics: bool = False,
+) -> list[pathlib.Path]:
+    """
+    Escribe los JSON del Frontend y devuelve las rutas generadas. Con
+    `clouds` ("png", "svg" o "webp") se renderiza además la nube de cada
+    región desde sus frecuencias (layout cacheado, ver graph/wordclouds.py).
+    `rebuild_topics` descarta el modelo de temas y congela un vocabulario nuevo.
+    """
+    out_dir = pathlib.Path(out_dir)
+    rows = canonical_rows(dedup=dedup)
+    written: list[pathlib.Path] = []
+    for reg in _regions(rows):
+        path = out_dir / f"wordcloud_{reg.lower()}.json"
+        freqs = word_frequencies([r for r in rows if r["region"] == reg])
+        _write_json(path, freqs)
+        written.append(path)
+        if clouds and freqs:
+            from src.graph import wordclouds
+
+            img = out_dir / f"wordcloud_{reg.lower()}.{clouds}"
+            img.write_bytes(wordclouds.render({f["text"]: f["value"] for f in freqs}, clouds))
+            written.append(img)
+    tm = topics.update([TopicDoc(region=r["region"], university=r["university"],
+                                 program=r["program"], name=r["name"]) for r in rows],
+                       rebuild=rebuild_topics)
+    for name, data in (("credits_by_region.json", credits_by_region(rows)),
+                       ("boxplot_stats_by_region.json", boxplot_by_region(rows)),
+                       ("lda_topics_keywords.json", tm.keywords()),
+                       ("topic_distribution_by_region.json", tm.distribution())):
+        _write_json(out_dir / name, data)
+        written.append(out_dir / name)
+    LOG.info("Exportados %d ficheros en %s", len(written), out_dir)
+    return written
@@ -21,12 +21,16 @@ from typing import Iterable, TypedDict
 
 import pdfplumber
 import pytesseract
-import tabula
 from bs4 import BeautifulSoup, Tag
 
 
+from src.course_batch import CourseBatch
+from src.metrics import timed
+from src import tabula_pool
+
 try:
     from src.ml_filter import predict as ml_predict
+    ml_predict = timed("ml_filter")(ml_predict)
     _ML_READY = True
     logger.info("🧠 ML filter loaded (predict)")
 except Exception as e:
@@ -39,6 +43,7 @@ class Course(TypedDict, total=False):
     code: str
     credits: str
     semester: str
+    mode: str
     source_url: str
 
 
@@ -83,6 +88,10 @@ BAD_PAT = re.compile(
     re.I,
 )
 
+# confianza mínima para dar por buena la salida determinista
+CONFIDENT_MIN_ROWS = 8
+CONFIDENCE_THRESHOLD = 0.6
+
 # ──────────────────────────────────────────────────────────────
 # helpers
 def normalize_line(text: str) -> str:
@@ -127,6 +136,22 @@ def _col_index(header_row: Iterable[str], aliases: set[str]) -> int | None:
     return None
 
 
+def score_confidence(courses: list[Course]) -> float:
+    """
+    Confianza [0, 1] en la salida determinista:
+      · nº de filas (satura en CONFIDENT_MIN_ROWS)
+      · proporción de filas con código o créditos
+    El filtro ML no cuenta: `_extract_from_html` ya descarta las filas que
+    rechaza, así que su acuerdo con la salida sería siempre 1.
+    """
+    if not courses:
+        return 0.0
+    n = len(courses)
+    rows = min(n / CONFIDENT_MIN_ROWS, 1.0)
+    structured = sum(bool(c.get("code") or c.get("credits")) for c in courses) / n
+    return round(rows * structured, 4)
+
+
 # ──────────────────────────────────────────────────────────────
 def extract_courses(file_path: str, url: str) -> list[Course]:
     """
@@ -141,6 +166,7 @@ def extract_courses(file_path: str, url: str) -> list[Course]:
 
 
 # ───────────────────────── HTML ───────────────────────────────
+@timed("extract", tier="html")
 def _extract_from_html(html: str, url: str) -> list[Course]:
     soup = BeautifulSoup(html, "lxml")
     candidates: list[list[Course]] = []
@@ -174,24 +200,18 @@ def _extract_from_html(html: str, url: str) -> list[Course]:
                     candidates.append(blk)
 
     if not candidates:
-        return _fallback_gpt(html, url)
-
-    # 3) unión + deduplicado
-    merged: list[Course] = []
-    seen = set()
-    for blk in candidates:
-        for c in blk:
-            key = (c["name"].lower(), c.get("code") or c["name"][:15])
-            if key not in seen and len(c["name"]) >= 4:
-                seen.add(key)
-                merged.append(c)
-    if _ML_READY and merged:
-        print("Si esta funcionando el ML")
-        keep_mask = ml_predict([c["name"] for c in merged]) == 1
-        merged = [c for c, keep in zip(merged, keep_mask) if keep]
-        
+        # sin bloques curriculares: el motor híbrido decide si usar GPT
+        logging.info("no curricular blocks in %s", url)
+        return []
+
+    # 3) unión + deduplicado en columnas (hash de nombre/código, ver course_batch.py)
+    merged = CourseBatch.concat([CourseBatch.from_courses(blk) for blk in candidates])
+    merged = merged.dedup(min_name=4)
+    if _ML_READY and len(merged):
+        merged = merged.filter(ml_predict(list(merged.name)) == 1)
+
     logging.info("merged=%d  (_ML_READY=%s)", len(merged), _ML_READY)
-    return merged
+    return merged.to_courses()
 
 
 def _parse_block(tag: Tag, url: str) -> list[Course]:
@@ -302,9 +322,10 @@ def _parse_course_line(text: str, url: str) -> Course:
 def _extract_from_pdf(path: str, url: str) -> list[Course]:
     out: list[Course] = []
 
-    # 1) Tabula — intenta capturar tablas bien formadas
+    # 1) Tabula — intenta capturar tablas bien formadas (JVM persistente, ver tabula_pool)
     try:
-        dfs = tabula.read_pdf(path, pages="all", multiple_tables=True, lattice=True)
+        with timed("extract", tier="tabula"):
+            dfs = tabula_pool.read_pdf(path, pages="all", multiple_tables=True, lattice=True)
         for df in dfs:
             for _, row in df.iterrows():
                 joined = normalize_line(" ".join(str(c) for c in row.tolist()))
@@ -317,7 +338,7 @@ def _extract_from_pdf(path: str, url: str) -> list[Course]:
 
     # 2) pdfplumber — text layer
     try:
-        with pdfplumber.open(path) as pdf:
+        with timed("extract", tier="pdfplumber"), pdfplumber.open(path) as pdf:
             for page in pdf.pages:
                 for line in page.extract_text().splitlines():
                     line = normalize_line(line)
@@ -330,7 +351,7 @@ def _extract_from_pdf(path: str, url: str) -> list[Course]:
 
     # 3) OCR fallback (pytesseract)
     try:
-        with pdfplumber.open(path) as pdf:
+        with timed("extract", tier="ocr"), pdfplumber.open(path) as pdf:
             for page in pdf.pages:
                 img = page.to_image(resolution=200).original
                 text = pytesseract.image_to_string(img)
@@ -345,10 +366,51 @@ def _extract_from_pdf(path: str, url: str) -> list[Course]:
 
 
 # ───────────────────────── GPT fallback (rare) ────────────────
-def _fallback_gpt(html: str, url: str) -> list[Course]:
+def _fallback_gpt(
+    text: str,
+    url: str,
+    university: str = "N/A",
+    program: str = "N/A",
+    *,
+    pause: float = 0.0,
+) -> list[Course]:
     """
-    Placeholder por si se decide usar GPT-API como último recurso.
-    Hoy devuelve [], pero queda el hook para logging/telemetría.
+    Último recurso: trocea `text` (idealmente ya filtrado por relevancia),
+    lo envía a GPT y convierte el CSV devuelto en `Course`.
+    Un chunk fallido se registra y se salta; no aborta el documento.
     """
+    import time
+
+    from .analyzer import (
+        split_text_into_chunks, _build_prompt, _call_gpt,
+        _strip_fences, _csv_rows, _save_raw_gpt,
+    )
+
     logging.info("GPT fallback for %s", url)
-    return []
+    out: list[Course] = []
+    chunks = split_text_into_chunks(text, max_chars=10_000)
+    for idx, chunk in enumerate(chunks):
+        logger.info(" → Enviando chunk %d/%d (caracteres=%d)", idx + 1, len(chunks), len(chunk))
+        prompt = _build_prompt(university, program, chunk)
+        try:
+            rsp = _call_gpt(prompt)
+        except Exception as exc:
+            logger.error("GPT falló para %s | %s (chunk %d): %s", university, program, idx + 1, exc)
+            continue
+        _save_raw_gpt(university, program, idx + 1, prompt[1]["content"], rsp)
+
+        rows = _csv_rows(_strip_fences(rsp))
+        if not rows:
+            logger.warning("GPT devolvió 0 filas. Primeros 200 chars del chunk ↓\n%s", chunk[:200])
+        for r in rows:
+            out.append(
+                Course(
+                    name=r.get("name", ""),
+                    credits=r.get("credits", ""),
+                    mode=r.get("mode", ""),
+                    source_url=url,
+                )
+            )
+        if pause:
+            time.sleep(pause)
+    return out
@@ -1,49 +1,91 @@
+from __future__ import annotations
+
 from io import BytesIO
+from typing import TypedDict
 
-def analyze_df_return_files(df, text_column: str = 'name'):
-    import re, nltk, numpy as np, pandas as pd
-    from nltk.corpus import stopwords
+from src.metrics import timed
+
+_NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'stopwords': 'corpora/stopwords',
+}
+
+def _ensure_nltk():
+    """Descarga los recursos de NLTK solo si faltan (no en cada petición)."""
+    import nltk
+    for pkg, path in _NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            nltk.download(pkg, quiet=True)
+
+_EXTRA_STOPWORDS = {'en', 'le', 'cs'}
+_stopwords: set[str] | None = None
+
+def preprocess(t):
+    """
+    Normaliza un nombre de curso: minúsculas, solo letras (con tildes),
+    tokenizado NLTK y sin stopwords. Lo comparten las gráficas y el
+    índice de búsqueda (course_index.py).
+    """
+    global _stopwords
+    import re
     from nltk.tokenize import word_tokenize
-    from wordcloud import WordCloud
-    from sklearn.feature_extraction.text import CountVectorizer
-    from sklearn.decomposition import LatentDirichletAllocation
-    import matplotlib.pyplot as plt
 
-    nltk.download('punkt', quiet=True, force=True)
-    nltk.download('punkt_tab',  quiet=True, force=True)
-    nltk.download('stopwords', quiet=True, force=True)
+    if not isinstance(t, str): return ''
+    if _stopwords is None:
+        from nltk.corpus import stopwords
+        _ensure_nltk()
+        _stopwords = set(stopwords.words('english')) | _EXTRA_STOPWORDS
+    t = re.sub(r'[^a-záéíóúñü\s]', '', t.lower())
+    return ' '.join(w for w in word_tokenize(t) if w not in _stopwords)
+
+class Charts(TypedDict):
+    terms: list[dict]              # [{text, value}] como WordEntry en TopWordsBarChart.tsx
+    format: str                    # png | svg | webp
+    bar: bytes | None
+    cloud: bytes | None
+
+
+def top_terms(df, text_column: str = 'name', n: int = 20) -> list[dict]:
+    """Los `n` términos más frecuentes, sin dibujar nada (el Frontend pinta)."""
+    return analyze_df(df, text_column, n=n, render=False)['terms']
 
-    def preprocess(t):
-        if not isinstance(t, str): return ''
-        t = re.sub(r'[^a-záéíóúñü\s]', '', t.lower())
-        toks = word_tokenize(t)
-        sw   = set(stopwords.words('english')) | {'en', 'le', 'cs'}
-        return ' '.join(w for w in toks if w not in sw)
+
+def analyze_df_return_files(df, text_column: str = 'name'):
+    charts = analyze_df(df, text_column)
+    return BytesIO(charts['bar']), BytesIO(charts['cloud'])
+
+
+@timed("plot")
+def analyze_df(df, text_column: str = 'name', *, n: int = 20, render: bool = True,
+               fmt: str = 'png', dpi: int = 100) -> Charts:
+    """
+    Frecuencias de los términos y, con `render`, las gráficas (barras y
+    nube) en `fmt`. El dibujo va al pool de render (render.py), sin pyplot.
+    """
+    import numpy as np, pandas as pd
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    _ensure_nltk()
 
     df['processed_text'] = df[text_column].fillna('').apply(preprocess)
 
     vect = CountVectorizer(max_features=1000)
     X    = vect.fit_transform(df['processed_text'])
 
-    LDA = LatentDirichletAllocation(n_components=5, random_state=0).fit(X)
-
-    feats, freqs = zip(*sorted(
+    counts = sorted(
         zip(vect.get_feature_names_out(), np.array(X.sum(0)).ravel()),
         key=lambda x: x[1], reverse=True
-    )[:20])
-
-    # Bar chart
-    fig1, ax1 = plt.subplots(figsize=(10, 5))
-    ax1.bar(feats, freqs)
-    ax1.set_title("Top 20 palabras")
-    ax1.set_xticklabels(feats, rotation=45, ha='right')
-    buf1 = BytesIO(); fig1.savefig(buf1, format='png'); buf1.seek(0); plt.close(fig1)
-
-    # Word cloud
-    wc = WordCloud(width=800, height=400, background_color='white')\
-            .generate(' '.join(df['processed_text']))
-    fig2, ax2 = plt.subplots(figsize=(10, 5))
-    ax2.imshow(wc, interpolation='bilinear'); ax2.axis('off')
-    buf2 = BytesIO(); fig2.savefig(buf2, format='png'); buf2.seek(0); plt.close(fig2)
-
-    return buf1, buf2
+    )
+    terms = [{'text': str(t), 'value': int(f)} for t, f in counts[:n]]
+    if not render:
+        return Charts(terms=terms, format=fmt, bar=None, cloud=None)
+
+    from src.graph.render import render_charts
+
+    # la nube sale de las mismas frecuencias (sin volver a tokenizar el texto)
+    freqs = {str(t): int(f) for t, f in counts}
+    bar, cloud = render_charts(terms, freqs, fmt, dpi)
+    return Charts(terms=terms, format=fmt, bar=bar, cloud=cloud)
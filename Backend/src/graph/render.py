@@ -0,0 +1,150 @@
+# render.py
+# ──────────────────────────────────────────────────────────────
+# Renderizado de las gráficas de /analyze_url sin pyplot.
+#
+# pyplot guarda estado global (figura "actual", gestor de figuras):
+# dos hilos del threadpool de FastAPI dibujando a la vez pueden
+# mezclar figuras, y el GIL los serializa de todos modos. Aquí cada
+# gráfica es una `Figure` con su propio lienzo Agg, y el dibujo se
+# hace en un pool pequeño de procesos (RENDER_WORKERS) que cargan
+# matplotlib, las fuentes y wordcloud una sola vez al arrancar.
+#
+#   analyze_df ──(términos, frecuencias)──► RenderPool ──► bytes png/svg/webp
+#
+# Formatos: png (por defecto), svg (vectorial, la nube va como SVG de
+# wordcloud) y webp (más ligero); `dpi` permite abaratar el raster.
+# La nube sale de las frecuencias con layouts cacheados (wordclouds.py).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Literal
+
+from src.graph import wordclouds
+from src.metrics import timed
+
+LOG = logging.getLogger("render")
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))     # 0: dibuja en el hilo que llama
+DEFAULT_DPI = 100
+MIN_DPI, MAX_DPI = 30, 300
+FIGSIZE = (10, 5)
+
+Format = Literal["png", "svg", "webp"]
+FORMATS: tuple[str, ...] = ("png", "svg", "webp")
+
+
+# ─────────────────────────── Dibujo (en el worker) ───────────────────
+def _figure(figsize=FIGSIZE):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _save(fig, fmt: str, dpi: int) -> bytes:
+    buf = BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi)
+    return buf.getvalue()
+
+
+def render_bar(terms: list[dict], fmt: Format = "png", dpi: int = DEFAULT_DPI) -> bytes:
+    """Barras de los términos más frecuentes ([{text, value}])."""
+    fig = _figure()
+    ax = fig.add_subplot()
+    feats = [t["text"] for t in terms]
+    ax.bar(range(len(feats)), [t["value"] for t in terms])
+    ax.set_title(f"Top {len(feats)} palabras")
+    ax.set_xticks(range(len(feats)), labels=feats, rotation=45, ha="right")
+    return _save(fig, fmt, dpi)
+
+
+def render_cloud(freqs: dict[str, float], fmt: Format = "png", dpi: int = DEFAULT_DPI) -> bytes:
+    """Nube de palabras de las frecuencias (la resolución escala con `dpi`)."""
+    return wordclouds.render(freqs, fmt, scale=dpi / DEFAULT_DPI)
+
+
+def _render_pair(terms: list[dict], freqs: dict[str, float], fmt: Format,
+                 dpi: int) -> tuple[bytes, bytes]:
+    return render_bar(terms, fmt, dpi), render_cloud(freqs, fmt, dpi)
+
+
+def _warm() -> None:
+    """Inicializador del worker: importa y dibuja algo mínimo (caché de fuentes)."""
+    render_bar([{"text": "warm", "value": 1}], "png", MIN_DPI)
+    wordclouds.render({"warm": 2, "up": 1}, "png", cache_dir=None)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# ─────────────────────────── Pool ────────────────────────────────────
+class RenderPool:
+    def __init__(self, workers: int = RENDER_WORKERS) -> None:
+        self.workers = workers
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_warm,
+                )
+            return self._pool
+
+    def warm(self) -> None:
+        """Arranca todos los workers (con sus fuentes) antes de la primera petición."""
+        if self.workers > 0:
+            ex = self._executor()
+            for fut in [ex.submit(_ping) for _ in range(self.workers)]:
+                fut.result()
+
+    def render(self, terms: list[dict], freqs: dict[str, float], fmt: Format = "png",
+               dpi: int = DEFAULT_DPI) -> tuple[bytes, bytes]:
+        if fmt not in FORMATS:
+            raise ValueError(f"formato no soportado: {fmt}")
+        dpi = max(MIN_DPI, min(int(dpi), MAX_DPI))
+        with timed("render", format=fmt):
+            if self.workers <= 0 or multiprocessing.current_process().daemon:
+                return _render_pair(terms, freqs, fmt, dpi)
+            try:
+                return self._executor().submit(_render_pair, terms, freqs, fmt, dpi).result()
+            except BrokenProcessPool:
+                # un worker murió (OOM…): pool nuevo y un reintento
+                LOG.warning("Pool de render roto; se recrea")
+                with self._lock:
+                    self._pool = None
+                return self._executor().submit(_render_pair, terms, freqs, fmt, dpi).result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_render_pool = RenderPool()
+
+
+def render_charts(terms: list[dict], freqs: dict[str, float], fmt: Format = "png",
+                  dpi: int = DEFAULT_DPI) -> tuple[bytes, bytes]:
+    """(barras, nube) en `fmt`; seguro desde cualquier hilo."""
+    return _render_pool.render(terms, freqs, fmt, dpi)
+
+
+def warm() -> None:
+    _render_pool.warm()
+
+
+def shutdown() -> None:
+    _render_pool.shutdown()
@@ -0,0 +1,143 @@
+# wordclouds.py
+# ──────────────────────────────────────────────────────────────
+# Nubes de palabras a partir de frecuencias, con caché de layouts.
+#
+# `WordCloud.generate(texto)` vuelve a tokenizar y contar lo que
+# CountVectorizer ya contó, y repite la búsqueda de posiciones (lo
+# caro) en cada petición. Aquí:
+#
+#   frecuencias ─► top CLOUD_MAX_WORDS ─► firma ─► layout (caché) ─► png/webp/svg
+#
+# • La firma son las palabras del top con su frecuencia relativa
+#   redondeada a 2 decimales (+ tamaño): pequeñas variaciones en los
+#   conteos reutilizan el mismo layout.
+# • Los layouts se guardan en memoria (LRU) y en disco
+#   (data/output/cloud_layouts/), compartidos entre los workers de
+#   render y los procesos de `export`.
+# • Semilla fija: la misma entrada da la misma imagen (y el mismo id
+#   de artefacto, ver artifacts.py).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Mapping
+
+from src.metrics import inc, timed
+from src.utils import atomic_write_text
+
+LOG = logging.getLogger("wordclouds")
+
+CLOUD_MAX_WORDS = int(os.getenv("CLOUD_MAX_WORDS", "150"))
+CLOUD_SIZE = (800, 400)
+LAYOUT_DIR = pathlib.Path("data/output/cloud_layouts")
+CACHE_SIZE = 256
+SEED = 0
+
+# entrada del layout: [palabra, frecuencia relativa, tamaño de fuente, [y, x], orientación, color]
+Layout = list[list]
+
+_cache: OrderedDict[str, Layout] = OrderedDict()
+_lock = threading.Lock()
+
+
+def _wordcloud(width: int, height: int, max_words: int):
+    from wordcloud import WordCloud
+
+    return WordCloud(width=width, height=height, background_color="white",
+                     max_words=max_words, random_state=SEED)
+
+
+def signature(
+    freqs: Mapping[str, float],
+    *,
+    size: tuple[int, int] = CLOUD_SIZE,
+    max_words: int = CLOUD_MAX_WORDS,
+) -> tuple[str, dict[str, float]]:
+    """(firma, top de frecuencias) de una nube; la firma es la clave del layout."""
+    top = sorted(((w, float(f)) for w, f in freqs.items() if f > 0 and w),
+                 key=lambda x: (-x[1], x[0]))[:max_words]
+    if not top:
+        raise ValueError("nube de palabras sin términos")
+    peak = top[0][1]
+    rel = [[w, round(f / peak, 2)] for w, f in top]
+    key = hashlib.blake2b(json.dumps([list(size), rel], ensure_ascii=False).encode("utf-8"),
+                          digest_size=16).hexdigest()
+    return key, dict(top)
+
+
+def _remember(key: str, lay: Layout) -> None:
+    with _lock:
+        _cache[key] = lay
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def layout(
+    freqs: Mapping[str, float],
+    *,
+    size: tuple[int, int] = CLOUD_SIZE,
+    max_words: int = CLOUD_MAX_WORDS,
+    cache_dir: pathlib.Path | None = LAYOUT_DIR,
+) -> Layout:
+    """Layout de la nube para `freqs`: de la caché si la firma ya se calculó."""
+    key, top = signature(freqs, size=size, max_words=max_words)
+    with _lock:
+        lay = _cache.get(key)
+        if lay is not None:
+            _cache.move_to_end(key)
+    if lay is not None:
+        inc("wordcloud_layouts_total", result="memory")
+        return lay
+
+    path = cache_dir / f"{key}.json" if cache_dir is not None else None
+    if path is not None and path.exists():
+        try:
+            lay = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            lay = None
+        if lay is not None:
+            inc("wordcloud_layouts_total", result="disk")
+            _remember(key, lay)
+            return lay
+
+    with timed("wordcloud_layout"):
+        wc = _wordcloud(*size, max_words).generate_from_frequencies(top)
+    lay = [[word, float(freq), int(size_), [int(pos[0]), int(pos[1])],
+            None if orient is None else int(orient), color]
+           for (word, freq), size_, pos, orient, color in wc.layout_]
+    inc("wordcloud_layouts_total", result="computed")
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(path, json.dumps(lay, ensure_ascii=False))
+    _remember(key, lay)
+    return lay
+
+
+def render(
+    freqs: Mapping[str, float],
+    fmt: str = "png",
+    *,
+    scale: float = 1.0,
+    size: tuple[int, int] = CLOUD_SIZE,
+    max_words: int = CLOUD_MAX_WORDS,
+    cache_dir: pathlib.Path | None = LAYOUT_DIR,
+) -> bytes:
+    """Nube de `freqs` en png/webp (raster ×`scale`) o svg, sin recalcular el layout."""
+    lay = layout(freqs, size=size, max_words=max_words, cache_dir=cache_dir)
+    wc = _wordcloud(*size, max_words)
+    wc.scale = scale
+    wc.layout_ = [((w, f), s, tuple(pos), o, c) for w, f, s, pos, o, c in lay]
+    with timed("wordcloud_draw", format=fmt):
+        if fmt == "svg":
+            return wc.to_svg(embed_font=False).encode("utf-8")
+        buf = BytesIO()
+        wc.to_image().save(buf, format=fmt.upper())
+        return buf.getvalue()
@@ -0,0 +1,270 @@
+# hosts.py
+# ──────────────────────────────────────────────────────────────
+# Salud por host para el downloader: circuit breaker + presupuesto de
+# reintentos compartido entre todas las URLs de un mismo servidor.
+#
+#   closed ──(FAILURE_THRESHOLD fallos seguidos)──► open
+#   open ──(pasa el cooldown)──► half_open: UNA petición de prueba
+#   half_open ──ok──► closed      half_open ──fallo──► open (cooldown ×2)
+#
+# • Un fallo de DNS abre el circuito directamente con MAX_COOLDOWN (no se
+#   reintenta: el nombre no va a resolver en el siguiente segundo), pero
+#   no para siempre: en el servidor un fallo pasajero de DNS no puede
+#   dejar fuera a una universidad hasta el siguiente reinicio.
+# • Cada host tiene un cubo de RETRY_BUDGET reintentos que se rellena a
+#   razón de RETRY_BUDGET por BUDGET_WINDOW; una carrera con diez URLs en
+#   un host caído ya no paga 10 × 4 reintentos, y un proceso de larga
+#   vida recupera los reintentos con el tiempo.
+# • El estado de los hosts caídos viaja en `host` de cada entrada de
+#   download_log.json; la siguiente ejecución los salta hasta DEAD_TTL
+#   (o los vuelve a sondear con --reprobe).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import json
+import logging
+import pathlib
+import socket
+import threading
+import time
+from typing import Literal, TypedDict
+from urllib.parse import urlsplit
+
+from . import metrics
+
+LOG = logging.getLogger("hosts")
+
+LOG_PATH = pathlib.Path("data/output/download_log.json")
+FAILURE_THRESHOLD = 3        # fallos seguidos que abren el circuito
+COOLDOWN = 60.0              # s en open antes de la prueba (se duplica en cada fallo)
+MAX_COOLDOWN = 15 * 60.0
+RETRY_BUDGET = 6             # capacidad del cubo de reintentos por host
+BUDGET_WINDOW = 600.0        # s en que el cubo se rellena por completo
+DEAD_TTL = 24 * 3600.0       # s que se respeta un host caído de una ejecución anterior
+
+Failure = Literal["dns", "connect", "timeout", "5xx"]
+
+
+class HostState(TypedDict, total=False):
+    state: Literal["closed", "open", "half_open"]
+    failures: int
+    reason: str
+    error: str
+    since: float             # epoch en que se abrió
+    until: float             # epoch hasta el que no se prueba
+
+
+def host_of(url: str) -> str:
+    """host[:puerto] de la URL (el puerto solo si es explícito)."""
+    try:
+        parts = urlsplit(url)
+    except ValueError:             # "http://[bad": httpx la rechazará con InvalidURL
+        return url.strip().lower()
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    return f"{host}:{port}" if port else host
+
+
+def classify(exc: BaseException) -> Failure:
+    """dns | connect | timeout según la cadena de causas de la excepción."""
+    seen: set[int] = set()
+    stack = [exc]
+    timeout = False
+    while stack:
+        e = stack.pop()
+        if e is None or id(e) in seen:
+            continue
+        seen.add(id(e))
+        name = type(e).__name__
+        if isinstance(e, socket.gaierror) or name == "NameResolutionError":
+            return "dns"
+        if "Timeout" in name or isinstance(e, (socket.timeout, TimeoutError)):
+            timeout = True
+        stack.extend([e.__cause__, e.__context__, getattr(e, "reason", None)])
+        stack.extend(a for a in getattr(e, "args", ()) if isinstance(a, BaseException))
+    text = str(exc).lower()
+    if "name or service not known" in text or "nodename nor servname" in text \
+            or "getaddrinfo failed" in text or "temporary failure in name resolution" in text:
+        return "dns"
+    return "timeout" if timeout else "connect"
+
+
+class _Host:
+    __slots__ = ("state", "failures", "reason", "error", "since", "until", "probing",
+                 "budget", "refilled")
+
+    def __init__(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self.reason = ""
+        self.error = ""
+        self.since = 0.0
+        self.until = 0.0
+        self.probing = False
+        self.budget = float(RETRY_BUDGET)
+        self.refilled = time.monotonic()
+
+    def refill(self) -> None:
+        """Cubo de reintentos: RETRY_BUDGET cada BUDGET_WINDOW segundos."""
+        now = time.monotonic()
+        rate = RETRY_BUDGET / BUDGET_WINDOW
+        self.budget = min(float(RETRY_BUDGET), self.budget + (now - self.refilled) * rate)
+        self.refilled = now
+
+    def snapshot(self) -> HostState:
+        snap = HostState(state=self.state, failures=self.failures)
+        if self.state != "closed":
+            # un fallo de DNS se recuerda DEAD_TTL para la siguiente ejecución
+            until = self.since + DEAD_TTL if self.reason == "dns" else self.until
+            snap.update(reason=self.reason, error=self.error, since=self.since, until=until)
+        return snap
+
+
+class HostTracker:
+    """Estado de todos los hosts de una ejecución (seguro entre hilos)."""
+
+    def __init__(self) -> None:
+        self._hosts: dict[str, _Host] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, host: str) -> _Host:
+        h = self._hosts.get(host)
+        if h is None:
+            h = self._hosts[host] = _Host()
+        return h
+
+    # ─────────── antes / después de cada petición ───────────
+    def before(self, url: str) -> str | None:
+        """None si se puede pedir `url`; si no, el motivo para saltarla."""
+        now = time.time()
+        with self._lock:
+            h = self._get(host_of(url))
+            if h.state == "closed":
+                return None
+            if h.state == "open" and now >= h.until:
+                h.state, h.probing = "half_open", False
+            if h.state == "half_open" and not h.probing:
+                h.probing = True
+                LOG.info("Host %s: probando de nuevo (half-open)", host_of(url))
+                return None
+            metrics.inc("download_host_skipped_total")
+            return f"host caído ({h.reason}: {h.error})" if h.error else f"host caído ({h.reason})"
+
+    def retries(self, url: str, default: int) -> int:
+        """Reintentos permitidos para la próxima petición (0 en half-open)."""
+        with self._lock:
+            h = self._get(host_of(url))
+            h.refill()
+            return 0 if h.state != "closed" else min(default, int(h.budget))
+
+    def spend(self, url: str, n: int = 1) -> bool:
+        """Gasta `n` reintentos del presupuesto del host; False si no quedaba."""
+        with self._lock:
+            h = self._get(host_of(url))
+            h.refill()
+            ok = h.budget >= n
+            h.budget = max(0.0, h.budget - n)
+            return ok
+
+    def success(self, url: str) -> None:
+        with self._lock:
+            h = self._get(host_of(url))
+            if h.state != "closed":
+                LOG.info("Host %s: recuperado", host_of(url))
+            h.state, h.failures, h.probing, h.reason, h.error = "closed", 0, False, "", ""
+
+    def failure(self, url: str, reason: Failure, error: str = "") -> None:
+        host = host_of(url)
+        now = time.time()
+        with self._lock:
+            h = self._get(host)
+            h.failures += 1
+            h.reason, h.error = reason, error[:200]
+            if h.state == "open":
+                return               # peticiones que ya estaban en vuelo al abrirse
+            if reason == "dns":
+                h.state, h.since, h.until = "open", now, now + MAX_COOLDOWN
+            elif h.state == "half_open":
+                cooldown = min(MAX_COOLDOWN, max(COOLDOWN, (h.until - h.since) * 2))
+                h.state, h.since, h.until = "open", now, now + cooldown
+            elif h.failures >= FAILURE_THRESHOLD:
+                h.state, h.since, h.until = "open", now, now + COOLDOWN
+            else:
+                return
+            h.probing = False
+        metrics.inc("download_host_open_total", reason=reason)
+        LOG.warning("Host %s: circuito abierto (%s, %d fallos)", host, reason, h.failures)
+
+    def release(self, url: str) -> None:
+        """
+        Fin de una petición sin veredicto (cancelada, URL inválida, demasiadas
+        redirecciones…): si era la prueba de un host half-open, la siguiente
+        petición puede volver a probar en vez de quedar bloqueada para siempre.
+        """
+        with self._lock:
+            h = self._get(host_of(url))
+            if h.state == "half_open":
+                h.probing = False
+
+    def snapshot(self, url: str) -> HostState:
+        with self._lock:
+            return self._get(host_of(url)).snapshot()
+
+    def summary(self) -> dict[str, HostState]:
+        with self._lock:
+            return {k: h.snapshot() for k, h in self._hosts.items() if h.state != "closed"}
+
+    # ─────────── persistencia vía download_log.json ───────────
+    def seed(self, entries: list[dict], *, reprobe: bool = False) -> int:
+        """
+        Carga los hosts caídos de un download_log previo y devuelve cuántos.
+        Con `reprobe` quedan en half-open: una sola petición de prueba decide.
+        """
+        now = time.time()
+        hosts: set[str] = set()
+        with self._lock:
+            for e in entries:
+                st = e.get("host")
+                if not st or st.get("state", "closed") == "closed":
+                    continue
+                host = host_of(e.get("url", ""))
+                h = self._get(host)
+                h.state = "open"
+                h.failures = st.get("failures", FAILURE_THRESHOLD)
+                h.reason, h.error = st.get("reason", ""), st.get("error", "")
+                h.since = st.get("since", now)
+                h.until = now if reprobe else min(st.get("until", now), h.since + DEAD_TTL)
+                hosts.add(host)
+        return len(hosts)
+
+
+_tracker: HostTracker | None = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker(*, reprobe: bool = False, log_path: pathlib.Path = LOG_PATH) -> HostTracker:
+    """Tracker del proceso; en el primer uso hereda los hosts caídos del log previo."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = HostTracker()
+            try:
+                entries = json.loads(pathlib.Path(log_path).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                entries = []
+            n = _tracker.seed(entries, reprobe=reprobe)
+            if n:
+                LOG.info("%d hosts caídos heredados de %s%s", n, log_path,
+                         " (se vuelven a probar)" if reprobe else "")
+        return _tracker
+
+
+def reset_tracker(*, reprobe: bool = False) -> HostTracker:
+    """Descarta el tracker actual y carga uno nuevo (p. ej. con reprobe)."""
+    global _tracker
+    with _tracker_lock:
+        _tracker = None
+    return get_tracker(reprobe=reprobe)
@@ -0,0 +1,279 @@
+# llm.py
+# ──────────────────────────────────────────────────────────────
+# Backends intercambiables para las llamadas al LLM.
+#
+#   openai  → API de OpenAI (por defecto)
+#   local   → cualquier servidor compatible con OpenAI (vLLM, llama.cpp,
+#             o el propio `python -m src.llm serve`)
+#   replay  → respuestas grabadas en data/output/gpt_raw (sin red, sin coste)
+#   stub    → respuesta sintética determinista con latencia y tasa de
+#             error configurables, para pruebas de carga reproducibles
+#
+# Selección por variable de entorno LLM_BACKEND o con `set_backend()`.
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from . import metrics
+
+load_dotenv()
+
+LOG = logging.getLogger("llm")
+
+MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")  # o "gpt-4o-mini"
+RAW_GPT = pathlib.Path("data/output/gpt_raw")
+
+
+class BackendError(RuntimeError):
+    """Fallo (real o simulado) de un backend; `_call_gpt` lo reintenta."""
+
+
+class LLMBackend:
+    """Interfaz: recibe los mensajes de chat y devuelve el texto de respuesta."""
+
+    name = "base"
+
+    def complete(self, messages: list[dict]) -> str:
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(
+        self,
+        model: str = MODEL,
+        api_key: str | None = None,
+        base_url: str | None = None,
+    ) -> None:
+        import openai
+
+        self.model = model
+        self.client = openai.OpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=base_url,
+        )
+
+    def complete(self, messages: list[dict]) -> str:
+        rsp = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=0.0,
+        )
+        if rsp.usage is not None:
+            metrics.inc("llm_tokens_total", rsp.usage.prompt_tokens, direction="prompt", source="usage")
+            metrics.inc("llm_tokens_total", rsp.usage.completion_tokens, direction="completion", source="usage")
+        return rsp.choices[0].message.content
+
+
+class LocalServerBackend(OpenAIBackend):
+    """Servidor propio compatible con /v1/chat/completions."""
+
+    name = "local"
+
+    def __init__(self, base_url: str | None = None, model: str | None = None) -> None:
+        super().__init__(
+            model=model or os.getenv("LLM_LOCAL_MODEL", MODEL),
+            api_key=os.getenv("LLM_LOCAL_API_KEY", "local"),
+            base_url=base_url or os.getenv("LLM_BASE_URL", "http://127.0.0.1:8089/v1"),
+        )
+
+
+def _prompt_key(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Reproduce respuestas guardadas por `_save_raw_gpt`
+    (<base>_prompt.txt / <base>_answer.txt), indexadas por el hash del
+    mensaje de usuario. Un prompt no grabado lanza BackendError salvo que
+    se indique un `fallback`.
+    """
+
+    name = "replay"
+
+    def __init__(self, raw_dir: pathlib.Path = RAW_GPT, fallback: LLMBackend | None = None) -> None:
+        self.fallback = fallback
+        self.answers: dict[str, str] = {}
+        for p in pathlib.Path(raw_dir).glob("*_prompt.txt"):
+            ans = p.with_name(p.name[: -len("_prompt.txt")] + "_answer.txt")
+            if ans.exists():
+                self.answers[_prompt_key(p.read_text(encoding="utf-8"))] = ans.read_text(encoding="utf-8")
+        LOG.info("replay backend: %d respuestas grabadas en %s", len(self.answers), raw_dir)
+
+    def complete(self, messages: list[dict]) -> str:
+        key = _prompt_key(messages[-1]["content"])
+        if key in self.answers:
+            metrics.inc("llm_cache_hits_total", backend=self.name)
+            return self.answers[key]
+        if self.fallback is not None:
+            return self.fallback.complete(messages)
+        raise BackendError(f"replay miss {key[:10]}")
+
+
+def echo_csv(messages: list[dict]) -> str:
+    """
+    Respuesta sintética: devuelve como CSV name,credits,mode las líneas
+    del texto fuente que el extractor considera filas de curso.
+    """
+    from .extractor import _parse_course_line, looks_like_course_row, normalize_line
+
+    content = messages[-1]["content"]
+    source = content.partition("<<<\n")[2].rpartition("\n>>>")[0]
+    out = ["name,credits,mode"]
+    for ln in source.splitlines():
+        ln = normalize_line(ln)
+        if looks_like_course_row(ln):
+            c = _parse_course_line(ln, "")
+            out.append(f"{c['name'].replace(',', ' ')},{c.get('credits', '')},")
+    return "\n".join(out)
+
+
+class StubBackend(LLMBackend):
+    """
+    Backend sintético determinista: la latencia (base ± jitter) y si la
+    llamada falla dependen solo de `seed` y del prompt, de modo que dos
+    ejecuciones con la misma configuración son idénticas, también con
+    llamadas concurrentes.
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.calls = 0
+        self._attempts: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def complete(self, messages: list[dict]) -> str:
+        key = _prompt_key(messages[-1]["content"])
+        with self._lock:
+            self.calls += 1
+            attempt = self._attempts[key] = self._attempts.get(key, 0) + 1
+        # el nº de intento entra en la semilla: un reintento puede salir bien
+        rng = random.Random(f"{self.seed}:{key}:{attempt}")
+        delay = max(self.latency + rng.uniform(-self.jitter, self.jitter), 0.0)
+        if delay:
+            time.sleep(delay)
+        if rng.random() < self.error_rate:
+            raise BackendError("stub: simulated failure")
+        return echo_csv(messages)
+
+
+# ─────────────────────────── Selección ───────────────────────────────
+_backend: LLMBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def make_backend(name: str | None = None) -> LLMBackend:
+    """Construye un backend por nombre (o según LLM_BACKEND)."""
+    name = (name or os.getenv("LLM_BACKEND", "openai")).lower()
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "local":
+        return LocalServerBackend()
+    if name == "replay":
+        return ReplayBackend(pathlib.Path(os.getenv("LLM_REPLAY_DIR", str(RAW_GPT))))
+    if name == "stub":
+        return StubBackend(
+            latency=float(os.getenv("LLM_STUB_LATENCY", "0")),
+            jitter=float(os.getenv("LLM_STUB_JITTER", "0")),
+            error_rate=float(os.getenv("LLM_STUB_ERROR_RATE", "0")),
+            seed=int(os.getenv("LLM_STUB_SEED", "0")),
+        )
+    raise ValueError(f"LLM backend desconocido: {name}")
+
+
+def get_backend() -> LLMBackend:
+    """Backend activo del proceso (se crea perezosamente)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = make_backend()
+        return _backend
+
+
+def set_backend(backend: LLMBackend | str | None) -> LLMBackend | None:
+    """Fija el backend activo; None vuelve a la selección por entorno."""
+    global _backend
+    with _backend_lock:
+        _backend = make_backend(backend) if isinstance(backend, str) else backend
+        return _backend
+
+
+# ─────────────────────────── Servidor local ──────────────────────────
+def serve(backend: LLMBackend, host: str = "127.0.0.1", port: int = 8089) -> None:
+    """
+    Expone `backend` como un endpoint mínimo /v1/chat/completions compatible
+    con OpenAI, para probar el camino de red (LocalServerBackend) sin coste.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):  # noqa: N802 (API de http.server)
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            try:
+                content = backend.complete(body["messages"])
+            except BackendError as exc:
+                self.send_error(503, str(exc))
+                return
+            payload = json.dumps({
+                "id": f"chatcmpl-{_prompt_key(content)[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", MODEL),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, fmt, *args):
+            LOG.debug(fmt, *args)
+
+    LOG.info("LLM local (%s) en http://%s:%d/v1", backend.name, host, port)
+    ThreadingHTTPServer((host, port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(prog="llm")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve", help="servidor local compatible con OpenAI")
+    s.add_argument("--backend", default="stub", choices=["stub", "replay", "openai"])
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--port", type=int, default=8089)
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    serve(make_backend(args.backend), args.host, args.port)
@@ -1,24 +1,38 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List
-import pathlib, base64, logging, os, time
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, List, Literal
+import asyncio, json, pathlib, base64, logging, os, threading, time
 
+import anyio
 import pandas as pd
-from bs4 import BeautifulSoup
-from pdfminer.high_level import extract_text
-
-from .downloader import fetch_page
-from .utils      import split_urls, slugify
-from .analyzer   import (
-    split_text_into_chunks, _build_prompt,
-    _call_gpt, _strip_fences, _csv_rows
-)
-from src.graph.analyze_text_data_return_files import analyze_df_return_files
+
+from .downloader import DownloadInfo, aclose_async_client, fetch_page_async
+from .utils      import normalize_url, split_urls
+from .analyzer   import _course_rows, model_tag
+from .catalog    import current_document, file_hash, get_catalog
+from .course_batch import CourseBatch
+from .engine     import run_document
+from .course_index import get_index
+from .           import artifacts, metrics, profiling
+from .singleflight import SingleFlight
+from src.graph.analyze_text_data_return_files import analyze_df
+from src.graph import render
 
 app = FastAPI()
 
+@app.on_event("startup")
+async def _warm_render_pool():
+    # los workers de render cargan matplotlib y las fuentes en segundo plano
+    threading.Thread(target=render.warm, name="render-warm", daemon=True).start()
+
+@app.on_event("shutdown")
+async def _close_http_client():
+    await aclose_async_client()
+    render.shutdown()
+
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
     CORSMiddleware,
@@ -30,57 +44,319 @@ app.add_middleware(
 
 logging.basicConfig(level=logging.INFO)
 
+@app.middleware("http")
+async def _request_metrics(request: Request, call_next):
+    # perfilado explícito: cabecera X-Profile: 1 o query ?profile=1
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    profiling.requested.set(flag in ("1", "true", "yes"))
+    t0 = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        metrics.inc("stage_errors_total", stage="request", path=_route_label(request))
+        raise
+    finally:
+        metrics.record_stage("request", time.perf_counter() - t0, path=_route_label(request))
+    metrics.inc("http_requests_total", path=_route_label(request), status=response.status_code)
+    return response
+
+def _route_label(request: Request) -> str:
+    # plantilla de la ruta (/artifacts/{aid}), no la ruta concreta: una serie
+    # por endpoint y no una por artefacto o perfil
+    return getattr(request.scope.get("route"), "path", "unmatched")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métricas en formato de exposición de Prometheus."""
+    return PlainTextResponse(
+        metrics.render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
 class OneShotParams(BaseModel):
     url: str
     university: str = "N/A"
     program: str    = "N/A"
     force: bool     = False
+    # inline: PNG en base64 en el JSON · ref: URLs a /artifacts/{id}
+    # data: solo `top_terms` (el Frontend dibuja; sin gráficas en el servidor)
+    charts: Literal["inline", "ref", "data"] = "inline"
+    chart_format: Literal["png", "svg", "webp"] = "png"
+    dpi: int = Field(100, ge=30, le=300)
+
+@app.get("/profiles")
+def get_profiles():
+    """Perfiles guardados de peticiones lentas o con X-Profile."""
+    return profiling.list_profiles()
+
+@app.get("/profiles/{pid}")
+def get_profile(pid: str):
+    meta = profiling.load_profile(pid)
+    if meta is None:
+        raise HTTPException(404, "Perfil no encontrado")
+    return meta
+
+@app.get("/profiles/{pid}/download")
+def download_profile(pid: str):
+    path = profiling.dump_path(pid)
+    if path is None:
+        raise HTTPException(404, "Perfil no encontrado")
+    return FileResponse(path, filename=path.name, media_type="application/octet-stream")
+
+@app.get("/artifacts/{aid}")
+def get_artifact(aid: str, request: Request):
+    """Gráficas guardadas por hash de contenido: inmutables, con ETag."""
+    path = artifacts.path_for(aid)
+    if path is None or not path.exists():
+        raise HTTPException(404, "Artefacto no encontrado")
+    tag = artifacts.etag(aid)
+    headers = {"ETag": tag, "Cache-Control": "public, max-age=31536000, immutable"}
+    match = request.headers.get("if-none-match", "")
+    if match.strip() == "*" or tag in (t.strip().removeprefix("W/") for t in match.split(",")):
+        return Response(status_code=304, headers=headers)
+    media_type = artifacts.MEDIA_TYPES[aid.rsplit(".", 1)[1]]
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+@app.get("/search")
+def search_courses(
+    q: str = "",
+    prefix: bool = False,
+    region: str | None = None,
+    university: str | None = None,
+    limit: int = 50,
+):
+    """
+    Busca cursos por términos del nombre (`rein*` o prefix=true para prefijo),
+    con filtros opcionales de región y universidad.
+    """
+    if not q.strip() and not (region or university):
+        raise HTTPException(400, "Indica q, region o university")
+    return get_index().search(
+        q, prefix=prefix, region=region, university=university, limit=max(1, min(limit, 500))
+    )
+
+@app.get("/courses")
+def list_courses(university: str | None = None, program: str | None = None):
+    """Cursos del último análisis de cada fuente registrada en el catálogo."""
+    return get_catalog().courses(university, program)
+
+# ───────────────────────── Análisis por lotes ─────────────────────────
+BATCH_MAX_ITEMS   = int(os.getenv("ANALYZE_BATCH_MAX_ITEMS", "200"))     # ítems por petición
+BATCH_CONCURRENCY = int(os.getenv("ANALYZE_BATCH_CONCURRENCY", "8"))     # URLs en vuelo por petición
+ANALYZE_MAX_CONCURRENCY = int(os.getenv("ANALYZE_MAX_CONCURRENCY", "16"))  # análisis a la vez en el servidor
+
+_analysis_limiter: anyio.CapacityLimiter | None = None
+
+def _limiter() -> anyio.CapacityLimiter:
+    """Hilos para catálogo + motor + LLM compartidos por todos los lotes."""
+    global _analysis_limiter
+    if _analysis_limiter is None:
+        _analysis_limiter = anyio.CapacityLimiter(ANALYZE_MAX_CONCURRENCY)
+    return _analysis_limiter
+
+# Peticiones idénticas concurrentes (misma URL normalizada, universidad,
+# carrera y force) comparten un único trabajo en vuelo
+_url_flights  = SingleFlight("analyze_url")
+_rows_flights = SingleFlight("analyze_rows")
+
+def _flight_key(p: OneShotParams) -> tuple:
+    return (normalize_url(p.url), p.university, p.program, p.force)
+
+class BatchParams(BaseModel):
+    # `url` puede traer varias URLs separadas por comas (como en Salida.csv)
+    items: List[OneShotParams] = Field(..., min_length=1)
+    aggregate: bool = False          # gráfica combinada de todo el lote al final
+    charts: Literal["inline", "ref", "data"] = "inline"   # formato de `aggregate`
+    chart_format: Literal["png", "svg", "webp"] = "png"
+    dpi: int = Field(100, ge=30, le=300)
+
+@app.post("/analyze_batch")
+async def analyze_batch(params: BatchParams, request: Request, format: str | None = None):
+    """
+    Analiza muchas (url, university, program) y emite un registro por ítem
+    en cuanto termina: NDJSON por defecto, SSE con `Accept: text/event-stream`
+    o `?format=sse`. Los ítems repetidos (misma URL, universidad y carrera)
+    se analizan una sola vez.
+    """
+    sse = format == "sse" or "text/event-stream" in request.headers.get("accept", "")
+    expanded = [
+        (i, OneShotParams(url=url, university=item.university, program=item.program, force=item.force))
+        for i, item in enumerate(params.items)
+        for url in split_urls(item.url)
+    ]
+    if not expanded:
+        raise HTTPException(400, "Ningún ítem trae URL")
+    if len(expanded) > BATCH_MAX_ITEMS:
+        raise HTTPException(413, f"Máximo {BATCH_MAX_ITEMS} URLs por lote ({len(expanded)} recibidas)")
+
+    # una tarea por (URL, universidad, carrera, force): la misma URL bajo otra
+    # carrera es otro análisis, con sus filas de catálogo y del agregado
+    jobs: dict[tuple, list[tuple[int, OneShotParams]]] = {}
+    for i, p in expanded:
+        jobs.setdefault(_flight_key(p), []).append((i, p))
+
+    return StreamingResponse(
+        _stream_batch(jobs, params if params.aggregate else None, sse),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _stream_batch(jobs, aggregate: BatchParams | None, sse: bool) -> AsyncIterator[str]:
+    def line(kind: str, data: dict) -> str:
+        if sse:
+            return f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        return json.dumps({"type": kind, **data}, ensure_ascii=False) + "\n"
+
+    t0 = time.perf_counter()
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def work(first: OneShotParams):
+        # cada URL tiene su propio fichero en data/raw/ (ver downloader._basename)
+        info = await fetch_page_async(
+            first.url, university=first.university, program=first.program, force=first.force,
+        )
+        return await anyio.to_thread.run_sync(_analyze_item, first, info, limiter=_limiter())
+
+    async def run(key, owners):
+        _, first = owners[0]
+        async with sem:
+            try:
+                (rows, meta), _ = await _rows_flights.do(_flight_key(first), lambda: work(first))
+                return key, {"status": "ok", "rows": len(rows), **meta, "courses": rows}
+            except HTTPException as exc:
+                return key, {"status": "error", "code": exc.status_code, "detail": exc.detail}
+            except Exception as exc:
+                logging.exception("analyze_batch %s", first.url)
+                return key, {"status": "error", "code": 500, "detail": str(exc)}
+
+    tasks = [asyncio.create_task(run(key, owners)) for key, owners in jobs.items()]
+    batches: List[CourseBatch] = []       # filas del agregado, en columnas
+    n_ok = n_items = 0
+    try:
+        for fut in asyncio.as_completed(tasks):
+            key, result = await fut
+            if result["status"] == "ok":
+                _, first = jobs[key][0]
+                batches.append(CourseBatch.from_courses(
+                    result["courses"], university=first.university, program=first.program,
+                ))
+            for k, (index, p) in enumerate(jobs[key]):
+                n_items += 1
+                n_ok += result["status"] == "ok"
+                yield line("item", {"index": index, "url": p.url, "university": p.university,
+                                    "program": p.program, "shared": len(jobs[key]) > 1, **result})
+
+        if aggregate and any(len(b) for b in batches):
+            df = CourseBatch.concat(batches).to_pandas()
+            payload = await anyio.to_thread.run_sync(
+                _chart_payload, df, aggregate, limiter=_limiter()
+            )
+            yield line("aggregate", {"rows": len(df), **payload})
+        yield line("done", {"items": n_items, "urls": len(jobs), "ok": n_ok,
+                            "errors": n_items - n_ok,
+                            "elapsed": round(time.perf_counter() - t0, 3)})
+    finally:
+        # el cliente cortó la conexión: no seguimos descargando para nadie
+        for t in tasks:
+            t.cancel()
 
 @app.post("/analyze_url")
-def analyze_url(params: OneShotParams):
-    # 1 · Descarga
-    info = fetch_page(
+async def analyze_url(params: OneShotParams):
+    # Duplicados concurrentes (usuarios en la misma carrera, reintentos del
+    # frontend) esperan el trabajo del primero en vez de repetirlo
+    payload, shared = await _url_flights.do(
+        (*_flight_key(params), params.charts, params.chart_format, params.dpi),
+        lambda: _analyze_url(params),
+    )
+    return JSONResponse({**payload, "coalesced": shared})
+
+@profiling.profiled(lambda params: params.url)
+async def _analyze_url(params: OneShotParams) -> dict:
+    # 1 · Descarga en el bucle de eventos (cliente httpx compartido): la
+    #     espera de red y los reintentos no ocupan un hilo del threadpool
+    info = await fetch_page_async(
         params.url,
         university=params.university,
         program=params.program,
         force=params.force,
     )
+    # 2…5 · Catálogo, motor y gráficas (CPU / LLM síncrono) en el threadpool
+    return await run_in_threadpool(_analyze_fetched, params, info)
+
+@profiling.profiled(lambda params, info: params.url)
+def _analyze_fetched(params: OneShotParams, info: DownloadInfo) -> dict:
+    rows, meta = _extract_rows(params, info)
+
+    df = pd.DataFrame(rows)
+    if df.empty or "name" not in df.columns:
+        raise HTTPException(422, "CSV sin columna ‘name’")
+
+    return {
+        "status":   "ok",
+        "rows":     len(df),
+        **meta,
+        **_chart_payload(df, params),
+    }
+
+def _chart_payload(df: pd.DataFrame, opts: OneShotParams | BatchParams) -> dict:
+    """Pasos 4–5: frecuencias de términos y gráficas según `opts.charts`."""
+    # 4 · Frecuencias (siempre) y gráficas en el pool de render (salvo "data")
+    fmt = opts.chart_format
+    charts = analyze_df(df, text_column="name", render=opts.charts != "data",
+                        fmt=fmt, dpi=opts.dpi)
+    payload: dict = {"top_terms": charts["terms"]}
+
+    # 5 · En base64 dentro del JSON (bar_png, cloud_png…) o por referencia
+    if opts.charts == "inline":
+        payload[f"bar_{fmt}"]   = base64.b64encode(charts["bar"]).decode()
+        payload[f"cloud_{fmt}"] = base64.b64encode(charts["cloud"]).decode()
+    elif opts.charts == "ref":
+        payload["bar"]   = artifacts.put(charts["bar"], fmt)
+        payload["cloud"] = artifacts.put(charts["cloud"], fmt)
+    return payload
+
+def _extract_rows(params: OneShotParams, info: DownloadInfo) -> tuple[List[dict], dict]:
+    """Pasos 2–3 de /analyze_url: filas de cursos + tier/cached/tokens_saved."""
+    cat = get_catalog()
+    cat.record_fetch(info)
     if info.get("error"):
         raise HTTPException(502, f"Download failed: {info['error']}")
 
     path = pathlib.Path(info["path"])
     kind = info.get("kind", "html").lower()
+    model = model_tag()
 
-    # 2 · Extracción de texto plano
-    raw_text = (
-        extract_text(str(path))
-        if kind == "pdf"
-        else BeautifulSoup(path.read_text("utf-8", errors="ignore"), "lxml").get_text("\n")
+    # 2 · ¿Ya analizado este contenido con este modelo? → catálogo
+    prev = None if params.force else cat.analyzed(
+        params.url, model, file_hash(path),
+        university=params.university, program=params.program,
     )
-
-    # 3 · Troceo + GPT → filas CSV
-    rows: List[dict] = []
-    for chunk in split_text_into_chunks(raw_text, max_chars=10_000):
-        prompt = _build_prompt(params.university, params.program, chunk)
-        rsp    = _call_gpt(prompt)
-        rows  += _csv_rows(_strip_fences(rsp))
+    if prev is not None:
+        tier, tokens_saved = prev["tier"], 0
+        rows: List[dict] = cat.document_courses(prev["id"])
+    else:
+        # 3 · Motor híbrido: extractor determinista primero; GPT solo sobre
+        #     las ventanas relevantes cuando la confianza es baja
+        doc_id = cat.record_document(info, model)
+        token = current_document.set(doc_id)
+        try:
+            result = run_document(
+                path, params.url, params.university, params.program, kind=kind
+            )
+        finally:
+            current_document.reset(token)
+        logging.info(
+            "engine %s | tier=%s | confidence=%.2f | %s",
+            params.url, result["tier"], result["confidence"],
+            {k: round(v, 3) for k, v in result["timings"].items()},
+        )
+        cat.finish_document(doc_id, result["tier"], result["confidence"])
+        rows = _course_rows(result["courses"])
+        cat.add_courses(doc_id, params.university, params.program, rows)
+        tier = result["tier"]
+        tokens_saved = (result["relevance"] or {}).get("tokens_saved", 0)
 
     if not rows:
         raise HTTPException(422, "GPT no extrajo datos útiles")
+    return rows, {"tier": tier, "cached": prev is not None, "tokens_saved": tokens_saved}
 
-    df = pd.DataFrame(rows)
-    if df.empty or "name" not in df.columns:
-        raise HTTPException(422, "CSV sin columna ‘name’")
-
-    # 4 · Gráficas → Buffers PNG
-    buf_bar, buf_cloud = analyze_df_return_files(df, text_column="name")
-
-    # 5 · Codificamos en base64 para devolver en JSON
-    bar_b64   = base64.b64encode(buf_bar.getvalue()).decode()
-    cloud_b64 = base64.b64encode(buf_cloud.getvalue()).decode()
-    return JSONResponse({
-        "status":   "ok",
-        "bar_png":  bar_b64,
-        "cloud_png": cloud_b64,
-        "rows":     len(df)
-    })
\ No newline at end of file
+_analyze_item = profiling.profiled(lambda params, info: params.url)(_extract_rows)
\ No newline at end of file
@@ -0,0 +1,229 @@
+# metrics.py
+# ──────────────────────────────────────────────────────────────
+# Instrumentación mínima sin dependencias externas:
+#
+#   with timed("download"):  …            → histograma de segundos por etapa
+#   @timed("clean")                       → idem como decorador
+#   inc("llm_retries_total")              → contador
+#   observe("download_bytes", n)          → histograma arbitrario
+#   with trace() as stages:  …            → etapas de la petición en curso
+#
+# Se expone en formato Prometheus (`render_prometheus`, endpoint /metrics
+# de la API) y como tabla resumen al final de las ejecuciones del CLI
+# (`summary_table`).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+PREFIX = "univcrawler_"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 5e6, 2e7, 1e8)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(kw: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+
+def _escape(value: str) -> str:
+    """Escapado de valores de etiqueta del formato de exposición (\\, \" y \n)."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: Labels, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+class _Hist:
+    __slots__ = ("buckets", "counts", "sum", "count", "max")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+        self.max = max(self.max, v)
+
+    def quantile(self, q: float) -> float:
+        """Aproximación por cubos (límite superior del cubo que contiene q)."""
+        target = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target and c:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+
+class Registry:
+    """Almacén de contadores e histogramas, seguro entre hilos."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._hists: dict[str, dict[Labels, _Hist]] = {}
+        self._buckets: dict[str, tuple[float, ...]] = {}
+        self._help: dict[str, str] = {}
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def inc(self, name: str, n: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + n
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._hists.setdefault(name, {})
+            self._buckets.setdefault(name, buckets)
+            h = series.get(key)
+            if h is None:
+                h = series[key] = _Hist(self._buckets[name])
+            h.observe(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._hists.clear()
+
+    # ─────────── exportación ───────────
+    def render_prometheus(self) -> str:
+        out: list[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = PREFIX + name
+                if name in self._help:
+                    out.append(f"# HELP {full} {self._help[name]}")
+                out.append(f"# TYPE {full} counter")
+                for labels, v in sorted(series.items()):
+                    out.append(f"{full}{_fmt_labels(labels)} {v:g}")
+            for name, series in sorted(self._hists.items()):
+                full = PREFIX + name
+                if name in self._help:
+                    out.append(f"# HELP {full} {self._help[name]}")
+                out.append(f"# TYPE {full} histogram")
+                for labels, h in sorted(series.items()):
+                    acc = 0
+                    for le, c in zip(h.buckets, h.counts):
+                        acc += c
+                        out.append(f"{full}_bucket{_fmt_labels(labels, (('le', f'{le:g}'),))} {acc}")
+                    out.append(f"{full}_bucket{_fmt_labels(labels, (('le', '+Inf'),))} {h.count}")
+                    out.append(f"{full}_sum{_fmt_labels(labels)} {h.sum:.6f}")
+                    out.append(f"{full}_count{_fmt_labels(labels)} {h.count}")
+        return "\n".join(out) + "\n"
+
+    def summary_table(self) -> str:
+        """Tabla de texto: histogramas (n, total, media, p95, máx) y contadores."""
+        lines = [f"{'métrica':<64}{'n':>7}{'total':>11}{'media':>10}{'p95':>10}{'máx':>10}"]
+        with self._lock:
+            for name, series in sorted(self._hists.items()):
+                for labels, h in sorted(series.items()):
+                    label = name + _fmt_labels(labels)
+                    mean = h.sum / h.count if h.count else 0.0
+                    lines.append(
+                        f"{label[:63]:<64}{h.count:>7}{h.sum:>11.3f}{mean:>10.3f}"
+                        f"{h.quantile(0.95):>10.3f}{h.max:>10.3f}"
+                    )
+            for name, series in sorted(self._counters.items()):
+                for labels, v in sorted(series.items()):
+                    label = name + _fmt_labels(labels)
+                    lines.append(f"{label[:63]:<64}{v:>7g}")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+render_prometheus = REGISTRY.render_prometheus
+summary_table = REGISTRY.summary_table
+
+REGISTRY.describe("stage_seconds", "Duración de cada etapa del pipeline")
+REGISTRY.describe("stage_errors_total", "Excepciones por etapa")
+REGISTRY.describe("download_cache_hits_total", "Descargas servidas desde data/raw")
+REGISTRY.describe("download_bytes", "Tamaño de los cuerpos descargados")
+REGISTRY.describe("engine_documents_total", "Documentos por nivel del motor híbrido")
+REGISTRY.describe("llm_tokens_total", "Tokens del LLM (estimados o reportados por la API)")
+REGISTRY.describe("llm_retries_total", "Reintentos de llamadas al LLM")
+REGISTRY.describe("llm_cache_hits_total", "Respuestas del LLM servidas desde caché/grabación")
+
+
+# etapas registradas dentro del contexto actual (una petición, un documento…)
+_trace: contextvars.ContextVar[list[dict] | None] = contextvars.ContextVar("metrics_trace", default=None)
+
+
+@contextmanager
+def trace() -> Iterator[list[dict]]:
+    """
+    Recoge en una lista las etapas medidas dentro del bloque (también en
+    hilos lanzados con el contexto copiado, como el threadpool de FastAPI).
+    """
+    stages: list[dict] = []
+    token = _trace.set(stages)
+    try:
+        yield stages
+    finally:
+        _trace.reset(token)
+
+
+def record_stage(stage: str, seconds: float, **labels) -> None:
+    """Registra la duración de una etapa en el histograma y en la traza activa."""
+    observe("stage_seconds", seconds, stage=stage, **labels)
+    stages = _trace.get()
+    if stages is not None:
+        stages.append({"stage": stage, **labels, "seconds": round(seconds, 6)})
+
+
+class timed:
+    """
+    Cronómetro de etapa, como context manager o decorador:
+
+        with timed("download"): …
+        @timed("extract", tier="html")
+
+    Registra `stage_seconds{stage=…}` y, si hay excepción,
+    `stage_errors_total{stage=…}` (la excepción se propaga).
+    """
+
+    def __init__(self, stage: str, **labels) -> None:
+        self.stage = stage
+        self.labels = labels
+        self.elapsed = 0.0
+
+    def __enter__(self) -> "timed":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.elapsed = time.perf_counter() - self._t0
+        record_stage(self.stage, self.elapsed, **self.labels)
+        if exc_type is not None:
+            inc("stage_errors_total", stage=self.stage, **self.labels)
+
+    def __call__(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(self.stage, **self.labels):
+                return fn(*args, **kwargs)
+        return wrapper
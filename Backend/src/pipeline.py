@@ -0,0 +1,363 @@
+# pipeline.py
+# ──────────────────────────────────────────────────────────────
+# Ejecución encadenada download → extract → LLM → write.
+#
+#   registros ─► fetch (hilos, E/S) ─► extract (pool de procesos, CPU)
+#                    │                      │
+#                    │ ya analizado         ▼
+#                    │               llm (hilos, espera de API)
+#                    ▼                      │
+#                  write (un único hilo: CSV + índice + catálogo) ◄┘
+#
+# Cada etapa lee de una cola acotada (`queue_size`): si una etapa se
+# atasca, las anteriores se bloquean al llenar su cola (backpressure) en
+# lugar de acumular trabajo en memoria. Así las etapas se solapan y el
+# tiempo total tiende al de la etapa más lenta, no a la suma.
+#
+# Al terminar se informa, por etapa, de items, errores, tiempo ocupado,
+# rendimiento y profundidad de cola (máx./media).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, TypedDict
+
+from . import metrics
+
+LOG = logging.getLogger("pipeline")
+
+_STOP = object()
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+Route = tuple["Stage | None", Any]
+
+
+class StageReport(TypedDict):
+    stage: str
+    workers: int
+    items: int
+    errors: int
+    busy_s: float
+    active_s: float
+    rate: float
+    queue_max: int
+    queue_mean: float
+
+
+class Stage:
+    """
+    Etapa con `workers` hilos que consumen `inbox` y aplican `fn(item)`.
+    `fn` devuelve una lista de (etapa_destino, item); la etapa destino
+    debe estar declarada en `outputs`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Iterable[Route]],
+        *,
+        workers: int = 1,
+        queue_size: int = 32,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inbox: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.outputs: list[Stage] = []
+        self.producers = 0            # etapas (o fuentes) que escriben en inbox
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.first: float | None = None
+        self.last: float | None = None
+        self.depth_max = 0
+        self.depth_sum = 0
+        self.depth_n = 0
+        self._lock = threading.Lock()
+        self._alive = 0
+        self._threads: list[threading.Thread] = []
+
+    def feeds(self, *stages: "Stage") -> "Stage":
+        for st in stages:
+            self.outputs.append(st)
+            st.producers += 1
+        return self
+
+    # ─────────── ciclo de vida ───────────
+    def start(self) -> None:
+        self._alive = self.workers
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def join(self) -> None:
+        for t in self._threads:
+            t.join()
+
+    def producer_done(self) -> None:
+        """Un productor ha terminado; con el último se detienen los workers."""
+        with self._lock:
+            self.producers -= 1
+            last = self.producers == 0
+        if last:
+            for _ in range(self.workers):
+                self.inbox.put(_STOP)
+
+    def _work(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                break
+            t0 = time.perf_counter()
+            try:
+                routes = list(self.fn(item))
+            except Exception as exc:
+                LOG.error("[%s] %s", self.name, exc)
+                with self._lock:
+                    self.errors += 1
+                metrics.inc("stage_errors_total", stage=f"pipeline_{self.name}")
+                routes = []
+            t1 = time.perf_counter()
+            with self._lock:
+                self.items += 1
+                self.busy += t1 - t0
+                self.first = t0 if self.first is None else min(self.first, t0)
+                self.last = t1 if self.last is None else max(self.last, t1)
+            metrics.inc("pipeline_items_total", stage=self.name)
+            for target, out in routes:
+                if target is not None:
+                    target.inbox.put(out)     # bloquea si la cola está llena
+        with self._lock:
+            self._alive -= 1
+            finished = self._alive == 0
+        if finished:
+            for st in self.outputs:
+                st.producer_done()
+
+    # ─────────── informe ───────────
+    def sample(self) -> None:
+        depth = self.inbox.qsize()
+        self.depth_max = max(self.depth_max, depth)
+        self.depth_sum += depth
+        self.depth_n += 1
+        metrics.observe("pipeline_queue_depth", depth, buckets=DEPTH_BUCKETS, stage=self.name)
+
+    def report(self) -> StageReport:
+        active = (self.last - self.first) if self.first is not None else 0.0
+        return StageReport(
+            stage=self.name,
+            workers=self.workers,
+            items=self.items,
+            errors=self.errors,
+            busy_s=round(self.busy, 3),
+            active_s=round(active, 3),
+            rate=round(self.items / active, 2) if active > 0 else 0.0,
+            queue_max=self.depth_max,
+            queue_mean=round(self.depth_sum / self.depth_n, 2) if self.depth_n else 0.0,
+        )
+
+
+def _monitor(stages: list[Stage], stop: threading.Event, interval: float, log_every: float) -> None:
+    last_log = time.monotonic()
+    while not stop.wait(interval):
+        for st in stages:
+            st.sample()
+        if time.monotonic() - last_log >= log_every:
+            last_log = time.monotonic()
+            LOG.info("progreso: %s", " | ".join(
+                f"{st.name} {st.items} (cola {st.inbox.qsize()})" for st in stages
+            ))
+
+
+def format_report(reports: list[StageReport], wall: float) -> str:
+    lines = [f"{'etapa':<10}{'hilos':>6}{'items':>7}{'errores':>9}{'ocupado s':>11}"
+             f"{'activo s':>10}{'items/s':>9}{'cola máx':>10}{'cola media':>12}"]
+    for r in reports:
+        lines.append(
+            f"{r['stage']:<10}{r['workers']:>6}{r['items']:>7}{r['errors']:>9}"
+            f"{r['busy_s']:>11.2f}{r['active_s']:>10.2f}{r['rate']:>9.2f}"
+            f"{r['queue_max']:>10}{r['queue_mean']:>12.2f}"
+        )
+    lines.append(f"tiempo total: {wall:.2f}s (suma de tiempos ocupados: "
+                 f"{sum(r['busy_s'] for r in reports):.2f}s)")
+    return "\n".join(lines)
+
+
+# ─────────────────────────── Trabajo de cada etapa ───────────────────
+def _cpu_job(path: str, url: str, kind: str, clean: bool, threshold: float):
+    """
+    Se ejecuta en el pool de procesos: limpieza + nivel 1 + relevancia. Los
+    cursos vuelven en columnas (CourseBatch): la URL y los campos vacíos
+    no se repiten por fila en el pickle de vuelta.
+    """
+    from .cleaner import clean_html
+    from .course_batch import CourseBatch
+    from .engine import prepare_document
+
+    if clean and kind == "html":
+        clean_html(pathlib.Path(path))
+    prep = prepare_document(pathlib.Path(path), url, kind=kind, threshold=threshold)
+    prep["courses"] = CourseBatch.from_courses(prep["courses"])
+    return prep
+
+
+def run_pipeline(
+    records: Iterable[tuple[str, str, list[str]]],
+    *,
+    force: bool = False,
+    reuse: bool = True,
+    io_workers: int = 8,
+    cpu_workers: int | None = None,
+    llm_workers: int = 4,
+    queue_size: int = 32,
+    threshold: float | None = None,
+    pause: float = 0.0,
+    monitor_interval: float = 0.25,
+    log_every: float = 10.0,
+    out_dir: pathlib.Path | None = None,
+    on_record_done: Callable[[str, str], None] | None = None,
+) -> list[StageReport]:
+    """
+    Descarga y analiza `records` (universidad, carrera, [urls]) con las
+    etapas solapadas. Escribe courses_clean.csv, download_log.json, el
+    índice de búsqueda y el catálogo igual que `download` + `analyze`.
+
+    Con `out_dir` (modo shard) el CSV y el log van a esa partición y el
+    índice no se toca (lo pone al día `merge`). `on_record_done(univ,
+    prog)` se llama cuando todas las URLs de un registro están escritas
+    o han fallado en la descarga; si falla la extracción o el LLM no se
+    llama (el lease del ledger caduca y otro proceso lo reintenta).
+    """
+    from .analyzer import (
+        OUT_CSV, _course_rows, _write_rows, model_tag, open_outputs, previous_analysis,
+    )
+    from .catalog import current_document, get_catalog
+    from .downloader import fetch_page
+    from .engine import CONFIDENCE_THRESHOLD, EngineStats, complete_document
+    from .sink import CourseSink
+
+    threshold = CONFIDENCE_THRESHOLD if threshold is None else threshold
+    cpu_workers = cpu_workers or max(1, (os.cpu_count() or 2) - 1)
+    cat = get_catalog()
+    model = model_tag()
+    stats = EngineStats()
+    stats_lock = threading.Lock()
+    if out_dir is None:
+        out_csv, index = OUT_CSV, open_outputs()
+    else:
+        out_csv, index = pathlib.Path(out_dir) / OUT_CSV.name, None
+    log_path = out_csv.with_name("download_log.json")
+    fetched: list[dict] = []
+    pending: dict[tuple[str, str], int] = {}
+    pending_lock = threading.Lock()
+    pool = ProcessPoolExecutor(cpu_workers, mp_context=multiprocessing.get_context("spawn"))
+    sink = CourseSink(out_csv)
+
+    def settle(univ: str, prog: str, n: int) -> None:
+        """Descuenta `n` URLs pendientes del registro y avisa al terminar."""
+        if on_record_done is None:
+            return
+        with pending_lock:
+            left = pending.get((univ, prog), 0) + n
+            if left > 0:
+                pending[(univ, prog)] = left
+                return
+            pending.pop((univ, prog), None)
+        on_record_done(univ, prog)
+
+    # ─── etapas (en orden inverso para poder referenciarlas) ───
+    def write(item):
+        entry, rows, doc_id = item
+        _write_rows(sink, entry["university"], entry["program"], rows, index, doc_id)
+        settle(entry["university"], entry["program"], -1)
+        return []
+
+    def llm(item):
+        entry, prep = item
+        doc_id = cat.record_document(entry, model)
+        token = current_document.set(doc_id)
+        try:
+            result = complete_document(prep, entry["url"], entry["university"],
+                                       entry["program"], pause=pause)
+        finally:
+            current_document.reset(token)
+        cat.finish_document(doc_id, result["tier"], result["confidence"])
+        with stats_lock:
+            stats.record(result)
+        return [(writer, (entry, _course_rows(result["courses"]), doc_id))]
+
+    def extract(entry):
+        prep = pool.submit(
+            _cpu_job, entry["path"], entry["url"], entry.get("kind", "html").lower(),
+            not entry.get("cached", False), threshold,
+        ).result()
+        prep["courses"] = prep["courses"].to_courses()
+        return [(llm_stage, (entry, prep))]
+
+    def fetch(item):
+        # Las URLs de una carrera se descargan en el mismo hilo, una tras
+        # otra (cada una en su fichero, ver downloader._basename).
+        univ, prog, urls = item
+        routes: list[Route] = []
+        for url in urls:
+            info = fetch_page(url, university=univ, program=prog, force=force, clean=False)
+            cat.record_fetch(info)
+            fetched.append(info)
+            if info.get("error"):
+                LOG.warning("Descarga fallida %s: %s", url, info["error"])
+                continue
+            prev = previous_analysis(cat, info, model) if reuse and info.get("cached") else None
+            if prev is not None:
+                routes.append((writer, (info, cat.document_courses(prev["id"]), None)))
+            else:
+                routes.append((extractor, info))
+        # las rutas solo se encolan al volver: el writer no puede descontar antes
+        settle(univ, prog, len(routes))
+        return routes
+
+    writer = Stage("write", write, workers=1, queue_size=queue_size)
+    llm_stage = Stage("llm", llm, workers=llm_workers, queue_size=queue_size).feeds(writer)
+    extractor = Stage("extract", extract, workers=cpu_workers, queue_size=queue_size).feeds(llm_stage)
+    fetcher = Stage("fetch", fetch, workers=io_workers, queue_size=queue_size).feeds(extractor, writer)
+    fetcher.producers = 1                     # la fuente de registros
+    stages = [fetcher, extractor, llm_stage, writer]
+
+    stop = threading.Event()
+    mon = threading.Thread(target=_monitor, args=(stages, stop, monitor_interval, log_every),
+                           name="pipeline-monitor", daemon=True)
+    t0 = time.perf_counter()
+    for st in stages:
+        st.start()
+    mon.start()
+    try:
+        for record in records:
+            fetcher.inbox.put(record)
+        fetcher.producer_done()
+        for st in stages:
+            st.join()
+    finally:
+        stop.set()
+        mon.join()
+        pool.shutdown()
+        sink.close()
+        if index is not None:
+            index.mark_synced(OUT_CSV)
+            index.save()
+        tmp = log_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(fetched, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(log_path)
+    wall = time.perf_counter() - t0
+
+    reports = [st.report() for st in stages]
+    stats.log_summary(LOG)
+    LOG.info("Pipeline terminado en %.2fs\n%s", wall, format_report(reports, wall))
+    return reports
@@ -0,0 +1,283 @@
+# profiling.py
+# ──────────────────────────────────────────────────────────────
+# Perfilado opcional de peticiones lentas de la API.
+#
+# Dos modos, por petición:
+#   • explícito  → cabecera `X-Profile: 1` o query `?profile=1`:
+#                  cProfile completo de los hilos que ejecutan el trabajo
+#                  del endpoint. Las sesiones cProfile van de una en una
+#                  (en Python ≥ 3.12 dos perfiles activos a la vez fallan).
+#   • automático → desactivado por defecto; con PROFILE_SLOW_MS > 0, una
+#                  fracción PROFILE_SAMPLE_RATE de las peticiones lleva un
+#                  muestreador ligero (sys._current_frames cada
+#                  SAMPLE_INTERVAL s); si tarda más de PROFILE_SLOW_MS se
+#                  guarda, si no se descarta.
+#
+# En un endpoint asíncrono el cronómetro y las etapas cubren toda la
+# corrutina (descarga incluida); el muestreo y cProfile se enganchan a
+# los hilos del threadpool que ejecutan funciones `@profiled` dentro de
+# ella (el hilo del bucle de eventos lo comparten todas las peticiones).
+#
+# Cada perfil se guarda en data/output/profiles/<id>.json (URL, duración,
+# etapas de metrics.trace y funciones más costosas) junto con el volcado
+# descargable: <id>.prof (pstats, p. ej. para snakeviz) o <id>.folded
+# (pilas colapsadas, formato flamegraph).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import json
+import logging
+import os
+import pathlib
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Iterator
+
+from . import metrics
+
+LOG = logging.getLogger("profiling")
+
+PROFILE_DIR = pathlib.Path("data/output/profiles")
+SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))        # > 0 activa el modo automático
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.1"))  # fracción de peticiones muestreadas
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.01"))
+TOP_N = 25
+_ID_RE = re.compile(r"^[\w-]+$")
+
+# lo fija el middleware de la API a partir de la cabecera/query
+requested: contextvars.ContextVar[bool] = contextvars.ContextVar("profile_requested", default=False)
+
+# una sola sesión cProfile activa en el proceso
+_cprofile_lock = threading.Lock()
+
+
+class Sampler:
+    """Muestreador de pilas de unos hilos concretos, en un hilo demonio aparte."""
+
+    def __init__(self, thread_id: int | None = None, interval: float = SAMPLE_INTERVAL) -> None:
+        self.threads: set[int] = set() if thread_id is None else {thread_id}
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            threads = tuple(self.threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for tid in threads:
+                frame = frames.get(tid)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{pathlib.Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common())
+
+    def top(self, n: int = TOP_N) -> list[dict]:
+        """Funciones con más muestras propias (la hoja de la pila)."""
+        leaves: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [
+            {"function": fn, "samples": c, "share": round(c / total, 4)}
+            for fn, c in leaves.most_common(n)
+        ]
+
+
+def _cprofile_top(prof: cProfile.Profile, n: int = TOP_N) -> list[dict]:
+    stats = pstats.Stats(prof, stream=io.StringIO())
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        rows.append({
+            "function": f"{pathlib.Path(filename).name}:{func}:{line}",
+            "calls": nc,
+            "tottime": round(tt, 6),
+            "cumtime": round(ct, 6),
+        })
+    return sorted(rows, key=lambda r: r["cumtime"], reverse=True)[:n]
+
+
+def _save(meta: dict, dump_name: str, dump: Callable[[pathlib.Path], None]) -> None:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    dump(PROFILE_DIR / dump_name)
+    (PROFILE_DIR / f"{meta['id']}.json").write_text(
+        json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    LOG.info("profile %s guardado (%s, %.0f ms) para %s",
+             meta["id"], meta["mode"], meta["elapsed_ms"], meta["url"])
+
+
+class _Session:
+    """Perfil en curso de una petición: cProfile (explícito) o muestreo."""
+
+    def __init__(self, explicit: bool) -> None:
+        self.explicit = explicit
+        self.prof = cProfile.Profile() if explicit else None
+        self.sampler = None if explicit else Sampler().start()
+
+    @contextlib.contextmanager
+    def attach(self) -> Iterator[None]:
+        """Perfila el hilo actual mientras dure el bloque."""
+        if self.prof is not None:
+            with _cprofile_lock:
+                self.prof.enable()
+                try:
+                    yield
+                finally:
+                    self.prof.disable()
+        else:
+            tid = threading.get_ident()
+            self.sampler.threads.add(tid)
+            try:
+                yield
+            finally:
+                self.sampler.threads.discard(tid)
+
+    def stop(self) -> None:
+        if self.sampler is not None:
+            self.sampler.stop()
+
+
+_session: contextvars.ContextVar[_Session | None] = contextvars.ContextVar("profile_session", default=None)
+
+
+def _wanted() -> bool | None:
+    """True: cProfile · False: muestreo · None: esta petición no se perfila."""
+    if requested.get():
+        return True
+    if SLOW_MS > 0 and random.random() < SAMPLE_RATE:
+        return False
+    return None
+
+
+@contextlib.contextmanager
+def _profiling(explicit: bool, fn: Callable, url: Callable[[], str]) -> Iterator[_Session]:
+    """Sesión de perfilado alrededor de una llamada; la guarda si toca."""
+    session = _Session(explicit)
+    token = _session.set(session)
+    t0 = time.perf_counter()
+    with metrics.trace() as stages:
+        try:
+            yield session
+        finally:
+            _session.reset(token)
+            session.stop()
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            if explicit or elapsed_ms >= SLOW_MS:
+                _store(session, fn, url(), elapsed_ms, list(stages))
+
+
+def _store(session: _Session, fn: Callable, url: str, elapsed_ms: float, stages: list) -> None:
+    pid = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    meta = {
+        "id": pid,
+        "url": url,
+        "endpoint": fn.__name__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "elapsed_ms": round(elapsed_ms, 1),
+        "mode": "cprofile" if session.explicit else "sampling",
+        "stages": stages,
+    }
+    try:
+        if session.prof is not None:
+            meta["top"] = _cprofile_top(session.prof)
+            meta["dump"] = f"{pid}.prof"
+            _save(meta, meta["dump"], session.prof.dump_stats)
+        else:
+            sampler = session.sampler
+            meta["top"] = sampler.top()
+            meta["samples"] = sum(sampler.stacks.values())
+            meta["dump"] = f"{pid}.folded"
+            _save(meta, meta["dump"],
+                  lambda p: p.write_text(sampler.folded(), encoding="utf-8"))
+    except Exception as exc:
+        LOG.warning("No se pudo guardar el perfil: %s", exc)
+
+
+def profiled(label: Callable[..., str]) -> Callable:
+    """
+    Decorador para endpoints: perfila la llamada si se pidió explícitamente
+    o (modo automático) si supera SLOW_MS. `label(*args, **kwargs)` devuelve
+    la URL/descripción que se guarda con el perfil.
+
+    Sobre una corrutina, la sesión cubre toda la corrutina; una función
+    síncrona `@profiled` llamada dentro de ella (en el threadpool) no abre
+    otra sesión, sino que engancha su hilo a la de la corrutina.
+    """
+    def deco(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                mode = _wanted()
+                if mode is None:
+                    return await fn(*args, **kwargs)
+                with _profiling(mode, fn, lambda: label(*args, **kwargs)):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            session = _session.get()
+            if session is not None:
+                with session.attach():
+                    return fn(*args, **kwargs)
+            mode = _wanted()
+            if mode is None:
+                return fn(*args, **kwargs)
+            with _profiling(mode, fn, lambda: label(*args, **kwargs)) as session, session.attach():
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ─────────────────────────── Consulta ────────────────────────────────
+def list_profiles() -> list[dict]:
+    """Resumen de los perfiles guardados, del más reciente al más antiguo."""
+    out = []
+    for p in sorted(PROFILE_DIR.glob("*.json"), reverse=True):
+        meta = json.loads(p.read_text(encoding="utf-8"))
+        out.append({k: meta.get(k) for k in ("id", "url", "endpoint", "created", "elapsed_ms", "mode")})
+    return out
+
+
+def load_profile(pid: str) -> dict | None:
+    if not _ID_RE.match(pid):
+        return None
+    p = PROFILE_DIR / f"{pid}.json"
+    return json.loads(p.read_text(encoding="utf-8")) if p.exists() else None
+
+
+def dump_path(pid: str) -> pathlib.Path | None:
+    meta = load_profile(pid)
+    if meta is None:
+        return None
+    p = PROFILE_DIR / meta["dump"]
+    return p if p.exists() else None
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import json
 import logging
 import pathlib
 import sys
+from typing import Iterator
 
 import pandas as pd
 
 from .downloader import fetch_page
 from .utils import split_urls
+from . import metrics
 
 PROG_COL = "Carrera"
 
@@ -21,34 +24,93 @@ logging.basicConfig(
 
 # ——————————————————— Sub-comandos ——————————————————————
 
+def _records(args: argparse.Namespace) -> Iterator[tuple[str, str, list[str]]]:
+    """Registros de entrada: el libro (--xlsx) en streaming o el CSV de --csv."""
+    if args.xlsx:
+        from construir_csv import HOJAS, iter_registros
+
+        hojas = [h.strip() for h in args.hojas.split(",")] if args.hojas else HOJAS
+        return iter_registros(args.xlsx, hojas)
+    return _links_from_csv(args.csv)
+
+
+def _init_hosts(args: argparse.Namespace) -> None:
+    """Con --reprobe, los hosts caídos del log previo reciben una petición de prueba."""
+    from .hosts import reset_tracker
+
+    if args.reprobe:
+        reset_tracker(reprobe=True)
+
+
+def _report_hosts() -> None:
+    from .hosts import get_tracker
+
+    down = get_tracker().summary()
+    if down:
+        print(f"\n{len(down)} hosts caídos (se saltan en la próxima ejecución; --reprobe para reintentar):")
+        for host, st in sorted(down.items()):
+            print(f"  {host:<40}{st.get('reason', '')}")
+
+
+def _links_from_csv(path: str) -> Iterator[tuple[str, str, list[str]]]:
+    """(universidad, carrera, [urls]) de un CSV Universidad,Carrera,Enlace."""
+    for _, row in pd.read_csv(path).iterrows():
+        yield row["Universidad"], row[PROG_COL], list(split_urls(row["Enlace"]))
+
+
 def cmd_download(args: argparse.Namespace) -> None:
     """
-    Lee data/Universidades3.csv, descarga cada enlace (HTML o PDF) y guarda
-    data/output/download_log.json con los metadatos de la operación.
+    Lee el CSV de --csv (o, con --xlsx, las hojas del libro en streaming),
+    descarga cada enlace (HTML o PDF) y registra cada descarga en el catálogo
+    (data/output/catalog.sqlite); al final se exporta también
+    data/output/download_log.json por compatibilidad.
     """
-    links = pd.read_csv("data/Salida.csv")
-    meta: list[dict] = []
+    from .catalog import get_catalog
 
-    for _, row in links.iterrows():
-        university = row["Universidad"]
-        program = row[PROG_COL]
+    _init_hosts(args)
+    records = _records(args)
+    cat = get_catalog()
+    meta: list[dict] = []
 
-        for url in split_urls(row["Enlace"]):
-            meta.append(
-                fetch_page(
-                    url,
-                    university=university,
-                    program=program,
-                    force=args.force,
-                )
-            )
+    if args.use_async:
+        asyncio.run(_download_async(records, cat, meta, args))
+    else:
+        _download_sync(records, cat, meta, args)
 
     pathlib.Path("data/output").mkdir(parents=True, exist_ok=True)
     with open("data/output/download_log.json", "w", encoding="utf-8") as fh:
         json.dump(meta, fh, ensure_ascii=False, indent=2)
+    _report_hosts()
+
+
+def _download_sync(records, cat, meta: list[dict], args: argparse.Namespace) -> None:
+    for university, program, urls in records:
+        infos = [
+            fetch_page(url, university=university, program=program, force=args.force)
+            for url in urls
+        ]
+        with cat.batch():
+            for info in infos:
+                cat.record_fetch(info)
+        meta.extend(infos)
 
 
-def cmd_analyze(_args: argparse.Namespace) -> None:
+async def _download_async(records, cat, meta: list[dict], args: argparse.Namespace) -> None:
+    """Todas las descargas en un bucle de eventos (ver fetch_page_async)."""
+    from .downloader import aclose_async_client, fetch_many_async
+
+    try:
+        async for infos in fetch_many_async(records, concurrency=args.concurrency,
+                                            force=args.force):
+            with cat.batch():
+                for info in infos:
+                    cat.record_fetch(info)
+            meta.extend(infos)
+    finally:
+        await aclose_async_client()
+
+
+def cmd_analyze(args: argparse.Namespace) -> None:
     """
     Llama al módulo analyzer.py que usa GPT para leer los archivos descargados
     y generar data/output/courses_clean.csv con:
@@ -56,7 +118,144 @@ def cmd_analyze(_args: argparse.Namespace) -> None:
     """
     # Importación diferida para no cargar openai si solo se hace download
     from . import analyzer
-    analyzer.analyze()
+
+    client = None
+    if args.batch:
+        from .batch import LocalBatchClient, OpenAIBatchClient
+        client = LocalBatchClient() if args.local else OpenAIBatchClient()
+    # el sustituto local termina en segundos: no tiene sentido esperar un minuto
+    poll = args.poll if args.poll is not None else (1.0 if args.local else 60.0)
+    analyzer.analyze(batch=args.batch, client=client, poll=poll,
+                     reuse=not args.reanalyze)
+
+
+def cmd_index(args: argparse.Namespace) -> None:
+    """
+    Construye o pone al día el índice de búsqueda (data/output/course_index.json)
+    a partir de los CSV de Anexos/ y del CSV del pipeline.
+    """
+    from .course_index import INDEX_PATH, CourseIndex
+
+    index = CourseIndex() if args.rebuild else CourseIndex.load(INDEX_PATH)
+    index.sync()
+    index.save()
+
+
+def cmd_search(args: argparse.Namespace) -> None:
+    """Consulta el índice y muestra los programas que contienen el término."""
+    from .course_index import CourseIndex
+
+    index = CourseIndex.load()
+    index.sync()
+    res = index.search(" ".join(args.query), prefix=args.prefix,
+                       region=args.region, university=args.university, limit=args.limit)
+    print(f"{res['total']} cursos en {len(res['programs'])} programas ({res['took_ms']} ms)")
+    for p in res["programs"][:args.limit]:
+        print(f"  [{p['region']}] {p['university']} | {p['program']} ({p['matches']})")
+    if index.dirty:
+        index.save()
+
+
+def cmd_export(args: argparse.Namespace) -> None:
+    """
+    Regenera los JSON del Frontend (nubes de palabras, créditos, boxplot y
+    temas por región) con los cursos casi duplicados agrupados por id canónico.
+    """
+    from .exports import export_frontend
+
+    for path in export_frontend(pathlib.Path(args.out), dedup=not args.no_dedup,
+                                clouds=args.clouds, rebuild_topics=args.rebuild_topics):
+        print(f"  → {path}")
+
+
+def cmd_run(args: argparse.Namespace) -> None:
+    """
+    download + analyze en una sola pasada con las etapas solapadas
+    (ver pipeline.py): descargas, extracción y GPT avanzan a la vez.
+    """
+    from . import shards
+    from .pipeline import run_pipeline
+
+    _init_hosts(args)
+    records = _records(args)
+    out_dir = on_done = None
+    if args.shard:
+        try:
+            i, n = shards.parse_shard(args.shard)
+        except ValueError as exc:
+            raise SystemExit(str(exc))
+        records = shards.select_shard(records, i, n)
+        out_dir = shards.partition_dir(f"{i}-of-{n}")
+    elif args.ledger:
+        # cada proceso siembra (idempotente) y luego reclama con lease
+        ledger = shards.Ledger(pathlib.Path(args.ledger))
+        ledger.seed(records)
+        worker = args.worker or shards.default_worker()
+        records = ledger.claimed(worker, lease=args.lease)
+        out_dir = shards.partition_dir(worker)
+        on_done = lambda univ, prog: ledger.complete(worker, univ, prog)  # noqa: E731
+
+    run_pipeline(
+        records,
+        force=args.force,
+        reuse=not args.reanalyze,
+        io_workers=args.io_workers,
+        cpu_workers=args.cpu_workers,
+        llm_workers=args.llm_workers,
+        queue_size=args.queue_size,
+        out_dir=out_dir,
+        on_record_done=on_done,
+    )
+    _report_hosts()
+
+
+def cmd_merge(args: argparse.Namespace) -> None:
+    """Combina las particiones de `run --shard/--ledger` en la salida final."""
+    from . import shards
+
+    ledger = shards.Ledger(pathlib.Path(args.ledger)) if args.ledger else None
+    rows, fetches = shards.merge_partitions(pathlib.Path(args.shards_dir), ledger)
+    print(f"courses_clean.csv: {rows} cursos · download_log.json: {fetches} descargas")
+
+
+def cmd_ledger(args: argparse.Namespace) -> None:
+    """Estado del ledger compartido (y, con --requeue, reencola fallidos/caducados)."""
+    from . import shards
+
+    ledger = shards.Ledger(pathlib.Path(args.path))
+    if args.requeue:
+        print(f"reencolados: {ledger.requeue()}")
+    st = ledger.status()
+    print(f"pendientes {st['pending']} · en curso {st['leased']} · caducados {st['expired']}"
+          f" · hechos {st['done']} · fallidos {st['failed']}")
+    for owner, n in sorted(st["owners"].items()):
+        print(f"  {owner:<40}{n:>6}")
+
+
+def _add_input_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="ignora caché y re-descarga aunque el archivo exista",
+    )
+    parser.add_argument(
+        "--csv",
+        default="data/Salida.csv",
+        help="CSV Universidad,Carrera,Enlace con los enlaces a procesar",
+    )
+    parser.add_argument(
+        "--xlsx",
+        help="lee los enlaces directamente de este libro (p. ej. Universidades.xlsx)",
+    )
+    parser.add_argument(
+        "--hojas",
+        help="con --xlsx: hojas a procesar separadas por comas (por defecto todas las configuradas)",
+    )
+    parser.add_argument(
+        "--reprobe",
+        action="store_true",
+        help="vuelve a probar los hosts que el download_log anterior marcó como caídos",
+    )
 
 
 # ——————————————————— CLI principal ——————————————————————
@@ -66,13 +265,93 @@ if __name__ == "__main__":
     sub = p.add_subparsers(dest="cmd", required=True)
 
     d = sub.add_parser("download", help="descarga html/pdf")
-    d.add_argument(
-        "--force",
+    _add_input_args(d)
+    d.add_argument("--async", dest="use_async", action="store_true",
+                   help="descarga con asyncio/httpx (HTTP/2 si está `h2`) en vez de hilos bloqueantes")
+    d.add_argument("--concurrency", type=int, default=500,
+                   help="con --async: registros en vuelo a la vez")
+
+    a = sub.add_parser("analyze", help="extrae cursos directamente con GPT")
+    a.add_argument(
+        "--batch",
         action="store_true",
-        help="ignora caché y re-descarga aunque el archivo exista",
+        help="envía los chunks como un job de la Batch API (más barato, asíncrono)",
+    )
+    a.add_argument(
+        "--local",
+        action="store_true",
+        help="con --batch: usa el sustituto local en vez de OpenAI (pruebas offline)",
     )
+    a.add_argument(
+        "--reanalyze",
+        action="store_true",
+        help="vuelve a analizar aunque el catálogo ya tenga ese contenido con el mismo modelo",
+    )
+    a.add_argument(
+        "--poll",
+        type=float,
+        default=None,
+        help="con --batch: segundos entre consultas de estado (60; 1 con --local)",
+    )
+
+    r = sub.add_parser("run", help="download + analyze en pipeline (etapas solapadas)")
+    _add_input_args(r)
+    r.add_argument("--reanalyze", action="store_true",
+                   help="vuelve a analizar aunque el catálogo ya tenga ese contenido")
+    r.add_argument("--io-workers", type=int, default=8, help="hilos de descarga")
+    r.add_argument("--cpu-workers", type=int, default=None,
+                   help="procesos de limpieza/extracción (por defecto nº de CPUs - 1)")
+    r.add_argument("--llm-workers", type=int, default=4, help="llamadas concurrentes al LLM")
+    r.add_argument("--queue-size", type=int, default=32,
+                   help="capacidad de cada cola entre etapas (backpressure)")
+    mode = r.add_mutually_exclusive_group()
+    mode.add_argument("--shard", metavar="i/N",
+                      help="procesa solo el shard i de N (reparto determinista por universidad+carrera)")
+    mode.add_argument("--ledger", metavar="PATH", nargs="?", const="data/output/ledger.sqlite",
+                      help="reparto dinámico con leases sobre un ledger SQLite compartido")
+    r.add_argument("--worker", help="con --ledger: nombre del proceso (por defecto host-pid)")
+    r.add_argument("--lease", type=float, default=1800.0,
+                   help="con --ledger: segundos antes de que otro proceso retome un registro")
 
-    sub.add_parser("analyze", help="extrae cursos directamente con GPT")
+    m = sub.add_parser("merge", help="combina las particiones de run --shard/--ledger")
+    m.add_argument("--shards-dir", default="data/output/shards")
+    m.add_argument("--ledger", metavar="PATH",
+                   help="toma cada registro solo de la partición que lo completó")
+
+    lg = sub.add_parser("ledger", help="estado del ledger de run --ledger")
+    lg.add_argument("--path", default="data/output/ledger.sqlite")
+    lg.add_argument("--requeue", action="store_true",
+                    help="devuelve a pendientes los registros fallidos y los leases caducados")
+
+    i = sub.add_parser("index", help="construye/actualiza el índice de búsqueda de cursos")
+    i.add_argument("--rebuild", action="store_true", help="descarta el índice y lo rehace")
+
+    s = sub.add_parser("search", help="busca cursos en el índice")
+    s.add_argument("query", nargs="*", help="términos (el último admite `*` de prefijo)")
+    s.add_argument("--prefix", action="store_true", help="el último término es un prefijo")
+    s.add_argument("--region", help="Colombia, World…")
+    s.add_argument("--university", help="filtra por universidad")
+    s.add_argument("--limit", type=int, default=20)
+
+    e = sub.add_parser("export", help="genera los JSON del Frontend desde el índice")
+    e.add_argument("--out", default="../Frontend/src/api", help="carpeta de salida")
+    e.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="cuenta cada fila tal cual, sin agrupar casi duplicados",
+    )
+    e.add_argument(
+        "--clouds",
+        choices=("png", "svg", "webp"),
+        help="renderiza también la nube de cada región en ese formato",
+    )
+    e.add_argument(
+        "--rebuild-topics",
+        action="store_true",
+        help="reentrena el modelo de temas desde cero con un vocabulario nuevo",
+    )
 
     args = p.parse_args()
-    {"download": cmd_download, "analyze": cmd_analyze}[args.cmd](args)
+    {"download": cmd_download, "analyze": cmd_analyze,
+     "run": cmd_run, "merge": cmd_merge, "ledger": cmd_ledger, "index": cmd_index, "search": cmd_search, "export": cmd_export}[args.cmd](args)
+    print("\n" + metrics.summary_table())
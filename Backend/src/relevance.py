@@ -0,0 +1,202 @@
+# relevance.py
+# ──────────────────────────────────────────────────────────────
+# Filtro de relevancia previo al LLM.
+#
+# Trocea el texto plano de una página en ventanas de líneas, puntúa
+# cada ventana según lo “curricular” que parece (mismas señales que
+# usa el extractor: HEADERS_RE, BAD_PAT, looks_like_course_row, …) y
+# devuelve solo las mejores. Si el extractor determinista ya produjo
+# cursos con buena confianza no se envía nada al modelo.
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import logging
+from typing import Sequence, TypedDict
+
+from .extractor import (
+    BAD_PAT,
+    CODE_RE,
+    CONFIDENCE_THRESHOLD,
+    CREDITS_RE,
+    HEADERS_RE,
+    Course,
+    looks_like_course_row,
+    normalize_line,
+    score_confidence,
+)
+
+LOG = logging.getLogger("relevance")
+
+# ─────────────────────────── Configuración ────────────────────────────
+WINDOW_CHARS = 1_500        # tamaño objetivo de cada ventana
+MAX_CHARS = 20_000          # presupuesto total que se reenvía al LLM
+MIN_SCORE = 0.25            # umbral para considerar una ventana curricular
+FALLBACK_WINDOWS = 2        # si ninguna pasa el umbral, se envían las N mejores
+CHARS_PER_TOKEN = 4         # aproximación estándar para texto latino
+
+
+class Window(TypedDict):
+    index: int
+    text: str
+    score: float
+
+
+class RelevanceReport(TypedDict):
+    windows: list[str]
+    n_windows: int
+    kept: int
+    skipped: bool
+    tokens_in: int
+    tokens_out: int
+    tokens_saved: int
+
+
+# ──────────────────────────────────────────────────────────────
+def estimate_tokens(text: str) -> int:
+    """Estimación barata de tokens (≈ 4 caracteres por token)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def courses_confident(courses: Sequence[Course] | None) -> bool:
+    """True si la salida del extractor determinista basta por sí sola."""
+    return bool(courses) and score_confidence(list(courses)) >= CONFIDENCE_THRESHOLD
+
+
+def _cut_lines(text: str, width: int):
+    """Líneas no vacías de `text`, cortadas a trozos de como mucho `width`."""
+    for ln in text.splitlines():
+        ln = ln.strip()
+        while len(ln) > width:
+            cut = ln.rfind(" ", 0, width + 1)
+            if cut <= 0:
+                cut = width
+            yield ln[:cut].rstrip()
+            ln = ln[cut:].lstrip()
+        if ln:
+            yield ln
+
+
+def split_windows(text: str, window_chars: int = WINDOW_CHARS) -> list[str]:
+    """
+    Agrupa líneas no vacías en ventanas de ~`window_chars` caracteres.
+    Las líneas más largas que una ventana se trocean para que ninguna
+    ventana supere `window_chars` (y `select_windows` no la descarte).
+    """
+    windows: list[str] = []
+    current: list[str] = []
+    size = 0
+    for ln in _cut_lines(text, window_chars):
+        if current and size + len(ln) > window_chars:
+            windows.append("\n".join(current))
+            current, size = [], 0
+        current.append(ln)
+        size += len(ln) + 1
+    if current:
+        windows.append("\n".join(current))
+    return windows
+
+
+def _ml_votes(lines: list[str]) -> dict[str, int]:
+    """Predicción del filtro ML en un solo lote; {} si no está disponible."""
+    from . import extractor
+
+    if not extractor._ML_READY or not lines:
+        return {}
+    try:
+        uniq = list(dict.fromkeys(lines))
+        return dict(zip(uniq, (int(v) for v in extractor.ml_predict(uniq))))
+    except Exception as exc:
+        LOG.debug("ML votes unavailable: %s", exc)
+        return {}
+
+
+def score_window(text: str, ml: dict[str, int] | None = None) -> float:
+    """
+    Puntuación en [0, ~1.5]:
+      + proporción de líneas con pinta de curso
+      + proporción de líneas con código o créditos
+      + bonus si aparece un encabezado curricular
+      + proporción de votos positivos del filtro ML
+      − proporción de líneas administrativas (tasas, admisión, contacto…)
+    """
+    # normalize_line recorta " –-": los separadores ("-----") quedan vacíos
+    lines = [ln for ln in map(normalize_line, text.splitlines()) if ln]
+    if not lines:
+        return 0.0
+    n = len(lines)
+    course = sum(looks_like_course_row(ln) for ln in lines) / n
+    structured = sum(
+        bool(CREDITS_RE.search(ln)) or bool(CODE_RE.match(ln.split()[0]))
+        for ln in lines
+    ) / n
+    bad = sum(bool(BAD_PAT.search(ln)) for ln in lines) / n
+    header = 0.25 if HEADERS_RE.search(text) else 0.0
+
+    score = 0.5 * course + 0.5 * structured + header - 0.5 * bad
+    if ml:
+        votes = [ml[ln] for ln in lines if ln in ml]
+        if votes:
+            score = 0.75 * score + 0.25 * (sum(votes) / len(votes))
+    return round(score, 4)
+
+
+def rank_windows(text: str, window_chars: int = WINDOW_CHARS) -> list[Window]:
+    """Devuelve las ventanas del texto ordenadas por puntuación descendente."""
+    raw = split_windows(text, window_chars)
+    ml = _ml_votes(
+        [ln for w in raw for ln in map(normalize_line, w.splitlines()) if ln]
+    )
+    ranked = [
+        Window(index=i, text=w, score=score_window(w, ml)) for i, w in enumerate(raw)
+    ]
+    return sorted(ranked, key=lambda w: w["score"], reverse=True)
+
+
+def select_windows(
+    text: str,
+    *,
+    courses: Sequence[Course] | None = None,
+    max_chars: int = MAX_CHARS,
+    min_score: float = MIN_SCORE,
+    window_chars: int = WINDOW_CHARS,
+) -> RelevanceReport:
+    """
+    Entry-point público: decide qué parte de `text` merece ir al LLM.
+
+    - Si `courses` (salida del extractor) es de alta confianza → ninguna.
+    - Si no, las ventanas con score ≥ `min_score` hasta `max_chars`,
+      reordenadas en su orden original para no romper el contexto.
+    - Si ninguna supera el umbral, las `FALLBACK_WINDOWS` mejores.
+    """
+    tokens_in = estimate_tokens(text)
+
+    if courses_confident(courses):
+        return RelevanceReport(
+            windows=[], n_windows=0, kept=0, skipped=True,
+            tokens_in=tokens_in, tokens_out=0, tokens_saved=tokens_in,
+        )
+
+    ranked = rank_windows(text, window_chars)
+    chosen = [w for w in ranked if w["score"] >= min_score]
+    if not chosen:
+        chosen = ranked[:FALLBACK_WINDOWS]
+
+    kept: list[Window] = []
+    budget = max_chars
+    for w in chosen:
+        if len(w["text"]) > budget:
+            continue
+        kept.append(w)
+        budget -= len(w["text"])
+
+    windows = [w["text"] for w in sorted(kept, key=lambda w: w["index"])]
+    tokens_out = sum(estimate_tokens(w) for w in windows)
+    return RelevanceReport(
+        windows=windows,
+        n_windows=len(ranked),
+        kept=len(windows),
+        skipped=False,
+        tokens_in=tokens_in,
+        tokens_out=tokens_out,
+        tokens_saved=max(tokens_in - tokens_out, 0),
+    )
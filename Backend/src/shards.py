@@ -0,0 +1,383 @@
+# shards.py
+# ──────────────────────────────────────────────────────────────
+# Reparto del trabajo entre varios procesos o máquinas.
+#
+# Dos modos (ver `run` en prueba.py):
+#
+#   --shard i/N    reparto determinista sin coordinación: cada registro
+#                  (universidad, carrera) va al shard hash(clave) % N.
+#                  Todas las URLs de una carrera caen en el mismo shard
+#                  (se descargan y escriben juntas).
+#
+#   --ledger PATH  reparto dinámico con un libro de trabajo SQLite
+#                  compartido: cada proceso reclama registros con un
+#                  "lease" y los marca como hechos al escribirlos. Si un
+#                  proceso muere, su lease caduca y otro los retoma. El
+#                  fichero debe estar en un disco con bloqueos POSIX
+#                  fiables (local o NFSv4); si no, usar --shard.
+#
+# Cada proceso escribe su partición en data/output/shards/<nombre>/
+# (courses_clean.csv + download_log.json) y `merge` las combina en
+# data/output/courses_clean.csv y download_log.json, e importa las
+# descargas al catálogo.
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import pathlib
+import socket
+import sqlite3
+import time
+from typing import Iterable, Iterator, TypedDict
+
+LOG = logging.getLogger("shards")
+
+SHARDS_DIR = pathlib.Path("data/output/shards")
+LEDGER_PATH = pathlib.Path("data/output/ledger.sqlite")
+LEASE_SECONDS = 1800.0
+MAX_ATTEMPTS = 3
+
+Record = tuple[str, str, list[str]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work (
+    key         TEXT PRIMARY KEY,
+    university  TEXT NOT NULL,
+    program     TEXT NOT NULL,
+    urls        TEXT NOT NULL,               -- JSON
+    state       TEXT NOT NULL DEFAULT 'pending',  -- pending | leased | done | failed
+    owner       TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    done_at     REAL
+);
+CREATE INDEX IF NOT EXISTS ix_work_state ON work(state, lease_until);
+"""
+
+
+class LedgerStatus(TypedDict):
+    pending: int
+    leased: int
+    expired: int
+    done: int
+    failed: int
+    owners: dict[str, int]
+
+
+# ─────────────────────────── Shards fijos ────────────────────────────
+def record_key(university: str, program: str) -> str:
+    return f"{university.strip().casefold()}\t{program.strip().casefold()}"
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """"2/4" → (2, 4). Los shards se numeran desde 1."""
+    try:
+        i, n = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"shard inválido {spec!r}: se espera i/N") from None
+    if not 1 <= i <= n:
+        raise ValueError(f"shard inválido {spec!r}: i debe estar entre 1 y N")
+    return i, n
+
+
+def shard_of(university: str, program: str, n: int) -> int:
+    """Shard (1..n) de un registro; estable entre procesos y máquinas."""
+    h = hashlib.blake2b(record_key(university, program).encode("utf-8"), digest_size=8)
+    return int.from_bytes(h.digest(), "big") % n + 1
+
+
+def select_shard(records: Iterable[Record], i: int, n: int) -> Iterator[Record]:
+    for univ, prog, urls in records:
+        if shard_of(univ, prog, n) == i:
+            yield univ, prog, urls
+
+
+def partition_dir(name: str) -> pathlib.Path:
+    return SHARDS_DIR / name
+
+
+def default_worker() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+# ─────────────────────────── Ledger con leases ───────────────────────
+class Ledger:
+    """
+    Libro de trabajo compartido. Una conexión por proceso (no compartir
+    entre hilos): `claim` y `complete` se llaman desde hilos distintos
+    del pipeline, así que cada operación abre su propia transacción
+    con un lock de escritura (BEGIN IMMEDIATE).
+    """
+
+    def __init__(self, path: pathlib.Path = LEDGER_PATH) -> None:
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        con = self._connect()
+        try:
+            con.executescript(SCHEMA)
+        finally:
+            con.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def seed(self, records: Iterable[Record]) -> int:
+        """
+        Da de alta los registros (idempotente: si otro proceso ya los
+        sembró, no cambia nada). Las filas repetidas de una misma carrera
+        se agrupan. Devuelve cuántos registros nuevos se añadieron.
+        """
+        merged: dict[str, Record] = {}
+        for univ, prog, urls in records:
+            key = record_key(univ, prog)
+            if key in merged:
+                merged[key][2].extend(u for u in urls if u not in merged[key][2])
+            else:
+                merged[key] = (univ, prog, list(urls))
+        con = self._connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            before = con.total_changes
+            con.executemany(
+                "INSERT OR IGNORE INTO work (key, university, program, urls) VALUES (?, ?, ?, ?)",
+                ((k, u, p, json.dumps(urls, ensure_ascii=False)) for k, (u, p, urls) in merged.items()),
+            )
+            added = con.total_changes - before
+            con.execute("COMMIT")
+        finally:
+            con.close()
+        LOG.info("Ledger %s: %d registros nuevos (%d en la entrada)", self.path, added, len(merged))
+        return added
+
+    def claim(self, owner: str, n: int = 1, lease: float = LEASE_SECONDS) -> list[Record]:
+        """
+        Reclama hasta `n` registros pendientes (o con el lease caducado).
+        Los leases caducados que ya agotaron MAX_ATTEMPTS pasan a 'failed'.
+        """
+        now = time.time()
+        con = self._connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            failed = con.execute(
+                "UPDATE work SET state = 'failed', owner = NULL WHERE state = 'leased'"
+                " AND lease_until < ? AND attempts >= ?",
+                (now, MAX_ATTEMPTS),
+            ).rowcount
+            if failed:
+                LOG.warning("Ledger: %d registros descartados tras %d intentos", failed, MAX_ATTEMPTS)
+            rows = con.execute(
+                "SELECT key, university, program, urls FROM work"
+                " WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?)"
+                " ORDER BY rowid LIMIT ?",
+                (now, n),
+            ).fetchall()
+            out: list[Record] = []
+            for key, univ, prog, urls in rows:
+                con.execute(
+                    "UPDATE work SET state = 'leased', owner = ?, lease_until = ?,"
+                    " attempts = attempts + 1 WHERE key = ?",
+                    (owner, now + lease, key),
+                )
+                out.append((univ, prog, json.loads(urls)))
+            con.execute("COMMIT")
+        finally:
+            con.close()
+        return out
+
+    def claimed(self, owner: str, *, batch: int = 4, lease: float = LEASE_SECONDS) -> Iterator[Record]:
+        """Generador que reclama por lotes a medida que se consume."""
+        while True:
+            rows = self.claim(owner, batch, lease)
+            if not rows:
+                return
+            yield from rows
+
+    def complete(self, owner: str, university: str, program: str) -> bool:
+        """Marca un registro como hecho. False si el lease ya no era nuestro."""
+        con = self._connect()
+        try:
+            cur = con.execute(
+                "UPDATE work SET state = 'done', done_at = ?, lease_until = NULL"
+                " WHERE key = ? AND owner = ? AND state = 'leased'",
+                (time.time(), record_key(university, program), owner),
+            )
+        finally:
+            con.close()
+        if cur.rowcount == 0:
+            LOG.warning("Ledger: lease perdido para %s / %s (%s)", university, program, owner)
+        return cur.rowcount > 0
+
+    def requeue(self) -> int:
+        """Devuelve a 'pending' los registros fallidos y los leases caducados."""
+        con = self._connect()
+        try:
+            cur = con.execute(
+                "UPDATE work SET state = 'pending', owner = NULL, lease_until = NULL, attempts = 0"
+                " WHERE state = 'failed' OR (state = 'leased' AND lease_until < ?)",
+                (time.time(),),
+            )
+        finally:
+            con.close()
+        return cur.rowcount
+
+    def owners(self) -> dict[str, str]:
+        """{clave: propietario} de los registros terminados."""
+        con = self._connect()
+        try:
+            return dict(con.execute("SELECT key, owner FROM work WHERE state = 'done'"))
+        finally:
+            con.close()
+
+    def status(self) -> LedgerStatus:
+        now = time.time()
+        con = self._connect()
+        try:
+            counts = dict(con.execute("SELECT state, COUNT(*) FROM work GROUP BY state"))
+            expired = con.execute(
+                "SELECT COUNT(*) FROM work WHERE state = 'leased' AND lease_until < ?", (now,)
+            ).fetchone()[0]
+            owners = dict(con.execute(
+                "SELECT owner, COUNT(*) FROM work WHERE state = 'done' GROUP BY owner"
+            ))
+        finally:
+            con.close()
+        return LedgerStatus(
+            pending=counts.get("pending", 0), leased=counts.get("leased", 0) - expired,
+            expired=expired, done=counts.get("done", 0), failed=counts.get("failed", 0),
+            owners=owners,
+        )
+
+
+# ─────────────────────────── Merge ───────────────────────────────────
+def _partition_spans(src: pathlib.Path) -> dict[str, list[list[int]]] | None:
+    """Índice lateral de una partición; None si falta o no cubre todo el CSV."""
+    from .sink import index_path_for
+
+    try:
+        spans = json.loads(index_path_for(src).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    end = max((off + length for ranges in spans.values() for off, length, _n in ranges), default=0)
+    with open(src, "rb") as fh:
+        header_end = len(fh.readline())
+    return spans if max(end, header_end) >= src.stat().st_size else None
+
+
+def _copy_parsed(fh, header: bytes, out, merged_index: dict, keep) -> int:
+    """
+    Copia las filas de un CSV de partición sin índice, agrupadas por
+    programa, y anota sus rangos en `merged_index`. Descarta la última
+    línea si quedó a medias (faltan columnas).
+    """
+    from .sink import FIELDS, encode_rows
+
+    fields = next(csv.reader([header.decode("utf-8-sig")]), list(FIELDS))
+    groups: dict[str, list[dict]] = {}
+    text = io.TextIOWrapper(fh, encoding="utf-8", newline="")
+    for row in csv.DictReader(text, fieldnames=fields):
+        if None in row.values() or None in row:
+            continue
+        univ, prog = row.get("university", ""), row.get("program", "")
+        if keep(univ, prog):
+            groups.setdefault(f"{univ}\t{prog}", []).append(row)
+    text.detach()
+    n = 0
+    for key, rows in groups.items():
+        data = encode_rows(rows, tuple(fields))
+        merged_index.setdefault(key, []).append([out.tell(), len(data), len(rows)])
+        out.write(data)
+        n += len(rows)
+    return n
+
+
+def merge_partitions(
+    shards_dir: pathlib.Path = SHARDS_DIR,
+    ledger: Ledger | None = None,
+) -> tuple[int, int]:
+    """
+    Combina las particiones en data/output/courses_clean.csv (+ su índice
+    lateral) y download_log.json, y pone al día el índice de búsqueda.
+
+    Con `ledger`, cada (universidad, carrera) se toma solo de la partición
+    del proceso que lo completó: si un lease caducó y otro proceso repitió
+    el registro, la copia huérfana se descarta. Devuelve (filas, descargas).
+    """
+    from .analyzer import OUT_CSV, backup_output
+    from .catalog import get_catalog
+    from .course_index import CourseIndex
+    from .sink import index_path_for
+
+    parts = sorted(p for p in pathlib.Path(shards_dir).iterdir()
+                   if (p / "courses_clean.csv").exists() or (p / "download_log.json").exists())
+    if not parts:
+        raise FileNotFoundError(f"no hay particiones en {shards_dir}")
+    owner_of = ledger.owners() if ledger is not None else None
+
+    def keep(univ: str, prog: str, part: pathlib.Path) -> bool:
+        return owner_of is None or owner_of.get(record_key(univ, prog), part.name) == part.name
+
+    backup_output()
+    tmp = OUT_CSV.with_suffix(".merge.tmp")
+    merged_index: dict[str, list[list[int]]] = {}
+    n_rows = 0
+    with open(tmp, "wb") as out:
+        header_written = False
+        for part in parts:
+            src = part / "courses_clean.csv"
+            if not src.exists():
+                continue
+            spans = _partition_spans(src)
+            with open(src, "rb") as fh:
+                header = fh.readline()     # todas las particiones usan sink.FIELDS
+                if not header_written:
+                    out.write(header)
+                    header_written = True
+                if spans is None:
+                    # proceso caído antes de CourseSink.close(): sin índice
+                    # lateral (o desfasado), se relee el CSV de la partición
+                    LOG.warning("Partición %s sin índice completo: se relee el CSV", part.name)
+                    n_rows += _copy_parsed(fh, header, out, merged_index,
+                                           lambda u, p, part=part: keep(u, p, part))
+                    continue
+                # copiamos programa a programa: el índice lateral de la
+                # partición da los rangos de bytes, solo hay que re-basarlos
+                for key, ranges in spans.items():
+                    univ, _, prog = key.partition("\t")
+                    if not keep(univ, prog, part):
+                        continue
+                    for offset, length, n in ranges:
+                        fh.seek(offset)
+                        merged_index.setdefault(key, []).append([out.tell(), length, n])
+                        out.write(fh.read(length))
+                        n_rows += n
+    tmp.replace(OUT_CSV)
+    idx_tmp = index_path_for(OUT_CSV).with_suffix(".tmp")
+    idx_tmp.write_text(json.dumps(merged_index, ensure_ascii=False), encoding="utf-8")
+    idx_tmp.replace(index_path_for(OUT_CSV))
+
+    log: list[dict] = []
+    for part in parts:
+        src = part / "download_log.json"
+        if src.exists():
+            log.extend(e for e in json.loads(src.read_text(encoding="utf-8"))
+                       if keep(e.get("university", ""), e.get("program", ""), part))
+    log_path = OUT_CSV.with_name("download_log.json")
+    log_tmp = log_path.with_suffix(".tmp")
+    log_tmp.write_text(json.dumps(log, ensure_ascii=False, indent=2), encoding="utf-8")
+    log_tmp.replace(log_path)
+    # el catálogo es la fuente de verdad de las descargas (analyze lee de él)
+    if log:
+        get_catalog().import_download_log(log_path)
+
+    index = CourseIndex.load()
+    index.sync_csv(OUT_CSV)
+    index.save()
+    LOG.info("Merge de %d particiones: %d cursos, %d descargas", len(parts), n_rows, len(log))
+    return n_rows, len(log)
@@ -0,0 +1,51 @@
+# singleflight.py
+# ──────────────────────────────────────────────────────────────
+# Coalescencia de peticiones idénticas concurrentes ("single flight").
+#
+# La primera llamada con una clave lanza el trabajo como tarea propia;
+# las que llegan mientras sigue en vuelo esperan esa misma tarea y
+# reciben su resultado (o su excepción). Al terminar, la clave se
+# libera: la siguiente petición vuelve a hacer el trabajo (el catálogo
+# y la caché de ficheros se encargan de que sea barato).
+#
+# El trabajo no pertenece a ningún cliente: si quien lo lanzó corta la
+# conexión, la tarea sigue para los demás (asyncio.shield).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from . import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Registro de trabajos en vuelo por clave (un bucle de eventos)."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """(resultado, compartido): compartido=True si se reutilizó un trabajo en vuelo."""
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        shared = task is not None and task.get_loop() is loop and not task.done()
+        if shared:
+            metrics.inc("singleflight_shared_total", flight=self.name)
+        else:
+            task = loop.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()          # marcada como recuperada aunque nadie espere ya
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,182 @@
+# sink.py
+# ──────────────────────────────────────────────────────────────
+# Salida CSV de cursos con un único handle abierto.
+#
+# • Comillas CSV reales (csv.QUOTE_MINIMAL): las comas de los nombres
+#   ya no se sustituyen por espacios.
+# • Escritura por lotes (`batch_size` filas) protegida con un lock;
+#   opcionalmente un hilo escritor consume una cola, de modo que varios
+#   productores (hilos, o procesos vía multiprocessing.Manager().Queue())
+#   pueden escribir a la vez sin tocar el fichero.
+# • Índice lateral <csv>.idx.json con los rangos de bytes de cada
+#   (universidad, programa) para leer un programa sin recorrer el CSV.
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+import pathlib
+import queue
+import threading
+from typing import Any, Iterable
+
+LOG = logging.getLogger("sink")
+
+FIELDS = ("university", "program", "name", "credits", "mode")
+_STOP = None  # centinela de fin de cola
+
+
+def index_path_for(csv_path: pathlib.Path) -> pathlib.Path:
+    return csv_path.with_name(csv_path.name + ".idx.json")
+
+
+def _key(university: str, program: str) -> str:
+    return f"{university}\t{program}"
+
+
+def encode_rows(rows: Iterable[dict], fields: tuple[str, ...] = FIELDS) -> bytes:
+    """Filas en CSV (sin cabecera), con el mismo formato que escribe CourseSink."""
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=fields, extrasaction="ignore",
+                       quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
+    w.writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+
+class CourseSink:
+    """
+    Escritor CSV bufferizado y seguro entre hilos.
+
+        with CourseSink(OUT_CSV) as sink:
+            sink.write_rows(univ, prog, rows)
+
+    Con `threaded=True` las escrituras se encolan y un hilo dedicado las
+    vuelca; `sink.queue` acepta también tuplas (univ, prog, rows) de otros
+    procesos si se pasa una cola compartida en `q`.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        *,
+        append: bool = False,
+        batch_size: int = 500,
+        threaded: bool = False,
+        q: Any = None,
+        fields: tuple[str, ...] = FIELDS,
+    ) -> None:
+        self.path = pathlib.Path(path)
+        self.index_path = index_path_for(self.path)
+        self.fields = fields
+        self.batch_size = batch_size
+        self.rows_written = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fresh = not append or not self.path.exists() or self.path.stat().st_size == 0
+        self._fh = open(self.path, "wb" if fresh else "ab")
+        self._index: dict[str, list[list[int]]] = {}
+        if fresh:
+            self._fh.write(self._encode([dict(zip(fields, fields))]))
+        elif self.index_path.exists():
+            self._index = json.loads(self.index_path.read_text(encoding="utf-8"))
+
+        self._buffer: list[tuple[str, dict]] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.queue = q if q is not None else (queue.Queue(maxsize=10_000) if threaded else None)
+        self._writer: threading.Thread | None = None
+        if self.queue is not None:
+            self._writer = threading.Thread(target=self._drain, name="course-sink", daemon=True)
+            self._writer.start()
+
+    # ─────────── API pública ───────────
+    def write_rows(self, university: str, program: str, rows: Iterable[dict]) -> None:
+        """Añade las filas de un (universidad, programa)."""
+        rows = list(rows)
+        if not rows:
+            return
+        if self.queue is not None:
+            self.queue.put((university, program, rows))
+        else:
+            self._add(university, program, rows)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        if self._writer is not None:
+            self.queue.put(_STOP)
+            self._writer.join()
+        with self._lock:
+            self._flush_locked()
+            self._fh.close()
+            tmp = self.index_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._index, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.index_path)
+            self._closed = True
+        LOG.info("CSV %s cerrado: %d filas", self.path, self.rows_written)
+
+    def __enter__(self) -> "CourseSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ─────────── internos ───────────
+    def _drain(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            self._add(*item)
+
+    def _add(self, university: str, program: str, rows: list[dict]) -> None:
+        key = _key(university, program)
+        with self._lock:
+            for r in rows:
+                self._buffer.append(
+                    (key, {**r, "university": university, "program": program})
+                )
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def _encode(self, rows: list[dict]) -> bytes:
+        return encode_rows(rows, self.fields)
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        # agrupamos por programa (orden estable) para que cada uno ocupe
+        # un único rango contiguo dentro del lote
+        groups: dict[str, list[dict]] = {}
+        for key, row in self._buffer:
+            groups.setdefault(key, []).append(row)
+        for key, rows in groups.items():
+            data = self._encode(rows)
+            offset = self._fh.tell()
+            self._fh.write(data)
+            self._index.setdefault(key, []).append([offset, len(data), len(rows)])
+            self.rows_written += len(rows)
+        self._fh.flush()
+        self._buffer.clear()
+
+
+def read_program(csv_path: pathlib.Path, university: str, program: str) -> list[dict]:
+    """Filas de un programa usando el índice lateral (sin escanear el CSV)."""
+    csv_path = pathlib.Path(csv_path)
+    index = json.loads(index_path_for(csv_path).read_text(encoding="utf-8"))
+    spans = index.get(_key(university, program), [])
+    out: list[dict] = []
+    with open(csv_path, "rb") as fh:
+        header = next(csv.reader([fh.readline().decode("utf-8")]))
+        for offset, length, _n in spans:
+            fh.seek(offset)
+            chunk = fh.read(length).decode("utf-8")
+            out.extend(csv.DictReader(io.StringIO(chunk, newline=""), fieldnames=header))
+    return out
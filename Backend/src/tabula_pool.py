@@ -0,0 +1,270 @@
+# tabula_pool.py
+# ──────────────────────────────────────────────────────────────
+# Pool de JVMs persistentes para el nivel de tablas (tabula) del
+# extractor de PDF.
+#
+# `tabula.read_pdf` arranca una JVM nueva en cada llamada si no puede
+# usar jpype (y, con jpype, la JVM vive dentro del proceso: una tabla
+# colgada bloquea al proceso entero sin forma de cortarla). Aquí cada
+# worker es un proceso hijo que arranca la JVM una vez (vía jpype) y
+# atiende documentos hasta TABULA_MAX_DOCS:
+#
+#   extractor ──► TabulaPool ──Pipe──► worker 1 (JVM) ─┐
+#                            ──Pipe──► worker 2 (JVM) ─┤ lotes de PDFs,
+#                                                      ┘ 1 respuesta por PDF
+#
+# • Timeout por documento (TABULA_TIMEOUT): el worker se mata, el PDF
+#   se da por fallido y el resto del lote sigue en un worker nuevo.
+# • `read_many` reparte lotes de PDFs entre los workers (una sola
+#   llamada por lote, sin coste de arranque entre documentos).
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Iterable, Iterator, Union
+
+from . import metrics
+
+LOG = logging.getLogger("tabula_pool")
+
+WORKERS = int(os.getenv("TABULA_WORKERS", "1"))            # JVMs por proceso
+TIMEOUT = float(os.getenv("TABULA_TIMEOUT", "120"))        # s por documento
+MAX_DOCS = int(os.getenv("TABULA_MAX_DOCS", "500"))        # documentos antes de reciclar la JVM
+BATCH = int(os.getenv("TABULA_BATCH", "16"))               # PDFs por mensaje en read_many
+JAVA_OPTIONS = os.getenv("TABULA_JAVA_OPTIONS", "-Xmx1g -Djava.awt.headless=true").split()
+
+Result = Union[list[Any], Exception]     # DataFrames del PDF o el error del documento
+
+
+class TabulaError(RuntimeError):
+    """Fallo de tabula en un documento (o el worker murió procesándolo)."""
+
+
+class TabulaTimeout(TabulaError, TimeoutError):
+    """El documento superó TABULA_TIMEOUT; su worker se reinicia."""
+
+
+# ─────────────────────────── Proceso worker ──────────────────────────
+def _serve(conn, java_options: list[str]) -> None:
+    """Bucle del hijo: recibe lotes [(path, kwargs)] y responde por PDF."""
+    import tabula
+
+    while True:
+        try:
+            batch = conn.recv()
+        except (EOFError, OSError):
+            return
+        if batch is None:
+            return
+        for path, kwargs in batch:
+            try:
+                # jpype arranca la JVM en la primera llamada y la reutiliza
+                dfs = tabula.read_pdf(path, java_options=list(java_options), silent=True, **kwargs)
+                conn.send((dfs, None))
+            except Exception as exc:   # las excepciones de Java no se pueden picklear
+                conn.send((None, f"{type(exc).__name__}: {exc}"))
+
+
+class _Worker:
+    def __init__(self, ctx, java_options: list[str]) -> None:
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_serve, args=(child, java_options),
+                                name="tabula-worker", daemon=True)
+        self.proc.start()
+        child.close()
+        self.docs = 0
+        self.dead = False
+        metrics.inc("tabula_worker_starts_total")
+        LOG.debug("Worker tabula %s arrancado", self.proc.pid)
+
+    def alive(self) -> bool:
+        return not self.dead and self.proc.is_alive()
+
+    def send(self, paths: list[str], kwargs: dict) -> None:
+        self.conn.send([(p, kwargs) for p in paths])
+
+    def result(self, timeout: float) -> list[Any]:
+        if not self.conn.poll(timeout):
+            raise TabulaTimeout(f"tabula superó {timeout:.0f}s")
+        try:
+            dfs, error = self.conn.recv()
+        except (EOFError, OSError):
+            self.dead = True
+            raise TabulaError(f"el worker tabula murió (exit {self.proc.exitcode})") from None
+        self.docs += 1
+        if error is not None:
+            raise TabulaError(error)
+        return dfs
+
+    def kill(self) -> None:
+        self.proc.kill()
+        self.proc.join()
+        self.conn.close()
+
+    def close(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.proc.join(5)
+        if self.proc.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+# ─────────────────────────── Pool ────────────────────────────────────
+class TabulaPool:
+    """
+    `size` workers arrancados bajo demanda. Seguro entre hilos: cada
+    lote toma un worker libre en exclusiva.
+    """
+
+    def __init__(
+        self,
+        size: int = WORKERS,
+        *,
+        timeout: float = TIMEOUT,
+        max_docs: int = MAX_DOCS,
+        java_options: list[str] | None = None,
+    ) -> None:
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.max_docs = max_docs
+        self.java_options = list(JAVA_OPTIONS if java_options is None else java_options)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: queue.LifoQueue[_Worker | None] = queue.LifoQueue()   # workers calientes primero
+        for _ in range(self.size):
+            self._idle.put(None)          # hueco sin worker: se arranca al usarlo
+        self._all: set[_Worker] = set()
+        self._lock = threading.Lock()
+
+    def _spawn(self) -> _Worker:
+        w = _Worker(self._ctx, self.java_options)
+        with self._lock:
+            self._all.add(w)
+        return w
+
+    def _retire(self, w: _Worker, *, kill: bool) -> None:
+        with self._lock:
+            self._all.discard(w)
+        w.kill() if kill else w.close()
+
+    def _acquire(self) -> _Worker:
+        w = self._idle.get()
+        if w is not None and w.alive():
+            return w
+        if w is not None:
+            self._retire(w, kill=True)
+        return self._spawn()
+
+    def _release(self, w: _Worker | None) -> None:
+        if w is not None and w.docs >= self.max_docs:
+            LOG.debug("Reciclando worker tabula %s tras %d documentos", w.proc.pid, w.docs)
+            self._retire(w, kill=False)
+            w = None
+        self._idle.put(w)
+
+    # ─────────── API ───────────
+    def read_batch(
+        self, paths: Iterable[str | os.PathLike], *, timeout: float | None = None, **kwargs
+    ) -> Iterator[tuple[str, Result]]:
+        """
+        Un lote en un solo worker: un mensaje con todos los PDFs y una
+        respuesta por PDF, cada una con su propio timeout. Produce
+        (path, [DataFrame…]) o (path, TabulaError).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        todo = [os.fspath(p) for p in paths]
+        w: _Worker | None = self._acquire()
+        done = False
+        try:
+            while todo:
+                w.send(todo, kwargs)
+                for k, path in enumerate(todo):
+                    try:
+                        res: Result = w.result(timeout)
+                    except TabulaError as exc:
+                        if isinstance(exc, TabulaTimeout) or not w.alive():
+                            metrics.inc("tabula_restarts_total",
+                                        reason="timeout" if isinstance(exc, TabulaTimeout) else "crash")
+                            LOG.warning("tabula: %s en %s; reiniciando worker", exc, path)
+                            self._retire(w, kill=True)
+                            w = None
+                            yield path, exc
+                            todo = todo[k + 1:]
+                            if todo:
+                                w = self._spawn()
+                            break
+                        res = exc
+                    yield path, res
+                else:
+                    todo = []
+            done = True
+        finally:
+            if w is not None and not done:
+                # el consumidor abandonó el lote: quedan respuestas en el pipe
+                self._retire(w, kill=True)
+                w = None
+            self._release(w)
+
+    def read_pdf(self, path: str | os.PathLike, *, timeout: float | None = None, **kwargs) -> list[Any]:
+        """Como `tabula.read_pdf` pero en una JVM persistente y con timeout."""
+        [(_, res)] = self.read_batch([path], timeout=timeout, **kwargs)
+        if isinstance(res, Exception):
+            raise res
+        return res
+
+    def read_many(
+        self,
+        paths: Iterable[str | os.PathLike],
+        *,
+        batch: int = BATCH,
+        timeout: float | None = None,
+        **kwargs,
+    ) -> Iterator[tuple[str, Result]]:
+        """Reparte `paths` en lotes entre los workers; resultados según terminan."""
+        paths = [os.fspath(p) for p in paths]
+        chunks = [paths[i:i + batch] for i in range(0, len(paths), max(1, batch))]
+        with ThreadPoolExecutor(self.size, thread_name_prefix="tabula") as ex:
+            futures = [ex.submit(lambda c: list(self.read_batch(c, timeout=timeout, **kwargs)), c)
+                       for c in chunks]
+            for fut in as_completed(futures):
+                yield from fut.result()
+
+    def close(self) -> None:
+        with self._lock:
+            workers, self._all = list(self._all), set()
+        for w in workers:
+            w.close()
+
+
+_pool: TabulaPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> TabulaPool:
+    """Pool del proceso (en el pipeline, uno por proceso de extracción)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = TabulaPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+def read_pdf(path: str | os.PathLike, **kwargs) -> list[Any]:
+    """
+    `tabula.read_pdf` a través del pool. Un proceso daemon no puede tener
+    hijos: ahí se llama a tabula directamente (sin timeout).
+    """
+    if multiprocessing.current_process().daemon:
+        import tabula
+        return tabula.read_pdf(path, java_options=list(JAVA_OPTIONS), silent=True, **kwargs)
+    return get_pool().read_pdf(path, **kwargs)
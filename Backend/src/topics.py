@@ -0,0 +1,246 @@
+# topics.py
+# ──────────────────────────────────────────────────────────────
+# Modelo de temas persistente e incremental para
+# lda_topics_keywords.json y topic_distribution_by_region.json.
+#
+# El notebook (y bagOfWords/bagOfWords_copy.py) reajusta un LDA
+# completo sobre todo el corpus en cada ejecución: cada vez tarda más y
+# los ids de tema se barajan. Aquí:
+#
+#   vocabulario fijo (vN) ─► LDA online (partial_fit por mini-lotes)
+#        cursos nuevos ─► partial_fit ─► tema dominante ─► +1 en su región
+#
+# • El vocabulario se congela en la primera construcción y lleva
+#   versión (data/output/topics/vocab_v<N>.json). Los términos que no
+#   están en él se ignoran; si la proporción crece (VOCAB_DRIFT) se
+#   avisa para reconstruir (`export --rebuild-topics` → vN+1).
+# • `partial_fit` no reordena componentes: el tema 3 sigue siendo el
+#   tema 3 entre exportaciones.
+# • Cada curso se absorbe una sola vez (clave región/universidad/
+#   programa/nombre). Los conteos por región son acumulativos: si una
+#   fuente se reescribe, lo que desapareció sigue contado hasta
+#   reconstruir.
+# ──────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import time
+from collections import Counter
+from typing import Iterable, TypedDict
+
+import joblib
+import numpy as np
+
+from .metrics import inc, timed
+from .utils import atomic_write_text
+
+LOG = logging.getLogger("topics")
+
+TOPICS_DIR = pathlib.Path("data/output/topics")
+N_TOPICS = int(os.getenv("TOPICS_N", "10"))
+VOCAB_SIZE = 1000              # como max_features del notebook
+VOCAB_MIN_DF = 2               # términos en al menos 2 cursos
+BATCH_SIZE = 256               # documentos por partial_fit
+INITIAL_PASSES = 5             # pasadas sobre el corpus al construir desde cero
+VOCAB_DRIFT = 0.3              # fracción de términos fuera de vocabulario que dispara el aviso
+N_KEYWORDS = 10
+SEED = 0
+
+
+class TopicDoc(TypedDict):
+    region: str
+    university: str
+    program: str
+    name: str
+
+
+class TopicKeywords(TypedDict):
+    topic: int
+    keywords: list[str]
+
+
+def _doc_key(d: TopicDoc) -> str:
+    raw = "\x1f".join((d["region"], d["university"].casefold(),
+                       d["program"].casefold(), d["name"].casefold()))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _terms(d: TopicDoc) -> list[str]:
+    from src.graph.analyze_text_data_return_files import preprocess
+
+    return preprocess(d["name"]).split()
+
+
+def build_vocab(term_lists: Iterable[list[str]], size: int = VOCAB_SIZE,
+                min_df: int = VOCAB_MIN_DF) -> list[str]:
+    """Los `size` términos con más documentos (df ≥ min_df), en orden alfabético."""
+    df: Counter[str] = Counter()
+    for terms in term_lists:
+        df.update(set(terms))
+    top = [t for t, n in sorted(df.items(), key=lambda x: (-x[1], x[0])) if n >= min_df][:size]
+    return sorted(top)
+
+
+class TopicModel:
+    """
+    LDA online (variacional por mini-lotes) sobre un vocabulario fijo.
+
+        tm = TopicModel.load()
+        tm.absorb(docs)          # solo los cursos que no había visto
+        tm.save()
+        tm.keywords(), tm.distribution()
+    """
+
+    def __init__(self, vocab: list[str], version: int, *, n_topics: int = N_TOPICS,
+                 root: pathlib.Path = TOPICS_DIR) -> None:
+        from sklearn.decomposition import LatentDirichletAllocation
+
+        self.root = pathlib.Path(root)
+        self.vocab = vocab
+        self.version = version
+        self.index = {t: i for i, t in enumerate(vocab)}
+        self.lda = LatentDirichletAllocation(
+            n_components=n_topics, learning_method="online", batch_size=BATCH_SIZE,
+            random_state=SEED,
+        )
+        self.seen: set[str] = set()
+        self.counts: dict[str, list[int]] = {}      # región → cursos por tema dominante
+        self.fitted = False
+
+    # ─────────── persistencia ───────────
+    @staticmethod
+    def _vocab_path(root: pathlib.Path, version: int) -> pathlib.Path:
+        return root / f"vocab_v{version}.json"
+
+    @classmethod
+    def load(cls, root: pathlib.Path = TOPICS_DIR) -> "TopicModel | None":
+        """Modelo guardado, o None si no hay (o su vocabulario no está)."""
+        root = pathlib.Path(root)
+        path = root / "model.joblib"
+        if not path.exists():
+            return None
+        state = joblib.load(path)
+        vpath = cls._vocab_path(root, state["vocab_version"])
+        if not vpath.exists():
+            LOG.warning("Falta %s; el modelo de temas se reconstruirá", vpath)
+            return None
+        vocab = json.loads(vpath.read_text(encoding="utf-8"))["terms"]
+        tm = cls(vocab, state["vocab_version"], root=root)
+        tm.lda, tm.seen, tm.counts, tm.fitted = state["lda"], state["seen"], state["counts"], True
+        return tm
+
+    def save(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        vpath = self._vocab_path(self.root, self.version)
+        if not vpath.exists():
+            atomic_write_text(vpath, json.dumps(
+                {"version": self.version, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "terms": self.vocab}, ensure_ascii=False))
+        path = self.root / "model.joblib"
+        tmp = path.with_suffix(".tmp")
+        joblib.dump({"vocab_version": self.version, "lda": self.lda,
+                     "seen": self.seen, "counts": self.counts}, tmp)
+        tmp.replace(path)
+
+    # ─────────── entrenamiento ───────────
+    def _matrix(self, term_lists: list[list[str]]):
+        """Bolsa de palabras sobre el vocabulario fijo (+ fracción de términos fuera)."""
+        from scipy.sparse import csr_matrix
+
+        rows, cols, total, oov = [], [], 0, 0
+        for i, terms in enumerate(term_lists):
+            for t in terms:
+                j = self.index.get(t)
+                total += 1
+                if j is None:
+                    oov += 1
+                else:
+                    rows.append(i)
+                    cols.append(j)
+        X = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(term_lists), len(self.vocab)))
+        X.sum_duplicates()
+        return X, (oov / total if total else 0.0)
+
+    def _partial_fit(self, X, passes: int = 1) -> None:
+        # total_samples escala la actualización de cada mini-lote
+        self.lda.total_samples = max(len(self.seen), X.shape[0], BATCH_SIZE)
+        with timed("topics_partial_fit"):
+            for _ in range(passes):
+                for start in range(0, X.shape[0], BATCH_SIZE):
+                    self.lda.partial_fit(X[start:start + BATCH_SIZE])
+        self.fitted = True
+
+    def absorb(self, docs: Iterable[TopicDoc], *, passes: int = 1) -> int:
+        """
+        Ajusta el modelo con los cursos no vistos y suma su tema dominante
+        a los conteos de su región. Devuelve cuántos cursos nuevos entraron.
+        """
+        new: list[TopicDoc] = []
+        keys: set[str] = set()
+        for d in docs:
+            k = _doc_key(d)
+            if k not in self.seen and k not in keys:
+                keys.add(k)
+                new.append(d)
+        if not new:
+            return 0
+        X, oov = self._matrix([_terms(d) for d in new])
+        has_terms = np.asarray(X.sum(axis=1)).ravel() > 0
+        self.seen |= keys
+        if oov > VOCAB_DRIFT:
+            LOG.warning("Temas: %.0f%% de los términos nuevos fuera del vocabulario v%d; "
+                        "conviene reconstruir (--rebuild-topics)", oov * 100, self.version)
+        if not has_terms.any():
+            inc("topic_docs_total", len(new), result="empty")
+            return len(new)
+        X = X[has_terms]
+        self._partial_fit(X, passes)
+        dominant = self.lda.transform(X).argmax(axis=1)
+        regions = [d["region"] for d, ok in zip(new, has_terms) if ok]
+        for region, k in zip(regions, dominant):
+            self.counts.setdefault(region, [0] * self.lda.n_components)[int(k)] += 1
+        inc("topic_docs_total", X.shape[0], result="absorbed")
+        inc("topic_docs_total", len(new) - X.shape[0], result="empty")
+        LOG.info("Temas: +%d cursos (%d sin términos del vocabulario v%d)",
+                 len(new), len(new) - X.shape[0], self.version)
+        return len(new)
+
+    # ─────────── salidas (formato del Frontend) ───────────
+    def keywords(self, n: int = N_KEYWORDS) -> list[TopicKeywords]:
+        return [TopicKeywords(topic=k, keywords=[self.vocab[i] for i in comp.argsort()[:-n - 1:-1]])
+                for k, comp in enumerate(self.lda.components_)]
+
+    def distribution(self) -> list[dict]:
+        return [{"region": region, **{str(k): n for k, n in enumerate(counts)}}
+                for region, counts in self.counts.items()]
+
+
+def _latest_version(root: pathlib.Path) -> int:
+    versions = [int(p.stem.removeprefix("vocab_v")) for p in root.glob("vocab_v*.json")
+                if p.stem.removeprefix("vocab_v").isdigit()]
+    return max(versions, default=0)
+
+
+def update(docs: list[TopicDoc], *, rebuild: bool = False,
+           root: pathlib.Path = TOPICS_DIR) -> TopicModel:
+    """
+    Carga el modelo y absorbe `docs` de forma incremental. Sin modelo (o con
+    `rebuild`) se congela un vocabulario nuevo (vN+1) y se entrena desde cero.
+    """
+    root = pathlib.Path(root)
+    tm = None if rebuild else TopicModel.load(root)
+    if tm is None:
+        vocab = build_vocab(_terms(d) for d in docs)
+        if not vocab:
+            raise ValueError("corpus sin términos para el modelo de temas")
+        tm = TopicModel(vocab, _latest_version(root) + 1, root=root)
+        LOG.info("Temas: vocabulario v%d con %d términos", tm.version, len(vocab))
+        tm.absorb(docs, passes=INITIAL_PASSES)
+    else:
+        tm.absorb(docs)
+    tm.save()
+    return tm
@@ -1,7 +1,8 @@
 from __future__ import annotations
 import re
 from typing import Iterable
-import re, unicodedata, pathlib
+import os, re, tempfile, unicodedata, pathlib
+from urllib.parse import urlsplit, urlunsplit
 
 _COMMA_SPLIT = re.compile(r",\s*")
 
@@ -19,6 +20,26 @@ def split_urls(raw: str) -> Iterable[str]:
             seen.add(url)
             yield url
 
+def normalize_url(url: str) -> str:
+    """
+    Clave canónica de una URL para deduplicar: esquema y host en minúsculas,
+    sin puerto por defecto ni fragmento (`#…`). Una URL que no se puede
+    analizar ("http://[bad") se devuelve tal cual, sin espacios.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and (scheme, port) not in {("http", 80), ("https", 443)}:
+        host = f"{host}:{port}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
 def slugify(text: str, *, maxlen: int | None = 80) -> str:
     """
     Convierte 'Máster en Ciencia  de Datos' ➜ 'master_en_ciencia_de_datos'
@@ -36,4 +57,26 @@ def slugify(text: str, *, maxlen: int | None = 80) -> str:
 def normalize_line(text: str) -> str:
     text = unicodedata.normalize("NFKD", text)
     text = re.sub(r"\s+\(\d+\s*(?:credits?|ects|units?)\)", "", text, flags=re.I)
-    return text.strip(" –-")
\ No newline at end of file
+    return text.strip(" –-")
+
+def atomic_write_bytes(path: pathlib.Path, data: bytes) -> None:
+    """
+    Escribe en un temporal único junto a `path` y lo renombra encima: un
+    lector concurrente ve el fichero viejo o el nuevo, nunca uno a medias,
+    y dos escritores a la vez no se pisan el temporal.
+    """
+    path = pathlib.Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".part", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def atomic_write_text(path: pathlib.Path, text: str, encoding: str = "utf-8") -> None:
+    atomic_write_bytes(path, text.encode(encoding))
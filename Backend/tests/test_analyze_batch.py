@@ -0,0 +1,76 @@
+# Una carrera con varias URLs (separadas por comas, como en Salida.csv) debe
+# analizar el contenido de cada URL, no el fichero que dejó la primera.
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from src import downloader, main
+
+PAGES = {
+    "/plan-a": "<html><body><ul><li>Machine Learning</li></ul></body></html>",
+    "/plan-b": "<html><body><ul><li>Distributed Systems</li></ul></body></html>",
+}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader, "RAW_DIR_HTML", tmp_path)
+    monkeypatch.setattr(downloader, "RAW_DIR_PDF", tmp_path)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text=PAGES[request.url.path],
+                              headers={"Content-Type": "text/html"})
+
+    transport = httpx.MockTransport(handler)
+    fetch = downloader.fetch_page_async
+
+    async def fetch_mocked(url, **kwargs):
+        async with httpx.AsyncClient(transport=transport) as http:
+            return await fetch(url, clean=False, client=http, **kwargs)
+
+    def rows_from_file(params, info):
+        # sin catálogo ni LLM: una fila con el texto del fichero descargado
+        with open(info["path"], encoding="utf-8") as fh:
+            return [{"name": fh.read(), "credits": "", "mode": ""}], {"tier": "test"}
+
+    monkeypatch.setattr(main, "fetch_page_async", fetch_mocked)
+    monkeypatch.setattr(main, "_analyze_item", rows_from_file)
+    return TestClient(main.app)
+
+
+def test_two_url_item_analyzes_each_url(client):
+    item = {"url": "https://uni.example/plan-a, https://uni.example/plan-b",
+            "university": "Uni", "program": "MSc"}
+    # dos veces: la segunda sale de la caché de data/raw y debe seguir separada
+    for _ in range(2):
+        resp = client.post("/analyze_batch", json={"items": [item]})
+        assert resp.status_code == 200
+        records = [json.loads(ln) for ln in resp.text.splitlines() if ln]
+        items = {r["url"]: r for r in records if r["type"] == "item"}
+
+        assert set(items) == {"https://uni.example/plan-a", "https://uni.example/plan-b"}
+        assert all(r["status"] == "ok" for r in items.values())
+        assert "Machine Learning" in items["https://uni.example/plan-a"]["courses"][0]["name"]
+        assert "Distributed Systems" in items["https://uni.example/plan-b"]["courses"][0]["name"]
+
+
+def test_basename_differs_per_url():
+    a = downloader._basename("Uni", "MSc", "https://uni.example/plan-a")
+    b = downloader._basename("Uni", "MSc", "https://uni.example/plan-b")
+    assert a != b
+    # misma URL normalizada → mismo fichero (la caché sigue funcionando)
+    assert a == downloader._basename("Uni", "MSc", "HTTPS://UNI.EXAMPLE:443/plan-a#x")
+
+
+def test_same_url_other_program_is_its_own_job(client):
+    items = [{"url": "https://uni.example/plan-a", "university": "Uni", "program": program}
+             for program in ("MSc", "PhD")]
+    resp = client.post("/analyze_batch", json={"items": items})
+    records = [json.loads(ln) for ln in resp.text.splitlines() if ln]
+    got = [r for r in records if r["type"] == "item"]
+
+    assert sorted(r["program"] for r in got) == ["MSc", "PhD"]
+    assert not any(r["shared"] for r in got)
+    assert records[-1]["urls"] == 2